@@ -3,14 +3,44 @@
 This module provides a pluggable provider (currently OpenRouter) for text and
 image classification to detect advertising content. It exposes runtime settings,
 management commands will adjust these values without restart.
+
+All requests share one application-scoped httpx.AsyncClient (keep-alive pool,
+optional HTTP/2) opened by start_ai_client and closed by close_ai_client.
+
+Verdicts are cached in memory (LRU) and in SQLite with a TTL: texts by a digest
+of their normalized form plus the model name, images by file_unique_id and
+pHash. Repeated spam therefore costs one API call, not one per group.
+
+Text classifications that miss the cache are micro-batched: requests arriving
+within AI_BATCH_MAX_WAIT_MS (up to AI_BATCH_MAX_ITEMS) share one multi-item
+prompt. If the batched answer cannot be parsed, each text is retried alone.
 """
 import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
 import time
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
 import httpx
 
+from .cache import LRUCache
+from .config import (
+    AI_BATCH_MAX_ITEMS,
+    AI_BATCH_MAX_WAIT_MS,
+    AI_HTTP2,
+    AI_HTTP_MAX_CONNECTIONS,
+    AI_HTTP_MAX_KEEPALIVE,
+    AI_VERDICT_MEM_ENTRIES,
+    AI_VERDICT_TTL_SECONDS,
+)
+from .db import get_ai_verdict, prune_ai_verdicts, run_db, set_ai_verdicts
+from .text import normalize_text
+
+logger = logging.getLogger(__name__)
+
 # Runtime settings (global). These can be adjusted by commands at runtime.
 AI_MODE = "off"  # off | openrouter
 OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
@@ -23,6 +53,59 @@ AI_EXCLUSIVE = False  # if True, skip local OCR/规则，仅用AI
 _ai_calls_total = 0
 _ai_calls_failed = 0
 _ai_last_error: Optional[str] = None
+_ai_batches = 0
+_ai_batched_items = 0
+_ai_batch_fallbacks = 0
+
+# Verdict cache: memory tier of key -> (label, score, created_at) over SQLite
+_verdict_cache = LRUCache(capacity=AI_VERDICT_MEM_ENTRIES, name="ai_verdict")
+_verdict_hits_memory = 0
+_verdict_hits_db = 0
+_verdict_hits_similar = 0
+_verdict_misses = 0
+
+# Characters of a text sent for classification, alone or in a batch, so a
+# text gets the same verdict whichever path classified it
+_AI_TEXT_MAX_CHARS = 4000
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = AI_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("AI_HTTP2 已开启但未安装 h2，回退到 HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=20.0,
+        limits=httpx.Limits(
+            max_connections=AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+        ),
+    )
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_client()
+    return _http_client
+
+
+async def start_ai_client() -> None:
+    """Open the shared HTTP client (called at application startup)."""
+    _get_client()
+
+
+async def close_ai_client() -> None:
+    """Close the shared HTTP client and its pooled connections."""
+    global _http_client
+    await _text_batcher.close()
+    if _http_client is not None:
+        client, _http_client = _http_client, None
+        await client.aclose()
 
 
 def set_ai_mode(mode: str) -> str:
@@ -72,6 +155,13 @@ def get_ai_stats() -> Dict[str, object]:
         "last_error": _ai_last_error or "",
         "threshold": AI_CLASSIFY_THRESHOLD,
         "exclusive": AI_EXCLUSIVE,
+        "cache_hits_memory": _verdict_hits_memory,
+        "cache_hits_db": _verdict_hits_db,
+        "cache_hits_similar": _verdict_hits_similar,
+        "cache_misses": _verdict_misses,
+        "batches": _ai_batches,
+        "batched_items": _ai_batched_items,
+        "batch_fallbacks": _ai_batch_fallbacks,
     }
 
 
@@ -79,22 +169,138 @@ def should_use_ai() -> bool:
     return AI_MODE == "openrouter" and bool(OPENROUTER_API_KEY)
 
 
-async def classify_text_with_openrouter(text: str) -> Tuple[bool, float, str]:
+def text_cache_key(text: str) -> str:
+    """Verdict cache key for a text: model name plus digest of the normalized text."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"t:{OPENROUTER_MODEL}:{digest}"
+
+
+def image_cache_keys(file_unique_id: Optional[str] = None, phash: Optional[str] = None) -> List[str]:
+    """Verdict cache keys for an image (by Telegram unique id and/or pHash)."""
+    keys = []
+    if file_unique_id:
+        keys.append(f"i:{OPENROUTER_MODEL}:{file_unique_id}")
+    if phash:
+        keys.append(f"p:{OPENROUTER_MODEL}:{phash}")
+    return keys
+
+
+def _as_verdict(label: str, score: float) -> Tuple[bool, float, str]:
+    # Threshold is applied at read time so cached verdicts follow /set_ai_threshold changes
+    return (label == "ad") and (score >= AI_CLASSIFY_THRESHOLD), score, label
+
+
+def _read_verdict(key: str, now: int) -> Optional[Tuple[str, float, int]]:
+    entry = _verdict_cache.get(key)
+    if entry is not None and now - entry[2] < AI_VERDICT_TTL_SECONDS:
+        return entry
+    return None
+
+
+async def _load_verdict(key: str) -> Optional[Tuple[str, float, int]]:
+    try:
+        return await run_db(get_ai_verdict, key, AI_VERDICT_TTL_SECONDS)
+    except Exception as exc:
+        logger.debug("读取 AI 缓存失败: %s", exc)
+        return None
+
+
+async def lookup_ai_verdict(
+    keys: Sequence[str],
+    similar_keys: Sequence[str] = (),
+    checked_keys: Sequence[str] = (),
+    count_miss: bool = True,
+) -> Optional[Tuple[bool, float, str]]:
+    """Return a cached (is_ad, score, label) for any of `keys`, memory tier first.
+
+    `similar_keys` (e.g. pHash keys of near-duplicate images) are tried last; a
+    verdict found there is copied under `keys`. `checked_keys` are keys the
+    caller already looked up without a hit: they are not queried again but
+    still receive a verdict found under another key. With `count_miss` False
+    a miss is left for the caller's follow-up lookup to count, so one image
+    is one miss.
     """
-    Returns: (is_ad, score, label)
-    label in {ad, not_ad, unsure}
+    global _verdict_hits_memory, _verdict_hits_db, _verdict_hits_similar, _verdict_misses
+    if not keys and not similar_keys:
+        return None
+    now = int(time.time())
+    lookup = [key for key in keys if key not in checked_keys]
+    for key in lookup:
+        entry = _read_verdict(key, now)
+        if entry is not None:
+            _verdict_hits_memory += 1
+            return _as_verdict(entry[0], entry[1])
+    for key in lookup:
+        entry = await _load_verdict(key)
+        if entry is not None:
+            for k in keys:
+                _verdict_cache.set(k, entry)
+            _verdict_hits_db += 1
+            return _as_verdict(entry[0], entry[1])
+    for key in similar_keys:
+        entry = _read_verdict(key, now) or await _load_verdict(key)
+        if entry is not None:
+            _verdict_hits_similar += 1
+            await _remember_verdict(keys, entry[0], entry[1])
+            return _as_verdict(entry[0], entry[1])
+    if count_miss:
+        _verdict_misses += 1
+    return None
+
+
+def prune_ai_verdict_cache() -> List[str]:
+    """Drop persisted verdicts older than AI_VERDICT_TTL_SECONDS (blocking; run via run_db).
+
+    Returns the pHashes left without any cache entry (see db.prune_ai_verdicts).
     """
-    global _ai_calls_total, _ai_calls_failed, _ai_last_error
+    return prune_ai_verdicts(AI_VERDICT_TTL_SECONDS)
+
+
+async def _remember_verdict(keys: Sequence[str], label: str, score: float) -> None:
+    if not keys or label == "error":
+        return
+    entry = (label, score, int(time.time()))
+    for key in keys:
+        _verdict_cache.set(key, entry)
+    try:
+        await run_db(set_ai_verdicts, list(keys), label, score)
+    except Exception as exc:
+        logger.warning("写入 AI 缓存失败: %s", exc)
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+async def _chat_completion(payload: Dict[str, object], timeout: float) -> Dict[str, object]:
+    """POST a chat completion and return the JSON object in the first choice."""
+    global _ai_calls_total
     _ai_calls_total += 1
+    url = f"{OPENROUTER_API_BASE.rstrip('/')}/chat/completions"
+    resp = await _get_client().post(url, headers=_headers(), json=payload, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    content = data.get("choices", [{}])[0].get("message", {}).get("content", "{}")
+    return json.loads(content)
+
+
+def _parse_verdict(obj: Dict[str, object]) -> Tuple[str, float]:
+    label = str(obj.get("label", "unsure")).lower()
+    try:
+        score = float(obj.get("score", 0.0))
+    except Exception:
+        score = 0.0
+    return label, score
+
 
+async def _classify_text_single(text: str) -> Tuple[str, float]:
     prompt = (
         "你是一个广告内容判别助手。给定一段中文或英文文本，请判断是否为广告/推广/代充/引流等。"
-        "只输出一个JSON：{\"label\": \"ad|not_ad|unsure\", \"score\": 0..1}。文本：\n" + text[:4000]
+        "只输出一个JSON：{\"label\": \"ad|not_ad|unsure\", \"score\": 0..1}。文本：\n" + text[:_AI_TEXT_MAX_CHARS]
     )
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-    }
     payload = {
         "model": OPENROUTER_MODEL,
         "messages": [
@@ -105,43 +311,168 @@ async def classify_text_with_openrouter(text: str) -> Tuple[bool, float, str]:
         "max_tokens": 100,
         "temperature": 0.0,
     }
-    url = f"{OPENROUTER_API_BASE.rstrip('/')}/chat/completions"
+    return _parse_verdict(await _chat_completion(payload, timeout=15.0))
 
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            content = data.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-            import json
-            obj = json.loads(content)
-            label = str(obj.get("label", "unsure")).lower()
+
+async def _classify_text_batch(texts: Sequence[str]) -> List[Tuple[str, float]]:
+    """Classify several texts in one request; raises ValueError on an incomplete answer."""
+    items = "\n".join(
+        json.dumps({"id": i, "text": t[:_AI_TEXT_MAX_CHARS]}, ensure_ascii=False) for i, t in enumerate(texts, 1)
+    )
+    prompt = (
+        "你是一个广告内容判别助手。下面每行是一条编号的中文或英文文本，请逐条判断是否为广告/推广/代充/引流等。"
+        "只输出一个JSON：{\"results\": [{\"id\": 编号, \"label\": \"ad|not_ad|unsure\", \"score\": 0..1}, ...]}，"
+        "每条文本恰好一项。文本：\n" + items
+    )
+    payload = {
+        "model": OPENROUTER_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a JSON-only classifier."},
+            {"role": "user", "content": prompt},
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 50 + 40 * len(texts),
+        "temperature": 0.0,
+    }
+    obj = await _chat_completion(payload, timeout=20.0)
+    by_id: Dict[int, Tuple[str, float]] = {}
+    for entry in obj.get("results") or []:
+        try:
+            by_id[int(entry["id"])] = _parse_verdict(entry)
+        except (KeyError, TypeError, ValueError):
+            continue
+    if set(by_id) != set(range(1, len(texts) + 1)):
+        raise ValueError(f"批量判别结果不完整：{len(by_id)}/{len(texts)}")
+    return [by_id[i] for i in range(1, len(texts) + 1)]
+
+
+class _TextBatcher:
+    """Coalesces concurrent text classifications into multi-item requests."""
+
+    def __init__(self) -> None:
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, text: str) -> Tuple[str, float]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= AI_BATCH_MAX_ITEMS:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(AI_BATCH_MAX_WAIT_MS / 1000.0, self._dispatch)
+        return await fut
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        """Fail texts not yet sent and cancel batches in flight (at shutdown)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(RuntimeError("AI 批量判别已中止"))
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            await self._classify(batch)
+        finally:
+            # Cancelled (e.g. at shutdown) or failed before answering: never leave a waiter hanging
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(RuntimeError("AI 批量判别已中止"))
+
+    async def _classify(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        global _ai_batches, _ai_batched_items, _ai_batch_fallbacks
+        # Identical texts (typical during a raid) are classified once
+        texts = list(dict.fromkeys(t for t, _ in batch))
+        results: List[object]
+        if len(texts) == 1:
+            results = await asyncio.gather(_classify_text_single(texts[0]), return_exceptions=True)
+        else:
             try:
-                score = float(obj.get("score", 0.0))
-            except Exception:
-                score = 0.0
-            is_ad = (label == "ad") and (score >= AI_CLASSIFY_THRESHOLD)
-            return is_ad, score, label
+                results = list(await _classify_text_batch(texts))
+                _ai_batches += 1
+                _ai_batched_items += len(texts)
+            except Exception as exc:
+                _ai_batch_fallbacks += 1
+                logger.warning("AI 批量判别失败，逐条重试（%d 条）: %s", len(texts), exc)
+                results = await asyncio.gather(
+                    *(_classify_text_single(t) for t in texts), return_exceptions=True
+                )
+        by_text = dict(zip(texts, results))
+        for text, fut in batch:
+            if fut.done():  # waiter was cancelled
+                continue
+            result = by_text[text]
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+
+_text_batcher = _TextBatcher()
+
+
+async def classify_text_with_openrouter(text: str) -> Tuple[bool, float, str]:
+    """
+    Returns: (is_ad, score, label)
+    label in {ad, not_ad, unsure}
+    """
+    global _ai_calls_failed, _ai_last_error
+    cache_key = text_cache_key(text)
+    cached = await lookup_ai_verdict([cache_key])
+    if cached is not None:
+        return cached
+    try:
+        if AI_BATCH_MAX_ITEMS > 1:
+            label, score = await _text_batcher.submit(text)
+        else:
+            label, score = await _classify_text_single(text)
     except Exception as exc:
         _ai_calls_failed += 1
         _ai_last_error = str(exc)[:200]
         return False, 0.0, "error"
+    await _remember_verdict([cache_key], label, score)
+    return _as_verdict(label, score)
 
 
-async def classify_image_with_openrouter(image_path: Path) -> Tuple[bool, float, str]:
+async def classify_image_with_openrouter(
+    image: Union[Path, bytes],
+    cache_keys: Sequence[str] = (),
+    similar_keys: Sequence[str] = (),
+    checked_keys: Sequence[str] = (),
+) -> Tuple[bool, float, str]:
     """
-    Returns: (is_ad, score, label) by sending an image to a multi-modal model.
+    Returns: (is_ad, score, label) by sending an image (path or JPEG bytes) to a multi-modal model.
+    cache_keys (see image_cache_keys) are consulted first and receive the new verdict;
+    similar_keys are near-duplicate pHash keys whose verdict may be reused;
+    checked_keys are cache_keys the caller already looked up (see lookup_ai_verdict).
     """
-    global _ai_calls_total, _ai_calls_failed, _ai_last_error
-    _ai_calls_total += 1
+    global _ai_calls_failed, _ai_last_error
+    cached = await lookup_ai_verdict(cache_keys, similar_keys, checked_keys)
+    if cached is not None:
+        return cached
 
     import base64
-    b64 = base64.b64encode(image_path.read_bytes()).decode()
+    data = image if isinstance(image, (bytes, bytearray)) else image.read_bytes()
+    b64 = base64.b64encode(data).decode()
 
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-    }
     prompt = "判断图片是否包含广告/推广/代充/引流等信息，输出 {label, score}。"
     payload = {
         "model": OPENROUTER_MODEL,
@@ -158,24 +489,12 @@ async def classify_image_with_openrouter(image_path: Path) -> Tuple[bool, float,
         "max_tokens": 100,
         "temperature": 0.0,
     }
-    url = f"{OPENROUTER_API_BASE.rstrip('/')}/chat/completions"
 
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            content = data.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-            import json
-            obj = json.loads(content)
-            label = str(obj.get("label", "unsure")).lower()
-            try:
-                score = float(obj.get("score", 0.0))
-            except Exception:
-                score = 0.0
-            is_ad = (label == "ad") and (score >= AI_CLASSIFY_THRESHOLD)
-            return is_ad, score, label
+        label, score = _parse_verdict(await _chat_completion(payload, timeout=20.0))
     except Exception as exc:
         _ai_calls_failed += 1
         _ai_last_error = str(exc)[:200]
-        return False, 0.0, "error"
\ No newline at end of file
+        return False, 0.0, "error"
+    await _remember_verdict(cache_keys, label, score)
+    return _as_verdict(label, score)
\ No newline at end of file
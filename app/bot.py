@@ -11,13 +11,12 @@ This module favors docstrings for functions and concise inline comments.
 """
 import asyncio
 import logging
-import re
 import secrets
 import string
-import tempfile
+import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Awaitable, Callable, List, Optional, Tuple
 import subprocess
 
 from telegram import (
@@ -28,6 +27,8 @@ from telegram import (
     InlineKeyboardMarkup,
     ChatMember,
     ChatMemberUpdated,
+    PhotoSize,
+    Video,
 )
 from telegram.constants import ParseMode
 from telegram.ext import (
@@ -40,15 +41,55 @@ from telegram.ext import (
     filters,
 )
 
-from .config import TELEGRAM_BOT_TOKEN, ADMIN_IDS, OCR_LANGUAGES, ADMIN_LOG_CHAT_IDS, ALLOWED_ACTIONS
-from .ocr import extract_text_from_image, OCRError
-from .text import normalize_text, contains_link
-from .cache import ocr_text_cache
-from .db import get_ocr_cache, set_ocr_cache, upsert_known_chat, list_known_chats
-from .video import extract_first_frame, compute_image_phash
+from .config import TELEGRAM_BOT_TOKEN, ADMIN_IDS, OCR_LANGUAGES, OCR_LANG_MODE, ADMIN_LOG_CHAT_IDS, ALLOWED_ACTIONS, KNOWN_CHATS_FLUSH_SECONDS, PHASH_MATCH_RADIUS, OCR_CACHE_MAINTENANCE_SECONDS, PHOTO_OCR_MIN_CHARS, PHOTO_OCR_MIN_CONF
+from .ocr import (
+    extract_text_until,
+    get_ocr_stats,
+    track_ocr_time,
+    ensure_engine_probed,
+    missing_languages,
+    probe_tesseract,
+    reprobe_tesseract,
+    shutdown_ocr_pool,
+    EngineInfo,
+    ImageSource,
+    OCRError,
+    OCRBusyError,
+)
+from .text import contains_link
+from .cache import LRUCache, all_cache_stats, photo_ocr_cache, video_ocr_cache
+from .db import (
+    convert_to_incremental_vacuum,
+    get_ocr_cache,
+    set_ocr_cache,
+    upsert_known_chat,
+    list_known_chats,
+    list_phash_keys,
+    flush_known_chats,
+    flush_ocr_cache_hits,
+    maintain_ocr_cache,
+    ocr_cache_stats,
+    run_db,
+    close_db,
+)
+from .video import compute_image_phash
+from .media import (
+    SpillDir,
+    close_media_client,
+    download_media,
+    get_media_stats,
+    get_photo_stats,
+    photo_ladder,
+    record_photo,
+    stream_video_frame,
+    stream_video_keyframes,
+)
+from .phash_index import phash_distance, phash_index
+from .singleflight import SingleFlight, ai_image_flight, all_flight_stats, photo_ocr_flight, video_ocr_flight
 from .limiter import ocr_limited, get_ocr_limit, set_ocr_limit
 from .storage import (
     load_rules,
+    compiled_rules,
     add_keyword,
     remove_keyword,
     add_regex,
@@ -58,6 +99,8 @@ from .storage import (
     set_newcomer_buffer,
     set_captcha,
     set_first_message_strict,
+    set_video_scan,
+    set_ocr_language,
 )
 from .state import (
     on_user_join,
@@ -78,16 +121,23 @@ from .ai_provider import (
     set_ai_model,
     load_ai_credentials,
     get_ai_stats,
+    image_cache_keys,
+    lookup_ai_verdict,
+    prune_ai_verdict_cache,
     set_ai_threshold,
     classify_image_with_openrouter,
     set_ai_exclusive,
     get_ai_exclusive,
+    start_ai_client,
+    close_ai_client,
 )
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
 )
+# httpx logs every request URL at INFO, and Bot API URLs embed the token
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger("ad_guard_bot")
 
 
@@ -191,7 +241,7 @@ async def cmd_add_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("请提供关键词，例如：/add_keyword 低价代充")
         return
     keyword = " ".join(context.args)
-    rules = add_keyword(keyword, chat_id)
+    rules = await run_db(add_keyword, keyword, chat_id)
     await update.message.reply_text(f"已添加关键词：{keyword}\n当前群当前共 {len(rules.keywords)} 个关键词。")
 
 
@@ -211,14 +261,14 @@ async def cmd_remove_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("请提供要删除的关键词。")
         return
     keyword = " ".join(context.args)
-    rules = remove_keyword(keyword, chat_id)
+    rules = await run_db(remove_keyword, keyword, chat_id)
     await update.message.reply_text(f"已删除关键词：{keyword}\n当前群当前共 {len(rules.keywords)} 个关键词。")
 
 
 async def cmd_list_keywords(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """List all keywords for current chat."""
     chat_id = await _resolve_admin_chat(update)
-    rules = load_rules(chat_id)
+    rules = await run_db(load_rules, chat_id)
     if not rules.keywords:
         await update.message.reply_text("暂无关键词。")
         return
@@ -241,11 +291,10 @@ async def cmd_add_regex(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
     pattern = " ".join(context.args)
     try:
-        re.compile(pattern)
-    except re.error as exc:
+        rules = await run_db(add_regex, pattern, chat_id)
+    except ValueError as exc:
         await update.message.reply_text(f"正则无效：{exc}")
         return
-    rules = add_regex(pattern, chat_id)
     await update.message.reply_text(f"已添加正则：{pattern}\n当前群当前共 {len(rules.regexes)} 个正则。")
 
 
@@ -261,14 +310,14 @@ async def cmd_remove_regex(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("请提供要删除的正则表达式。")
         return
     pattern = " ".join(context.args)
-    rules = remove_regex(pattern, chat_id)
+    rules = await run_db(remove_regex, pattern, chat_id)
     await update.message.reply_text(f"已删除正则：{pattern}\n当前群当前共 {len(rules.regexes)} 个正则。")
 
 
 async def cmd_list_regex(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """List all regex patterns for current chat."""
     chat_id = await _resolve_admin_chat(update)
-    rules = load_rules(chat_id)
+    rules = await run_db(load_rules, chat_id)
     if not rules.regexes:
         await update.message.reply_text("暂无正则。")
         return
@@ -291,7 +340,7 @@ async def cmd_set_action(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     action = context.args[0].strip()
     try:
-        rules = set_action(action, chat_id)
+        rules = await run_db(set_action, action, chat_id)
         await update.message.reply_text(f"已设置动作：{rules.action}")
     except ValueError:
         await update.message.reply_text("无效动作：请用 " + " | ".join(sorted(ALLOWED_ACTIONS)))
@@ -313,7 +362,7 @@ async def cmd_set_mute_seconds(update: Update, context: ContextTypes.DEFAULT_TYP
     except ValueError:
         await update.message.reply_text("请输入合法的整数秒数。")
         return
-    rules = set_mute_seconds(seconds, chat_id)
+    rules = await run_db(set_mute_seconds, seconds, chat_id)
     await update.message.reply_text(f"已设置禁言时长：{rules.mute_seconds} 秒")
 
 
@@ -334,7 +383,7 @@ async def cmd_set_newcomer_buffer(update: Update, context: ContextTypes.DEFAULT_
     try:
         seconds = int(context.args[0])
         mode = context.args[1]
-        rules = set_newcomer_buffer(seconds, mode, chat_id)
+        rules = await run_db(set_newcomer_buffer, seconds, mode, chat_id)
         await update.message.reply_text(f"已设置新人缓冲：{rules.newcomer_buffer_seconds}s，模式：{rules.newcomer_buffer_mode}")
     except ValueError as exc:
         await update.message.reply_text(f"参数错误：{exc}")
@@ -364,7 +413,7 @@ async def cmd_set_captcha(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text("timeout_seconds 必须为整数")
             return
     try:
-        rules = set_captcha(enabled, timeout, chat_id)
+        rules = await run_db(set_captcha, enabled, timeout, chat_id)
         await update.message.reply_text(
             f"验证码：{'开启' if rules.captcha_enabled else '关闭'}，超时：{rules.captcha_timeout_seconds}s")
     except ValueError as exc:
@@ -384,10 +433,38 @@ async def cmd_set_first_message_strict(update: Update, context: ContextTypes.DEF
         return
     onoff = context.args[0].lower()
     enabled = onoff in {"on", "true", "1", "enable", "enabled"}
-    rules = set_first_message_strict(enabled, chat_id)
+    rules = await run_db(set_first_message_strict, enabled, chat_id)
     await update.message.reply_text(f"首条消息加严：{'开启' if rules.first_message_strict else '关闭'}")
 
 
+async def cmd_set_video_scan(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Set how many video keyframes are OCR'd and the time budget for them.
+
+    Usage: /set_video_scan <frames 1-10> [seconds 1-120]
+    """
+    user_id = update.effective_user.id
+    chat_id = await _resolve_admin_chat(update)
+    chat_admin_ids = await _get_chat_admin_ids(context, chat_id)
+    if not ensure_admin(user_id, chat_admin_ids):
+        await update.message.reply_text("无权限。仅限群管理员或全局管理员。")
+        return
+    if not context.args:
+        await update.message.reply_text("用法：/set_video_scan <帧数1-10> [秒数1-120]")
+        return
+    try:
+        frames = int(context.args[0])
+        seconds = int(context.args[1]) if len(context.args) >= 2 else None
+    except ValueError:
+        await update.message.reply_text("帧数和秒数必须为整数")
+        return
+    try:
+        rules = await run_db(set_video_scan, frames, seconds, chat_id)
+        await update.message.reply_text(
+            f"视频扫描：{rules.video_frames} 帧，时间预算：{rules.video_scan_seconds}s")
+    except ValueError as exc:
+        await update.message.reply_text(f"参数错误：{exc}")
+
+
 async def cmd_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Run self-update script (global admins only)."""
     user_id = update.effective_user.id
@@ -427,7 +504,7 @@ async def cmd_version(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
 
 async def cmd_cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Show OCR persistent cache count and current OCR concurrency limit."""
+    """Show OCR cache size/hit rate/evictions, OCR concurrency limit and pHash index size."""
     user_id = update.effective_user.id
     chat_id = await _resolve_admin_chat(update)
     chat_admin_ids = await _get_chat_admin_ids(context, chat_id)
@@ -435,15 +512,59 @@ async def cmd_cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("无权限。仅限群管理员或全局管理员。")
         return
     try:
-        from .db import count_ocr_cache
-        cnt = count_ocr_cache()
-        await update.message.reply_text(f"OCR 缓存条数（持久化）：{cnt}\n并发上限：{get_ocr_limit()}")
+        stats = await run_db(ocr_cache_stats)
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / lookups:.1%}" if lookups else "无数据"
+        ocr = get_ocr_stats()
+        vacuum_note = "" if stats["incremental_vacuum"] else "，未启用增量回收，可执行 /db_vacuum"
+        lines = [
+            f"OCR 缓存条数（持久化）：{stats['rows']}（文本 {stats['payload_bytes'] / 1048576:.1f} MB）",
+            f"命中率（按文件）：{hit_rate}（命中 {stats['hits']} / 查询 {lookups}）",
+            f"pHash 命中：精确 {stats['phash_hits']} / {stats['phash_hits'] + stats['phash_misses']}，"
+            f"近似 {stats['near_hits']} / {stats['near_hits'] + stats['near_misses']}",
+            f"淘汰条数：{stats['evictions']}",
+            f"数据库文件：{stats['file_bytes'] / 1048576:.1f} MB（可回收 {stats['free_bytes'] / 1048576:.1f} MB{vacuum_note}）",
+            f"并发上限：{get_ocr_limit()}",
+            f"OCR：{ocr['images']} 张图，{ocr['checked']} 个任务（整图或分块），无文字跳过 {ocr['skipped']} 个",
+            f"OCR 语言路径（按任务）：固定 {ocr['fixed']}，快速语言即可 {ocr['fast']}，升级完整语言 {ocr['escalated']}",
+            f"长图分块：{ocr['tiled']} 张，完成 {ocr['strips']} 块，命中后取消 {ocr['strips_cancelled']} 块，"
+            f"失败 {ocr['strips_failed']} 块",
+            f"提前命中缓存：命中 {stats['partial_hits']} / 查询 {stats['partial_hits'] + stats['partial_misses']}",
+            f"pHash 索引：{len(phash_index)} 个（近似半径 {PHASH_MATCH_RADIUS}）",
+            "内存缓存：",
+        ]
+        for c in all_cache_stats():
+            lookups = c["hits"] + c["misses"]
+            rate = f"{c['hits'] / lookups:.1%}" if lookups else "无数据"
+            budget = f"/{c['max_bytes'] / 1048576:.0f}" if c["max_bytes"] else ""
+            lines.append(
+                f"- {c['name']}：{c['entries']}/{c['capacity']} 条，{c['bytes'] / 1048576:.1f}{budget} MB，"
+                f"命中率 {rate}，淘汰 {c['evictions']}，过期 {c['expirations']}"
+            )
+        media = get_media_stats()
+        if media["bytes_total"]:
+            lines.append(
+                f"视频取帧：流式 {media['streamed']} 次，完整下载 {media['full_downloads']} 次，"
+                f"下载 {media['bytes_fetched'] / 1048576:.1f} / {media['bytes_total'] / 1048576:.1f} MB，"
+                f"流式试探后回退 {media['bytes_probed'] / 1048576:.1f} MB"
+            )
+        photos = get_photo_stats()
+        if photos["photos"]:
+            lines.append(
+                f"图片 OCR：{photos['photos']:.0f} 张，升级原图 {photos['escalated'] / photos['photos']:.1%}，"
+                f"下载 {photos['bytes_fetched'] / 1048576:.1f} MB（全取原图 {photos['bytes_largest'] / 1048576:.1f} MB），"
+                f"平均 OCR {photos['ocr_ms'] / photos['photos']:.0f} ms"
+            )
+        lines.append("并发去重（执行 / 合并等待）：")
+        for f in all_flight_stats():
+            lines.append(f"- {f['name']}：{f['leaders']} / {f['shared']}")
+        await update.message.reply_text("\n".join(lines))
     except Exception as exc:
         await update.message.reply_text(f"查询失败：{exc}")
 
 
 async def cmd_cache_clear(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Clear the persistent OCR cache table."""
+    """Clear the persistent OCR cache table, the pHash index and in-memory OCR caches."""
     user_id = update.effective_user.id
     chat_id = await _resolve_admin_chat(update)
     chat_admin_ids = await _get_chat_admin_ids(context, chat_id)
@@ -452,12 +573,33 @@ async def cmd_cache_clear(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     try:
         from .db import clear_ocr_cache
-        clear_ocr_cache()
+        await run_db(clear_ocr_cache)
+        phash_index.clear()
+        photo_ocr_cache.clear()
+        video_ocr_cache.clear()
         await update.message.reply_text("已清空 OCR 持久化缓存。")
     except Exception as exc:
         await update.message.reply_text(f"清空失败：{exc}")
 
 
+async def cmd_db_vacuum(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Convert the database to incremental vacuum with a full VACUUM (global admins only)."""
+    user_id = update.effective_user.id
+    if ADMIN_IDS and user_id not in ADMIN_IDS:
+        await update.message.reply_text("无权限。仅限全局管理员。")
+        return
+    await update.message.reply_text("开始整理数据库，期间写入会等待，请稍候…")
+    try:
+        converted = await run_db(convert_to_incremental_vacuum)
+    except ValueError as exc:
+        await update.message.reply_text(f"未执行：{exc}")
+        return
+    except Exception as exc:
+        await update.message.reply_text(f"整理失败：{exc}")
+        return
+    await update.message.reply_text("已启用增量回收空间。" if converted else "已是增量回收模式，无需整理。")
+
+
 async def cmd_set_ocr_limit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Set OCR concurrency limit at runtime (process-wide)."""
     user_id = update.effective_user.id
@@ -477,6 +619,64 @@ async def cmd_set_ocr_limit(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("请输入合法的整数。")
 
 
+def _describe_engine(info: EngineInfo) -> str:
+    if not info.available:
+        return info.error
+    langs = ", ".join(info.languages) or "未知"
+    return f"Tesseract {info.version}（{info.backend}），已安装语言：{langs}"
+
+
+async def cmd_ocr_engine(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Re-probe the Tesseract binary (version, languages) and show the result."""
+    user_id = update.effective_user.id
+    chat_id = await _resolve_admin_chat(update)
+    chat_admin_ids = await _get_chat_admin_ids(context, chat_id)
+    if not ensure_admin(user_id, chat_admin_ids):
+        await update.message.reply_text("无权限。仅限群管理员或全局管理员。")
+        return
+    info = await asyncio.to_thread(reprobe_tesseract)
+    await update.message.reply_text(f"{_describe_engine(info)}\n当前 OCR 语言：{OCR_LANGUAGES}")
+
+
+async def cmd_set_ocr_lang(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Set this chat's OCR language mode and, optionally, its language set.
+
+    Usage: /set_ocr_lang <fixed|adaptive|default> [languages|default]
+    """
+    user_id = update.effective_user.id
+    chat_id = await _resolve_admin_chat(update)
+    chat_admin_ids = await _get_chat_admin_ids(context, chat_id)
+    if not ensure_admin(user_id, chat_admin_ids):
+        await update.message.reply_text("无权限。仅限群管理员或全局管理员。")
+        return
+    if not context.args:
+        languages, mode = await _ocr_settings(chat_id)
+        await update.message.reply_text(
+            f"当前 OCR 语言：{languages}，模式：{mode}\n"
+            "用法：/set_ocr_lang <fixed|adaptive|default> [语言如 chi_sim+eng|default]"
+        )
+        return
+    mode = context.args[0].lower()
+    languages = context.args[1] if len(context.args) >= 2 else None
+    if mode == "default":
+        mode = ""
+    if languages is not None and languages.lower() == "default":
+        languages = ""
+    if languages:
+        await ensure_engine_probed()
+        missing = missing_languages(languages)
+        if missing:
+            await update.message.reply_text(f"Tesseract 未安装语言包：{'+'.join(missing)}")
+            return
+    try:
+        await run_db(set_ocr_language, mode, languages, chat_id)
+    except ValueError as exc:
+        await update.message.reply_text(f"参数错误：{exc}")
+        return
+    languages, mode = await _ocr_settings(chat_id)
+    await update.message.reply_text(f"OCR 语言：{languages}，模式：{mode}")
+
+
 async def cmd_set_target(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Set target chat id for private admin commands."""
     if not context.args:
@@ -552,7 +752,9 @@ async def cmd_ai_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         return
     stats = get_ai_stats()
     await update.message.reply_text(
-        f"AI 模式：{stats['mode']}\n模型：{stats['model']}\n调用：{stats['calls_total']} 次，失败：{stats['calls_failed']} 次\n最近错误：{stats['last_error']}\n阈值：{stats['threshold']}"
+        f"AI 模式：{stats['mode']}\n模型：{stats['model']}\n调用：{stats['calls_total']} 次，失败：{stats['calls_failed']} 次\n最近错误：{stats['last_error']}\n阈值：{stats['threshold']}\n"
+        f"缓存命中：内存 {stats['cache_hits_memory']} 次，数据库 {stats['cache_hits_db']} 次，近似图片 {stats['cache_hits_similar']} 次，未命中 {stats['cache_misses']} 次\n"
+        f"批量请求：{stats['batches']} 次（{stats['batched_items']} 条），解析失败回退：{stats['batch_fallbacks']} 次"
     )
 
 
@@ -588,28 +790,15 @@ def _gather_message_text(message: Message) -> str:
     return "\n".join(parts).strip()
 
 
-def _match_rules(text: str, chat_id: Optional[int]) -> Tuple[bool, List[str], List[str]]:
+async def _match_rules(text: str, chat_id: Optional[int]) -> Tuple[bool, List[str], List[str]]:
     """Match normalized keywords and regexes against provided text.
 
     Returns a tuple of (matched, hit_keywords, hit_regexes).
     Normalization mitigates common obfuscation (e.g., leet, zero-width).
+    Uses the cached compiled rules, so no DB access happens per message
+    once a chat's rules are loaded (a miss loads them on the DB thread pool).
     """
-    rules = load_rules(chat_id)
-    hit_keywords: List[str] = []
-    hit_regexes: List[str] = []
-    text_norm = normalize_text(text)
-    for k in rules.keywords:
-        if not k:
-            continue
-        if normalize_text(k) in text_norm:
-            hit_keywords.append(k)
-    for p in rules.regexes:
-        try:
-            if re.search(p, text, flags=re.IGNORECASE) or re.search(p, text_norm, flags=re.IGNORECASE):
-                hit_regexes.append(p)
-        except re.error:
-            continue
-    return (bool(hit_keywords or hit_regexes), hit_keywords, hit_regexes)
+    return (await compiled_rules(chat_id)).match(text)
 
 
 def _admin_action_keyboard(chat_id: int, user_id: int, message_id: int) -> InlineKeyboardMarkup:
@@ -708,7 +897,7 @@ async def _unmute_user(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id
 async def _handle_action(update: Update, context: ContextTypes.DEFAULT_TYPE, matched_text: str, hit_keywords: List[str], hit_regexes: List[str]) -> None:
     """Execute configured action (delete/mute/notify combinations)."""
     chat_id = update.effective_chat.id if update.effective_chat else None
-    rules = load_rules(chat_id)
+    rules = (await compiled_rules(chat_id)).rules
     action = rules.action
     message = update.effective_message
     user_id = update.effective_user.id if update.effective_user else None
@@ -795,7 +984,7 @@ async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     chat_id = cm.chat.id
     member: ChatMember = cm.new_chat_member
     if member.status == ChatMember.MEMBER:
-        rules = load_rules(chat_id)
+        rules = (await compiled_rules(chat_id)).rules
         require_captcha = rules.captcha_enabled
         state = on_user_join(chat_id, member.user.id, require_captcha)
         # Apply newcomer buffer restrictions
@@ -878,7 +1067,7 @@ async def on_text_or_caption(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = update.effective_user.id if update.effective_user else None
 
     # Newcomer first-message strictness
-    rules = load_rules(chat_id)
+    rules = (await compiled_rules(chat_id)).rules
     if user_id:
         msg_count = increment_message_count(chat_id, user_id)
         within_buffer = is_within_buffer(chat_id, user_id, rules.newcomer_buffer_seconds)
@@ -901,7 +1090,7 @@ async def on_text_or_caption(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     # 先走本地规则
-    matched, hit_keywords, hit_regexes = _match_rules(text, chat_id)
+    matched, hit_keywords, hit_regexes = await _match_rules(text, chat_id)
     if matched:
         await _handle_action(update, context, text, hit_keywords, hit_regexes)
         return
@@ -914,11 +1103,358 @@ async def on_text_or_caption(update: Update, context: ContextTypes.DEFAULT_TYPE)
             return
 
 
+async def _cached_ocr_text(
+    file_unique_id: str,
+    fetch_image: Callable[[SpillDir], Awaitable[Optional[ImageSource]]],
+    memory: LRUCache,
+    flight: SingleFlight,
+    chat_id: Optional[int],
+    stop: Optional[Callable[[str], bool]] = None,
+    fetch_larger: Optional[Callable[[SpillDir], Awaitable[Optional[ImageSource]]]] = None,
+) -> str:
+    """OCR text for a media file through the cache tiers.
+
+    Lookup order: in-process LRU `memory` (per media type) → SQLite by
+    file_unique_id → (download) SQLite by pHash of the image → Tesseract.
+    `fetch_image` downloads the media (in memory, or into the given SpillDir
+    when large) and returns the image to hash and OCR. Text found in a lower tier is written
+    back to every tier above it. Concurrent misses for the same file share one
+    run of everything after the memory tier through `flight`. OCR uses the
+    chat's language settings, and text read with non-default languages or
+    in adaptive mode is cached under separate keys (see _lang_key).
+
+    `stop` lets tiled OCR of tall images end early once the text read so far
+    is enough (e.g. a rule matched). Partial text (early stop, or strips that
+    failed) is only cached when it matches the chat's rules on its own, under
+    _partial_key, and a caller from another chat that joined the flight reads
+    the image again without the leader's predicate.
+
+    With `fetch_larger`, `fetch_image` returns a reduced size of a photo and
+    the larger one is only fetched when that OCR is weak (see _weak_ocr_text).
+    Weak text is not cached when the larger size cannot be fetched, so a later
+    look still escalates.
+    """
+    languages, mode = await _ocr_settings(chat_id)
+    key = _lang_key(file_unique_id, languages, mode)
+    for cache_key in (key, await _partial_key(key, chat_id)):
+        cached = memory.get(cache_key)
+        if cached is not None:
+            return cached
+
+    async def load() -> Tuple[str, bool, Optional[int]]:
+        text, complete = await _load_ocr_text(
+            key, fetch_image, memory, languages, mode, chat_id, stop, fetch_larger
+        )
+        return text, complete, chat_id
+
+    text, complete, stopped_for = await flight.do(key, load)
+    if not complete and stopped_for != chat_id:
+        text, _ = await _load_ocr_text(key, fetch_image, memory, languages, mode, chat_id, stop, fetch_larger)
+    return text
+
+
+async def _load_ocr_text(
+    key: str,
+    fetch_image: Callable[[SpillDir], Awaitable[Optional[ImageSource]]],
+    memory: LRUCache,
+    languages: str,
+    mode: str,
+    chat_id: Optional[int],
+    stop: Optional[Callable[[str], bool]] = None,
+    fetch_larger: Optional[Callable[[SpillDir], Awaitable[Optional[ImageSource]]]] = None,
+) -> Tuple[str, bool]:
+    """Text for `key` and whether it is complete (False after an early stop or failed strips)."""
+    partial_key = await _partial_key(key, chat_id)
+    # The file_unique_id tiers are checked before anything is downloaded
+    for cache_key, tier in ((key, "file"), (partial_key, "partial")):
+        db_text = await _db_ocr_text(cache_key, tier)
+        if db_text:
+            memory.set(cache_key, db_text)
+            return db_text, cache_key == key
+
+    with SpillDir() as spill:
+        image = await fetch_image(spill)
+        if not image:
+            return "", True
+        try:
+            reduced = fetch_larger is not None
+            ocr_text, complete, conf = await _ocr_image(image, languages, mode, stop=stop, reduced=reduced)
+            if reduced and _weak_ocr_text(ocr_text, complete, conf, stop):
+                larger = await fetch_larger(spill)
+                if not larger:
+                    # Weak text of the reduced size is never filed under the
+                    # photo's key, or the next look would not escalate
+                    return ocr_text, complete
+                larger_text, complete, _ = await _ocr_image(larger, languages, mode, stop=stop)
+                ocr_text = larger_text or ocr_text
+        except OCRBusyError as e:
+            logger.warning("OCR 繁忙，跳过：%s", e)
+            return "", True
+        except OCRError as e:
+            logger.error("OCR 不可用：%s", e)
+            return "", True
+    if not ocr_text:
+        return ocr_text, complete
+    if complete:
+        store_key = key
+    elif (await _match_rules(ocr_text, chat_id))[0]:
+        store_key = partial_key
+    else:
+        return ocr_text, complete
+    memory.set(store_key, ocr_text)
+    try:
+        await run_db(set_ocr_cache, store_key, ocr_text)
+    except Exception:
+        pass
+    return ocr_text, complete
+
+
+async def _ocr_settings(chat_id: Optional[int]) -> Tuple[str, str]:
+    """OCR languages and language mode for a chat: its overrides, else the globals."""
+    rules = (await compiled_rules(chat_id)).rules
+    return rules.ocr_languages or OCR_LANGUAGES, rules.ocr_lang_mode or OCR_LANG_MODE
+
+
+def _lang_key(key: str, languages: str, mode: str) -> str:
+    """OCR cache key for text read with `languages` in language `mode`.
+
+    Only full-set reads of the default languages keep the bare key. Adaptive
+    text may come from the fast languages alone, so it is kept apart
+    ("<key>@adaptive:<languages>") instead of being served to fixed-mode chats.
+    """
+    if mode == "adaptive":
+        return f"{key}@adaptive:{languages}"
+    return key if languages == OCR_LANGUAGES else f"{key}@{languages}"
+
+
+async def _partial_key(key: str, chat_id: Optional[int]) -> str:
+    """Cache key for text from a scan stopped early because it matched `chat_id`'s rules.
+
+    Such text only says "this matches", so it is filed under the rules'
+    fingerprint: editing the rules (or another chat's different rules)
+    misses it and rescans.
+    """
+    return f"partial:{(await compiled_rules(chat_id)).fingerprint}:{key}"
+
+
+async def _db_ocr_text(key: str, tier: str = "file") -> Optional[str]:
+    """SQLite OCR cache tier (file_unique_id or pHash key); errors count as a miss.
+
+    Every cache read goes through here so a failing database never drops an
+    OCR result that is already in hand or about to be computed.
+    """
+    try:
+        return await run_db(get_ocr_cache, key, tier)
+    except Exception as exc:
+        logger.warning("读取 OCR 缓存失败，按未命中处理: %s", exc)
+        return None
+
+
+async def _ocr_image(
+    image: ImageSource,
+    languages: str,
+    mode: str,
+    phash: Optional[str] = None,
+    stop: Optional[Callable[[str], bool]] = None,
+    reduced: bool = False,
+) -> Tuple[str, bool, Optional[float]]:
+    """OCR text of one image: SQLite by exact pHash, then near-duplicate pHash, then Tesseract.
+
+    Returns (text, complete, confidence); complete is False when `stop` ended
+    tiled OCR early, confidence is None for cached text or images without
+    text (see extract_text_until). Only complete text is stored under the
+    image's pHash, and for a `reduced` photo size not text too weak to trust
+    (see _weak_ocr_text), so the full-size retry is not served it back.
+    OCRBusyError/OCRError propagate.
+    """
+    phash = phash or await asyncio.to_thread(compute_image_phash, image)
+    if phash:
+        ph_text = await _db_ocr_text(_lang_key(phash, languages, mode), "phash")
+        if ph_text:
+            return ph_text, True, None
+        # Near-duplicate (recompressed, slightly cropped) of an image seen before
+        for near in _similar_phashes(phash):
+            near_text = await _db_ocr_text(_lang_key(near, languages, mode), "near")
+            if near_text:
+                try:
+                    await run_db(set_ocr_cache, _lang_key(phash, languages, mode), near_text)
+                    phash_index.add(phash)
+                except Exception:
+                    pass
+                return near_text, True, None
+    ocr_text, complete, conf = await extract_text_until(
+        image, languages, mode, stop, admit=ocr_limited, need_conf=reduced
+    )
+    if reduced and _weak_ocr_text(ocr_text, complete, conf, stop):
+        return ocr_text, complete, conf
+    if ocr_text and complete and phash:
+        try:
+            await run_db(set_ocr_cache, _lang_key(phash, languages, mode), ocr_text)
+            phash_index.add(phash)
+        except Exception:
+            pass
+    return ocr_text, complete, conf
+
+
+def _weak_ocr_text(
+    text: str, complete: bool, conf: Optional[float], stop: Optional[Callable[[str], bool]]
+) -> bool:
+    """Whether OCR of a reduced photo size is too poor to skip the largest size."""
+    if not complete or conf is None:
+        return False  # stopped on a match, cached text, or the prefilter saw no text
+    if stop is not None and stop(text):
+        return False
+    return conf < PHOTO_OCR_MIN_CONF or sum(ch.isalnum() for ch in text) < PHOTO_OCR_MIN_CHARS
+
+
+async def _scan_video_text(
+    video: Video,
+    chat_id: Optional[int],
+    caption: str,
+) -> str:
+    """OCR text of several keyframes of `video`, per the chat's video scan rules.
+
+    Frames are sampled in one ffmpeg run (fixed interval plus scene changes),
+    near-identical frames (pHash within PHASH_MATCH_RADIUS) are OCR'd once,
+    and scanning stops as soon as caption + text so far matches the chat's
+    rules or the time budget runs out. Complete scans are cached under
+    "<file_unique_id>:<frames>" (plus the languages, see _lang_key); a scan
+    stopped because its frame text alone matched is cached under
+    _partial_key. A chat with video_frames=1 uses the first-frame path
+    instead (see on_video).
+    """
+    compiled = await compiled_rules(chat_id)
+    rules = compiled.rules
+    languages, mode = await _ocr_settings(chat_id)
+    count = rules.video_frames
+    key = _lang_key(f"{video.file_unique_id}:{count}", languages, mode)
+    partial_key = await _partial_key(key, chat_id)
+    for cache_key in (key, partial_key):
+        cached = video_ocr_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    async def scan() -> str:
+        for cache_key, tier in ((key, "file"), (partial_key, "partial")):
+            db_text = await _db_ocr_text(cache_key, tier)
+            if db_text:
+                video_ocr_cache.set(cache_key, db_text)
+                return db_text
+        deadline = time.monotonic() + rules.video_scan_seconds
+        texts: List[str] = []
+        complete = True
+        with SpillDir() as spill:
+            name = f"video_{video.file_unique_id}.mp4"
+            interval = max(0.5, (video.duration or 10) / count)
+            frames = await stream_video_keyframes(
+                await video.get_file(), spill, name, count, interval,
+                timeout=max(1.0, deadline - time.monotonic()),
+            )
+            if not frames:
+                logger.warning("无法提取视频关键帧")
+                return ""
+            seen: List[str] = []
+            for frame in frames:
+                phash = await asyncio.to_thread(compute_image_phash, frame)
+                if phash and any((phash_distance(phash, s) or 0) <= PHASH_MATCH_RADIUS for s in seen):
+                    continue
+                if phash:
+                    seen.append(phash)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    complete = False
+                    break
+                try:
+                    text, _, _ = await asyncio.wait_for(_ocr_image(frame, languages, mode, phash), remaining)
+                except asyncio.TimeoutError:
+                    complete = False
+                    break
+                except OCRBusyError as e:
+                    logger.warning("OCR 繁忙，跳过：%s", e)
+                    complete = False
+                    break
+                except OCRError as e:
+                    logger.error("OCR 不可用：%s", e)
+                    complete = False
+                    break
+                if text and text not in texts:
+                    texts.append(text)
+                    if compiled.match("\n".join([caption] + texts))[0]:
+                        complete = False  # early stop: later frames were never looked at
+                        break
+        ocr_text = "\n".join(texts)
+        if complete:
+            store_key = key
+        elif ocr_text and compiled.match(ocr_text)[0]:
+            # Stopped early on a match the caption did not help with
+            store_key = partial_key
+        else:
+            return ocr_text
+        video_ocr_cache.set(store_key, ocr_text)
+        try:
+            await run_db(set_ocr_cache, store_key, ocr_text)
+        except Exception:
+            pass
+        return ocr_text
+
+    # Early stop and budget depend on the chat, so the flight is per chat too
+    return await video_ocr_flight.do(f"{key}:{chat_id}", scan)
+
+
+def _similar_phashes(phash: Optional[str]) -> List[str]:
+    """Stored pHashes within PHASH_MATCH_RADIUS of `phash` (excluding itself), nearest first."""
+    if not phash or PHASH_MATCH_RADIUS <= 0:
+        return []
+    return [p for _, p in phash_index.search(phash, PHASH_MATCH_RADIUS) if p != phash]
+
+
+async def _classify_image_cached(file_unique_id: str, image: ImageSource) -> Tuple[bool, float, str]:
+    """AI verdict for an image, reusing exact and near-duplicate cached verdicts.
+
+    The file_unique_id key has already been looked up by _ai_image_verdict.
+    """
+    phash = await asyncio.to_thread(compute_image_phash, image)
+    similar = [image_cache_keys(phash=p)[0] for p in _similar_phashes(phash)]
+    verdict = await classify_image_with_openrouter(
+        image,
+        cache_keys=image_cache_keys(file_unique_id, phash),
+        similar_keys=similar,
+        checked_keys=image_cache_keys(file_unique_id),
+    )
+    if phash and verdict[2] != "error":
+        phash_index.add(phash)
+    return verdict
+
+
+async def _ai_image_verdict(
+    file_unique_id: str, fetch_image: Callable[[SpillDir], Awaitable[Optional[ImageSource]]]
+) -> Optional[Tuple[bool, float, str]]:
+    """AI verdict for a media file; None when no image could be fetched.
+
+    A cached verdict for the file is used without downloading it; concurrent
+    misses for the same file share one download and classification.
+    """
+    # A miss is counted by the pHash lookup after the download, once per image
+    cached = await lookup_ai_verdict(image_cache_keys(file_unique_id), count_miss=False)
+    if cached is not None:
+        return cached
+
+    async def download_and_classify() -> Optional[Tuple[bool, float, str]]:
+        with SpillDir() as spill:
+            image = await fetch_image(spill)
+            if not image:
+                return None
+            return await _classify_image_cached(file_unique_id, image)
+
+    return await ai_image_flight.do(file_unique_id, download_and_classify)
+
+
 async def on_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle incoming photo messages.
 
     - If AI exclusive mode is enabled, send the image to AI and act on result.
-    - Otherwise, attempt local OCR with caching and DB persistence.
+    - Otherwise, look up OCR text in memory, then SQLite by file_unique_id and
+      by pHash, and only run Tesseract on a miss (see _cached_ocr_text).
     - Combine caption and OCR text before rule/AI checks.
     """
     if update.effective_chat:
@@ -932,51 +1468,58 @@ async def on_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if message.caption:
         text_parts.append(message.caption)
 
+    # OCR a mid-size variant first; the largest is fetched only if that reads poorly
+    ladder = photo_ladder(message.photo)
+    photo = ladder[-1]
+    fetched: List[PhotoSize] = []
+
+    def fetcher(size: PhotoSize) -> Callable[[SpillDir], Awaitable[Optional[ImageSource]]]:
+        async def fetch(spill: SpillDir) -> Optional[ImageSource]:
+            fetched.append(size)
+            return await download_media(await size.get_file(), spill, f"photo_{size.file_unique_id}.jpg")
+        return fetch
+
+    fetch_photo = fetcher(photo)
+
     # AI exclusive: send image to AI provider, skip local OCR
     if should_use_ai() and get_ai_exclusive():
         try:
-            photo = message.photo[-1]
-            file = await photo.get_file()
-            with tempfile.TemporaryDirectory() as tmpdir:
-                tmp_path = Path(tmpdir) / f"photo_{file.file_unique_id}.jpg"
-                await file.download_to_drive(custom_path=str(tmp_path))
-                is_ad, score, label = await classify_image_with_openrouter(tmp_path)
+            verdict = await _ai_image_verdict(photo.file_unique_id, fetch_photo)
+            if verdict is not None:
+                is_ad, score, label = verdict
                 if is_ad:
                     await _handle_action(update, context, f"[AI:{label} {score:.2f}]", ["AI"], [])
                 return
         except Exception as exc:
             logger.warning("AI 图片判别失败，回退本地: %s", exc)
     # fallback to local OCR path
-    try:
-        photo = message.photo[-1]
-        file = await photo.get_file()
-        cached = ocr_text_cache.get(file.file_unique_id)
-        if cached is not None:
-            text_parts.append(cached)
-        else:
-            with tempfile.TemporaryDirectory() as tmpdir:
-                tmp_path = Path(tmpdir) / f"photo_{file.file_unique_id}.jpg"
-                await file.download_to_drive(custom_path=str(tmp_path))
-                try:
-                    async with ocr_limited():
-                        ocr_text = extract_text_from_image(tmp_path, OCR_LANGUAGES)
-                    if ocr_text:
-                        text_parts.append(ocr_text)
-                        ocr_text_cache.set(file.file_unique_id, ocr_text)
-                        try:
-                            set_ocr_cache(file.file_unique_id, ocr_text)
-                        except Exception:
-                            pass
-                except OCRError as e:
-                    logger.error("OCR 不可用：%s", e)
-    except Exception as exc:
-        logger.warning("下载或处理图片失败: %s", exc)
+    fetched.clear()
+    # Worker time of the OCR jobs only: no download, admission queue or cache lookups
+    compiled = await compiled_rules(chat_id)
+    with track_ocr_time() as ocr_seconds:
+        try:
+            ocr_text = await _cached_ocr_text(
+                photo.file_unique_id, fetcher(ladder[0]), photo_ocr_cache, photo_ocr_flight, chat_id,
+                stop=lambda text: compiled.match("\n".join(text_parts + [text]))[0],
+                fetch_larger=fetch_photo if len(ladder) > 1 else None,
+            )
+            if ocr_text:
+                text_parts.append(ocr_text)
+        except Exception as exc:
+            logger.warning("下载或处理图片失败: %s", exc)
+    if fetched:
+        record_photo(
+            sum(size.file_size or 0 for size in fetched),
+            photo.file_size or 0,
+            ocr_seconds[0] * 1000.0,
+            escalated=len(fetched) > 1,
+        )
 
     combined_text = "\n".join([t for t in text_parts if t]).strip()
     if not combined_text:
         return
 
-    matched, hit_keywords, hit_regexes = _match_rules(combined_text, chat_id)
+    matched, hit_keywords, hit_regexes = await _match_rules(combined_text, chat_id)
     if matched:
         await _handle_action(update, context, combined_text, hit_keywords, hit_regexes)
 
@@ -985,7 +1528,9 @@ async def on_video(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle incoming video messages.
 
     - In AI exclusive mode, extract first frame and send to AI.
-    - Otherwise, extract first frame and perform local OCR with pHash cache.
+    - Otherwise, OCR the first frame with pHash cache, or, when the chat's
+      video_frames > 1, several keyframes within its time budget (see
+      _scan_video_text).
     """
     if update.effective_chat:
         try:
@@ -998,71 +1543,38 @@ async def on_video(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if message.caption:
         text_parts.append(message.caption)
 
+    video = message.video
+    if not video:
+        return
+
+    async def fetch_frame(spill: SpillDir) -> Optional[ImageSource]:
+        frame = await stream_video_frame(await video.get_file(), spill, f"video_{video.file_unique_id}.mp4")
+        if not frame:
+            logger.warning("无法提取视频首帧")
+        return frame
+
     # AI exclusive path for video (first frame)
     if should_use_ai() and get_ai_exclusive():
         try:
-            video = message.video
-            if not video:
+            verdict = await _ai_image_verdict(video.file_unique_id, fetch_frame)
+            if verdict is not None:
+                is_ad, score, label = verdict
+                if is_ad:
+                    await _handle_action(update, context, f"[AI:{label} {score:.2f}]", ["AI"], [])
                 return
-            file = await video.get_file()
-            with tempfile.TemporaryDirectory() as tmpdir:
-                vpath = Path(tmpdir) / f"video_{file.file_unique_id}.mp4"
-                fpath = Path(tmpdir) / f"frame_{file.file_unique_id}.jpg"
-                await file.download_to_drive(custom_path=str(vpath))
-                if extract_first_frame(vpath, fpath):
-                    is_ad, score, label = await classify_image_with_openrouter(fpath)
-                    if is_ad:
-                        await _handle_action(update, context, f"[AI:{label} {score:.2f}]", ["AI"], [])
-                    return
         except Exception as exc:
             logger.warning("AI 视频判别失败，回退本地: %s", exc)
 
     # fallback to local OCR path
     try:
-        video = message.video
-        if not video:
-            return
-        file = await video.get_file()
-        cached = ocr_text_cache.get(file.file_unique_id)
-        if cached is not None:
-            text_parts.append(cached)
+        if (await compiled_rules(chat_id)).rules.video_frames > 1:
+            ocr_text = await _scan_video_text(video, chat_id, message.caption or "")
         else:
-            try:
-                db_text = get_ocr_cache(file.file_unique_id)
-                if db_text:
-                    ocr_text_cache.set(file.file_unique_id, db_text)
-                    text_parts.append(db_text)
-                else:
-                    with tempfile.TemporaryDirectory() as tmpdir:
-                        vpath = Path(tmpdir) / f"video_{file.file_unique_id}.mp4"
-                        fpath = Path(tmpdir) / f"frame_{file.file_unique_id}.jpg"
-                        await file.download_to_drive(custom_path=str(vpath))
-                        if extract_first_frame(vpath, fpath):
-                            phash = compute_image_phash(fpath)
-                            if phash:
-                                ph_text = get_ocr_cache(phash)
-                                if ph_text:
-                                    ocr_text_cache.set(file.file_unique_id, ph_text)
-                                    text_parts.append(ph_text)
-                                else:
-                                    try:
-                                        async with ocr_limited():
-                                            ocr_text = extract_text_from_image(fpath, OCR_LANGUAGES)
-                                        if ocr_text:
-                                            text_parts.append(ocr_text)
-                                            ocr_text_cache.set(file.file_unique_id, ocr_text)
-                                            try:
-                                                set_ocr_cache(file.file_unique_id, ocr_text)
-                                                if phash:
-                                                    set_ocr_cache(phash, ocr_text)
-                                            except Exception:
-                                                pass
-                                    except OCRError as e:
-                                        logger.error("OCR 不可用：%s", e)
-                        else:
-                            logger.warning("无法提取视频首帧")
-            except Exception as exc:
-                logger.warning("处理视频失败: %s", exc)
+            ocr_text = await _cached_ocr_text(
+                video.file_unique_id, fetch_frame, video_ocr_cache, video_ocr_flight, chat_id
+            )
+        if ocr_text:
+            text_parts.append(ocr_text)
     except Exception as exc:
         logger.warning("下载或处理视频失败: %s", exc)
 
@@ -1070,7 +1582,7 @@ async def on_video(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not combined_text:
         return
 
-    matched, hit_keywords, hit_regexes = _match_rules(combined_text, chat_id)
+    matched, hit_keywords, hit_regexes = await _match_rules(combined_text, chat_id)
     if matched:
         await _handle_action(update, context, combined_text, hit_keywords, hit_regexes)
 
@@ -1157,6 +1669,73 @@ async def on_admin_action(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         pass
 
 
+# Periodic maintenance tasks started in _post_init, cancelled on shutdown
+_background_tasks: List[asyncio.Task] = []
+
+
+def _start_periodic(interval: float, fn) -> None:
+    """Run blocking `fn` on the DB thread pool every `interval` seconds."""
+    async def runner() -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_db(fn)
+            except Exception as exc:
+                logger.warning("后台任务 %s 失败: %s", fn.__name__, exc)
+
+    _background_tasks.append(asyncio.create_task(runner()))
+
+
+def _maintain_ocr_cache() -> None:
+    """OCR cache policy run, dropping pHashes it evicted from the near-duplicate index (blocking)."""
+    for phash in maintain_ocr_cache():
+        phash_index.discard(phash)
+
+
+def _prune_ai_verdict_cache() -> None:
+    """Expire AI verdicts, dropping pHashes left without any cache entry from the index (blocking)."""
+    for phash in prune_ai_verdict_cache():
+        phash_index.discard(phash)
+
+
+async def _post_init(app) -> None:
+    """Open shared clients and start background maintenance after initialization."""
+    await start_ai_client()
+    info = await asyncio.to_thread(probe_tesseract)
+    if info.available:
+        logger.info("OCR 引擎：%s", _describe_engine(info))
+    else:
+        logger.warning("OCR 引擎不可用：%s", info.error)
+    try:
+        loaded = phash_index.update(await run_db(list_phash_keys))
+        logger.info("已加载 %d 个图片 pHash 到近似去重索引", loaded)
+    except Exception as exc:
+        logger.warning("加载 pHash 索引失败: %s", exc)
+    _start_periodic(KNOWN_CHATS_FLUSH_SECONDS, flush_known_chats)
+    _start_periodic(3600, _prune_ai_verdict_cache)
+    _start_periodic(OCR_CACHE_MAINTENANCE_SECONDS, _maintain_ocr_cache)
+
+
+async def _post_shutdown(app) -> None:
+    """Stop background tasks, flush buffered writes and release resources."""
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    try:
+        await run_db(flush_known_chats)
+    except Exception as exc:
+        logger.warning("写入已知群组失败: %s", exc)
+    try:
+        await run_db(flush_ocr_cache_hits)
+    except Exception as exc:
+        logger.warning("写入 OCR 缓存命中时间失败: %s", exc)
+    await close_ai_client()
+    await close_media_client()
+    shutdown_ocr_pool()
+    close_db()
+
+
 async def main() -> None:
     """Entry point: init DB/migrations, build app, register handlers, run polling."""
     token = TELEGRAM_BOT_TOKEN
@@ -1175,6 +1754,8 @@ async def main() -> None:
         ApplicationBuilder()
         .token(token)
         .concurrent_updates(True)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
         .build()
     )
 
@@ -1191,11 +1772,15 @@ async def main() -> None:
     app.add_handler(CommandHandler("set_newcomer_buffer", cmd_set_newcomer_buffer))
     app.add_handler(CommandHandler("set_captcha", cmd_set_captcha))
     app.add_handler(CommandHandler("set_first_message_strict", cmd_set_first_message_strict))
+    app.add_handler(CommandHandler("set_video_scan", cmd_set_video_scan))
     app.add_handler(CommandHandler("update", cmd_update))
     app.add_handler(CommandHandler("version", cmd_version))
     app.add_handler(CommandHandler("cache_stats", cmd_cache_stats))
     app.add_handler(CommandHandler("cache_clear", cmd_cache_clear))
+    app.add_handler(CommandHandler("db_vacuum", cmd_db_vacuum))
     app.add_handler(CommandHandler("set_ocr_limit", cmd_set_ocr_limit))
+    app.add_handler(CommandHandler("ocr_engine", cmd_ocr_engine))
+    app.add_handler(CommandHandler("set_ocr_lang", cmd_set_ocr_lang))
     app.add_handler(CommandHandler("set_ai", cmd_set_ai))
     app.add_handler(CommandHandler("set_ai_model", cmd_set_ai_model))
     app.add_handler(CommandHandler("set_ai_key", cmd_set_ai_key))
@@ -1,28 +1,127 @@
-"""In-memory LRU cache for OCR results.
+"""In-memory LRU caches for OCR results and AI verdicts.
 
-Used to avoid repeated OCR for identical media within the process lifetime.
-Persistent cache is implemented in the database (see db.py).
+Used to avoid repeated OCR or AI calls for identical media/text within the
+process lifetime. Persistent caches are implemented in the database (see db.py).
+
+Each LRUCache is bounded by entry count and, optionally, by an approximate
+memory budget in bytes; entries may also expire after a TTL. Named instances
+register themselves so /cache_stats can report their hit/miss/eviction counters
+(see all_cache_stats).
 """
+import sys
+import time
 from collections import OrderedDict
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    MEM_CACHE_MAX_ENTRIES,
+    MEM_CACHE_PHOTO_OCR_BYTES,
+    MEM_CACHE_TTL_SECONDS,
+    MEM_CACHE_VIDEO_OCR_BYTES,
+)
+
+_registry: Dict[str, "LRUCache"] = {}
+
+
+def _estimate_size(obj: Any) -> int:
+    """Approximate memory held by a cached key or value (containers included)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        size += sum(_estimate_size(item) for item in obj)
+    return size
+
 
 class LRUCache:
-    def __init__(self, capacity: int = 512) -> None:
+    def __init__(
+        self,
+        capacity: int = 512,
+        max_bytes: int = 0,
+        ttl_seconds: float = 0,
+        name: Optional[str] = None,
+    ) -> None:
         self.capacity = capacity
-        self.store: OrderedDict[str, str] = OrderedDict()
+        self.max_bytes = max_bytes  # 0 = bounded by capacity only
+        self.ttl_seconds = ttl_seconds  # 0 = entries never expire
+        self.name = name
+        # key -> (value, size in bytes, expiry on the monotonic clock or 0)
+        self.store: OrderedDict[str, Tuple[Any, int, float]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if name:
+            _registry[name] = self
 
-    def get(self, key: str) -> Optional[str]:
-        if key in self.store:
-            self.store.move_to_end(key)
-            return self.store[key]
-        return None
+    def __len__(self) -> int:
+        return len(self.store)
 
-    def set(self, key: str, value: str) -> None:
+    def _drop(self, key: str) -> None:
+        _, size, _ = self.store.pop(key)
+        self.bytes -= size
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.store.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[2] and entry[2] <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.store.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, value: Any) -> None:
+        size = _estimate_size(key) + _estimate_size(value)
+        if self.max_bytes and size > self.max_bytes:
+            return  # would evict everything else and still not fit
         if key in self.store:
-            self.store.move_to_end(key)
-        self.store[key] = value
-        if len(self.store) > self.capacity:
-            self.store.popitem(last=False)
+            self._drop(key)
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0.0
+        self.store[key] = (value, size, expires)
+        self.bytes += size
+        while len(self.store) > self.capacity or (self.max_bytes and self.bytes > self.max_bytes):
+            oldest = next(iter(self.store))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.store.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "entries": len(self.store),
+            "capacity": self.capacity,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def all_cache_stats() -> List[Dict[str, Any]]:
+    """Stats of every named cache, in creation order."""
+    return [cache.stats() for cache in _registry.values()]
 
 
-ocr_text_cache = LRUCache(capacity=1024)
\ No newline at end of file
+# OCR text by file_unique_id, one instance per media type so a burst of one
+# kind cannot flush the other
+photo_ocr_cache = LRUCache(
+    capacity=MEM_CACHE_MAX_ENTRIES,
+    max_bytes=MEM_CACHE_PHOTO_OCR_BYTES,
+    ttl_seconds=MEM_CACHE_TTL_SECONDS,
+    name="photo_ocr",
+)
+video_ocr_cache = LRUCache(
+    capacity=MEM_CACHE_MAX_ENTRIES,
+    max_bytes=MEM_CACHE_VIDEO_OCR_BYTES,
+    ttl_seconds=MEM_CACHE_TTL_SECONDS,
+    name="video_ocr",
+)
@@ -4,7 +4,7 @@ Loads .env if present. Exposes directories and runtime flags used by modules.
 """
 import os
 from pathlib import Path
-from typing import Set
+from typing import Optional, Set
 
 from dotenv import load_dotenv
 
@@ -17,6 +17,68 @@ APP_DIR = WORKSPACE_DIR / "app"
 DATA_DIR = Path(os.environ.get("DATA_DIR", str(APP_DIR / "data")))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# SQLite reader connections kept open (plus one writer)
+try:
+    DB_READER_CONNECTIONS = max(1, int(os.environ.get("DB_READER_CONNECTIONS", "4")))
+except ValueError:
+    DB_READER_CONNECTIONS = 4
+
+# Interval (seconds) for writing buffered known-chat updates to SQLite
+try:
+    KNOWN_CHATS_FLUSH_SECONDS = max(1, int(os.environ.get("KNOWN_CHATS_FLUSH_SECONDS", "30")))
+except ValueError:
+    KNOWN_CHATS_FLUSH_SECONDS = 30
+
+# Shared HTTP client for AI calls: pool limits and optional HTTP/2 (needs the h2 package)
+try:
+    AI_HTTP_MAX_CONNECTIONS = max(1, int(os.environ.get("AI_HTTP_MAX_CONNECTIONS", "20")))
+except ValueError:
+    AI_HTTP_MAX_CONNECTIONS = 20
+try:
+    AI_HTTP_MAX_KEEPALIVE = max(0, int(os.environ.get("AI_HTTP_MAX_KEEPALIVE", "10")))
+except ValueError:
+    AI_HTTP_MAX_KEEPALIVE = 10
+AI_HTTP2 = os.environ.get("AI_HTTP2", "off").strip().lower() in {"1", "true", "on", "yes"}
+
+# In-memory OCR text caches (photo / video): max entries, memory budget (MB) and
+# TTL in seconds (0 = no expiry)
+try:
+    MEM_CACHE_MAX_ENTRIES = max(1, int(os.environ.get("MEM_CACHE_MAX_ENTRIES", "10000")))
+except ValueError:
+    MEM_CACHE_MAX_ENTRIES = 10000
+try:
+    MEM_CACHE_PHOTO_OCR_BYTES = max(1, int(os.environ.get("MEM_CACHE_PHOTO_OCR_MB", "16"))) * 1024 * 1024
+except ValueError:
+    MEM_CACHE_PHOTO_OCR_BYTES = 16 * 1024 * 1024
+try:
+    MEM_CACHE_VIDEO_OCR_BYTES = max(1, int(os.environ.get("MEM_CACHE_VIDEO_OCR_MB", "8"))) * 1024 * 1024
+except ValueError:
+    MEM_CACHE_VIDEO_OCR_BYTES = 8 * 1024 * 1024
+try:
+    MEM_CACHE_TTL_SECONDS = max(0, int(os.environ.get("MEM_CACHE_TTL_SECONDS", "86400")))
+except ValueError:
+    MEM_CACHE_TTL_SECONDS = 86400
+
+# AI verdict cache: in-memory entries and TTL (seconds) for both tiers
+try:
+    AI_VERDICT_MEM_ENTRIES = max(1, int(os.environ.get("AI_VERDICT_MEM_ENTRIES", "4096")))
+except ValueError:
+    AI_VERDICT_MEM_ENTRIES = 4096
+try:
+    AI_VERDICT_TTL_SECONDS = max(60, int(os.environ.get("AI_VERDICT_TTL_SECONDS", "604800")))
+except ValueError:
+    AI_VERDICT_TTL_SECONDS = 604800
+
+# AI text micro-batching: max texts per request (1 disables) and max wait (ms)
+try:
+    AI_BATCH_MAX_ITEMS = max(1, int(os.environ.get("AI_BATCH_MAX_ITEMS", "8")))
+except ValueError:
+    AI_BATCH_MAX_ITEMS = 8
+try:
+    AI_BATCH_MAX_WAIT_MS = max(0, int(os.environ.get("AI_BATCH_MAX_WAIT_MS", "20")))
+except ValueError:
+    AI_BATCH_MAX_WAIT_MS = 20
+
 # Telegram bot token
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
 
@@ -26,6 +88,21 @@ ADMIN_IDS: Set[int] = {5898830697}
 # OCR languages (tesseract language codes)
 OCR_LANGUAGES = os.environ.get("OCR_LANGUAGES", "chi_sim+eng")
 
+# OCR language selection: "fixed" always uses the full language set; "adaptive"
+# first runs OCR_FAST_LANGUAGES and re-runs with the full set only when the mean
+# word confidence is below OCR_ADAPTIVE_MIN_CONF (0-100), i.e. when the text is
+# likely in another script (CJK). Chats can override both in their rules.
+# Adaptive is unvalidated on real CJK / mixed-script images, hence not the
+# default (see `scripts/bench.py ocr-lang-mode`).
+OCR_LANG_MODE = os.environ.get("OCR_LANG_MODE", "fixed").strip().lower()
+if OCR_LANG_MODE not in {"fixed", "adaptive"}:
+    OCR_LANG_MODE = "fixed"
+OCR_FAST_LANGUAGES = os.environ.get("OCR_FAST_LANGUAGES", "eng").strip() or "eng"
+try:
+    OCR_ADAPTIVE_MIN_CONF = min(100, max(0, int(os.environ.get("OCR_ADAPTIVE_MIN_CONF", "70"))))
+except ValueError:
+    OCR_ADAPTIVE_MIN_CONF = 70
+
 # Allowed actions for rule hit
 ALLOWED_ACTIONS = {
     "delete",
@@ -58,4 +135,145 @@ if _raw_log_chats:
 try:
     OCR_MAX_CONCURRENCY = max(1, int(os.environ.get("OCR_MAX_CONCURRENCY", "2")))
 except ValueError:
-    OCR_MAX_CONCURRENCY = 2
\ No newline at end of file
+    OCR_MAX_CONCURRENCY = 2
+
+# OCR backlog: jobs allowed to wait for a worker before new ones are rejected
+try:
+    OCR_MAX_QUEUE = max(0, int(os.environ.get("OCR_MAX_QUEUE", "32")))
+except ValueError:
+    OCR_MAX_QUEUE = 32
+
+# Per-job OCR timeout (seconds); the tesseract process is killed when exceeded
+try:
+    OCR_JOB_TIMEOUT_SECONDS = max(1, int(os.environ.get("OCR_JOB_TIMEOUT_SECONDS", "30")))
+except ValueError:
+    OCR_JOB_TIMEOUT_SECONDS = 30
+
+# OCR engine binding: "tesserocr" keeps libtesseract and its models loaded in each
+# worker (pip install tesserocr), "pytesseract" runs the tesseract CLI per image,
+# "auto" prefers tesserocr when it is installed
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto").strip().lower()
+if OCR_BACKEND not in {"auto", "tesserocr", "pytesseract"}:
+    OCR_BACKEND = "auto"
+
+# OCR preprocessing: downscale so the longer side is at most OCR_MAX_SIDE pixels,
+# grayscale, binarize, and OCR only the bands that contain text. The cap only
+# trims huge images by default: a lower one shrinks small text in phone
+# screenshots, so measure it with `scripts/bench.py ocr-max-side --samples` first
+OCR_PREPROCESS = os.environ.get("OCR_PREPROCESS", "on").strip().lower() in {"1", "true", "on", "yes"}
+try:
+    OCR_MAX_SIDE = max(0, int(os.environ.get("OCR_MAX_SIDE", "3000")))
+except ValueError:
+    OCR_MAX_SIDE = 3000
+OCR_BINARIZE = os.environ.get("OCR_BINARIZE", "on").strip().lower() in {"1", "true", "on", "yes"}
+# Band cropping is off by default: its recall has only been checked on synthetic
+# English renders, not on real chi_sim+eng screenshots (turn on after measuring)
+OCR_TEXT_REGIONS = os.environ.get("OCR_TEXT_REGIONS", "off").strip().lower() in {"1", "true", "on", "yes"}
+
+# Tesseract page segmentation (--psm 0-13) and engine (--oem 0-3) modes; unset = Tesseract's defaults
+OCR_PSM: Optional[int]
+OCR_OEM: Optional[int]
+try:
+    OCR_PSM = int(os.environ.get("OCR_PSM", ""))
+    if not 0 <= OCR_PSM <= 13:
+        OCR_PSM = None
+except ValueError:
+    OCR_PSM = None
+try:
+    OCR_OEM = int(os.environ.get("OCR_OEM", ""))
+    if not 0 <= OCR_OEM <= 3:
+        OCR_OEM = None
+except ValueError:
+    OCR_OEM = None
+
+# Tall images (at least OCR_TILE_MIN_HEIGHT px; 0 disables) are OCR'd as
+# horizontal strips of OCR_TILE_HEIGHT px overlapping by OCR_TILE_OVERLAP px,
+# in parallel on the OCR workers
+try:
+    OCR_TILE_MIN_HEIGHT = max(0, int(os.environ.get("OCR_TILE_MIN_HEIGHT", "2400")))
+except ValueError:
+    OCR_TILE_MIN_HEIGHT = 2400
+try:
+    OCR_TILE_HEIGHT = max(200, int(os.environ.get("OCR_TILE_HEIGHT", "1000")))
+except ValueError:
+    OCR_TILE_HEIGHT = 1000
+try:
+    OCR_TILE_OVERLAP = max(0, int(os.environ.get("OCR_TILE_OVERLAP", "80")))
+except ValueError:
+    OCR_TILE_OVERLAP = 80
+OCR_TILE_OVERLAP = min(OCR_TILE_OVERLAP, OCR_TILE_HEIGHT // 2)
+
+# Skip OCR for images whose stroke-based text score (share of text-like rows,
+# 0-1) is below OCR_PREFILTER_MIN_SCORE; 0 disables the prefilter. Off by
+# default: the threshold was only tuned on synthetic images (0.01 there), so
+# set it after checking real photos with `scripts/bench.py prefilter --samples`
+try:
+    OCR_PREFILTER_MIN_SCORE = min(1.0, max(0.0, float(os.environ.get("OCR_PREFILTER_MIN_SCORE", "0"))))
+except ValueError:
+    OCR_PREFILTER_MIN_SCORE = 0.0
+
+# Hard timeout (seconds) for one ffmpeg frame extraction; the process is killed after it
+try:
+    FFMPEG_TIMEOUT_SECONDS = max(1, int(os.environ.get("FFMPEG_TIMEOUT_SECONDS", "20")))
+except ValueError:
+    FFMPEG_TIMEOUT_SECONDS = 20
+
+# Media up to this size (MB) is downloaded into memory; larger files spill to a temp dir
+try:
+    MEDIA_MEMORY_LIMIT_BYTES = max(0, int(os.environ.get("MEDIA_MEMORY_LIMIT_MB", "8"))) * 1024 * 1024
+except ValueError:
+    MEDIA_MEMORY_LIMIT_BYTES = 8 * 1024 * 1024
+
+# Stream faststart videos into ffmpeg and stop downloading once the frame is decoded
+VIDEO_STREAMING = os.environ.get("VIDEO_STREAMING", "on").strip().lower() in {"1", "true", "on", "yes"}
+
+# Photo resolution ladder: OCR the smallest Telegram size whose longer side is at
+# least PHOTO_OCR_START_SIDE px (0 = always the largest) and only download the
+# largest size when that text's mean confidence is below PHOTO_OCR_MIN_CONF or
+# it has fewer than PHOTO_OCR_MIN_CHARS letters/digits
+try:
+    PHOTO_OCR_START_SIDE = max(0, int(os.environ.get("PHOTO_OCR_START_SIDE", "1280")))
+except ValueError:
+    PHOTO_OCR_START_SIDE = 1280
+try:
+    PHOTO_OCR_MIN_CONF = min(100, max(0, int(os.environ.get("PHOTO_OCR_MIN_CONF", "60"))))
+except ValueError:
+    PHOTO_OCR_MIN_CONF = 60
+try:
+    PHOTO_OCR_MIN_CHARS = max(0, int(os.environ.get("PHOTO_OCR_MIN_CHARS", "8")))
+except ValueError:
+    PHOTO_OCR_MIN_CHARS = 8
+
+# Per-pattern regex time budget (milliseconds); slower patterns are interrupted
+# and quarantined until the chat's rules change
+try:
+    REGEX_TIME_BUDGET_MS = max(1, int(os.environ.get("REGEX_TIME_BUDGET_MS", "100")))
+except ValueError:
+    REGEX_TIME_BUDGET_MS = 100
+
+# Max Hamming distance (bits of the 64-bit pHash) for reusing a near-duplicate
+# image's cached OCR text / AI verdict; 0 = exact matches only
+try:
+    PHASH_MATCH_RADIUS = min(16, max(0, int(os.environ.get("PHASH_MATCH_RADIUS", "6"))))
+except ValueError:
+    PHASH_MATCH_RADIUS = 6
+
+# Persistent OCR cache policy: entries expire OCR_CACHE_TTL_DAYS after they were
+# written (hits do not extend this), and the least recently hit are evicted
+# beyond the row/size limits (0 = unlimited)
+try:
+    OCR_CACHE_MAX_ROWS = max(0, int(os.environ.get("OCR_CACHE_MAX_ROWS", "200000")))
+except ValueError:
+    OCR_CACHE_MAX_ROWS = 200000
+try:
+    OCR_CACHE_MAX_BYTES = max(0, int(os.environ.get("OCR_CACHE_MAX_MB", "256"))) * 1024 * 1024
+except ValueError:
+    OCR_CACHE_MAX_BYTES = 256 * 1024 * 1024
+try:
+    OCR_CACHE_TTL_SECONDS = max(0, int(os.environ.get("OCR_CACHE_TTL_DAYS", "30"))) * 86400
+except ValueError:
+    OCR_CACHE_TTL_SECONDS = 30 * 86400
+try:
+    OCR_CACHE_MAINTENANCE_SECONDS = max(60, int(os.environ.get("OCR_CACHE_MAINTENANCE_SECONDS", "600")))
+except ValueError:
+    OCR_CACHE_MAINTENANCE_SECONDS = 600
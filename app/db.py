@@ -3,16 +3,41 @@
 Tables:
 - rules: per-chat configuration
 - user_state: newcomer/captcha runtime state persistence
-- ocr_cache: persistent OCR text cache (by unique id or pHash)
+- ocr_cache: persistent OCR text cache (by unique id or pHash), bounded by
+  TTL, row and byte limits with least-recently-hit eviction (maintain_ocr_cache)
+- ai_verdict_cache: AI classification results (by text digest, unique id or pHash)
 
 This module exposes small helpers for each table to keep other modules clean.
+
+Connections are long-lived: one writer connection (serialized by a lock) and a
+small pool of reader connections, each configured once and reusing sqlite3's
+per-connection prepared-statement cache. Helpers are blocking; async handlers
+call them through run_db so DB I/O happens on a dedicated thread pool.
 """
+import asyncio
+import functools
 import json
+import logging
+import os
+import queue
+import re
+import shutil
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from .config import (
+    DATA_DIR,
+    DB_READER_CONNECTIONS,
+    OCR_CACHE_MAX_BYTES,
+    OCR_CACHE_MAX_ROWS,
+    OCR_CACHE_TTL_SECONDS,
+)
 
-from .config import DATA_DIR
+logger = logging.getLogger(__name__)
 
 DB_PATH = DATA_DIR / "ad_guard.db"
 
@@ -29,7 +54,11 @@ CREATE TABLE IF NOT EXISTS rules (
   captcha_timeout_seconds INTEGER NOT NULL,
   first_message_strict INTEGER NOT NULL,
   domain_whitelist TEXT NOT NULL DEFAULT '[]',
-  domain_blacklist TEXT NOT NULL DEFAULT '[]'
+  domain_blacklist TEXT NOT NULL DEFAULT '[]',
+  video_frames INTEGER NOT NULL DEFAULT 1,
+  video_scan_seconds INTEGER NOT NULL DEFAULT 10,
+  ocr_languages TEXT NOT NULL DEFAULT '',
+  ocr_lang_mode TEXT NOT NULL DEFAULT ''
 );
 
 CREATE TABLE IF NOT EXISTS user_state (
@@ -47,6 +76,15 @@ CREATE TABLE IF NOT EXISTS user_state (
 CREATE TABLE IF NOT EXISTS ocr_cache (
   key TEXT PRIMARY KEY,          -- file_unique_id or perceptual hash
   text TEXT NOT NULL,
+  created_at INTEGER NOT NULL,
+  last_hit_at INTEGER NOT NULL DEFAULT 0,
+  size_bytes INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ai_verdict_cache (
+  key TEXT PRIMARY KEY,          -- model-scoped text digest, file_unique_id or pHash
+  label TEXT NOT NULL,
+  score REAL NOT NULL,
   created_at INTEGER NOT NULL
 );
 
@@ -59,24 +97,172 @@ CREATE TABLE IF NOT EXISTS known_chats (
 """
 
 
-def _connect() -> sqlite3.Connection:
-    """Open a SQLite connection with safe defaults and ensured path.
+# Prepared statements kept per connection (sqlite3 caches them by SQL text)
+_STATEMENT_CACHE_SIZE = 256
+
+T = TypeVar("T")
+
+
+class _ConnectionManager:
+    """One shared writer connection plus a bounded pool of reader connections."""
+
+    def __init__(self, path: Path, readers: int) -> None:
+        self.path = path
+        self.max_readers = max(1, readers)
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+        self._idle_readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    def _open(self, readonly: bool) -> sqlite3.Connection:
+        """Open a SQLite connection with safe defaults and ensured path.
+
+        Returns:
+            sqlite3.Connection: Connection with WAL and NORMAL sync.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, cached_statements=_STATEMENT_CACHE_SIZE
+        )
+        if not readonly:
+            # Must precede the WAL switch, which writes the header of a new file;
+            # an existing database only picks it up on the next VACUUM.
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON;")
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Yield the writer connection inside a transaction (commit or rollback)."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open(readonly=False)
+            with self._writer:
+                yield self._writer
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a reader connection (rows are sqlite3.Row), creating one if allowed."""
+        try:
+            conn = self._idle_readers.get_nowait()
+        except queue.Empty:
+            with self._readers_lock:
+                create = len(self._all_readers) < self.max_readers
+                if create:
+                    conn = self._open(readonly=True)
+                    self._all_readers.append(conn)
+            if not create:
+                conn = self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put(conn)
+
+    def close(self) -> None:
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers.clear()
+            self._idle_readers = queue.LifoQueue()
+
+
+_db = _ConnectionManager(DB_PATH, DB_READER_CONNECTIONS)
+# Writer + readers; more threads would only queue on the connections
+_db_executor = ThreadPoolExecutor(max_workers=DB_READER_CONNECTIONS + 1, thread_name_prefix="db")
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking DB helper on the DB thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
 
-    Returns:
-        sqlite3.Connection: Connection with WAL and NORMAL sync.
-    """
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
-    return conn
+
+def close_db() -> None:
+    """Close pooled connections (on shutdown)."""
+    _db.close()
 
 
 def init_db() -> None:
     """Initialize database schema and run in-place migrations."""
-    with _connect() as conn:
+    with _db.write() as conn:
+        incremental = _enable_incremental_vacuum(conn)
         conn.executescript(_SCHEMA)
         _migrate_rules_add_columns(conn)
+        _migrate_ocr_cache_add_columns(conn)
+    if not incremental:
+        logger.warning(
+            "数据库未启用增量回收空间，缓存淘汰后文件不会缩小；可由全局管理员执行 /db_vacuum 转换"
+            "（需整理整个数据库，约需数据库大小 2 倍的空闲磁盘）"
+        )
+
+
+def _enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """Check that auto_vacuum=INCREMENTAL is active so freed pages can be returned.
+
+    The writer requests the mode when it opens, which takes effect on a new
+    file. An existing database needs a full VACUUM rebuild, which is left to
+    convert_to_incremental_vacuum (an explicit admin step) instead of
+    blocking startup.
+
+    Args:
+        conn: Open SQLite connection outside any transaction.
+
+    Returns:
+        bool: Whether incremental vacuum is active.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return True
+    if conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+        return False
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    return True
+
+
+def _db_file_bytes() -> int:
+    """Size of the database file plus its WAL on disk."""
+    total = 0
+    for path in (DB_PATH, DB_PATH.with_name(DB_PATH.name + "-wal")):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def convert_to_incremental_vacuum() -> bool:
+    """Rebuild an existing database with auto_vacuum=INCREMENTAL (blocking; run via run_db).
+
+    VACUUM rewrites the whole file: writes wait on the writer connection
+    until it finishes, and it needs free disk space of about twice the
+    database size, which is checked first.
+
+    Returns:
+        bool: True if converted, False if incremental vacuum was already active.
+
+    Raises:
+        ValueError: Not enough free disk space.
+    """
+    with _db.read() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+    needed = 2 * _db_file_bytes()
+    free = shutil.disk_usage(DB_PATH.parent).free
+    if free < needed:
+        raise ValueError(f"磁盘空间不足：需要约 {needed / 1048576:.0f} MB，可用 {free / 1048576:.0f} MB")
+    logger.info("正在转换数据库为增量回收空间（VACUUM）…")
+    with _db.write() as conn:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
 
 
 def _migrate_rules_add_columns(conn: sqlite3.Connection) -> None:
@@ -92,10 +278,36 @@ def _migrate_rules_add_columns(conn: sqlite3.Connection) -> None:
         to_add["domain_whitelist"] = "TEXT NOT NULL DEFAULT '[]'"
     if "domain_blacklist" not in cols:
         to_add["domain_blacklist"] = "TEXT NOT NULL DEFAULT '[]'"
+    if "video_frames" not in cols:
+        to_add["video_frames"] = "INTEGER NOT NULL DEFAULT 1"
+    if "video_scan_seconds" not in cols:
+        to_add["video_scan_seconds"] = "INTEGER NOT NULL DEFAULT 10"
+    if "ocr_languages" not in cols:
+        to_add["ocr_languages"] = "TEXT NOT NULL DEFAULT ''"
+    if "ocr_lang_mode" not in cols:
+        to_add["ocr_lang_mode"] = "TEXT NOT NULL DEFAULT ''"
     for col, decl in to_add.items():
         conn.execute(f"ALTER TABLE rules ADD COLUMN {col} {decl}")
 
 
+def _migrate_ocr_cache_add_columns(conn: sqlite3.Connection) -> None:
+    """Idempotently add `last_hit_at`/`size_bytes` to `ocr_cache` and backfill them.
+
+    Args:
+        conn: Open SQLite connection.
+    """
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(ocr_cache)").fetchall()}
+    if "last_hit_at" not in cols:
+        conn.execute("ALTER TABLE ocr_cache ADD COLUMN last_hit_at INTEGER NOT NULL DEFAULT 0")
+    if "size_bytes" not in cols:
+        conn.execute("ALTER TABLE ocr_cache ADD COLUMN size_bytes INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        "UPDATE ocr_cache SET last_hit_at = created_at, size_bytes = length(CAST(key AS BLOB)) + length(CAST(text AS BLOB)) WHERE last_hit_at = 0"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_hit ON ocr_cache(last_hit_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_created ON ocr_cache(created_at)")
+
+
 def get_rules_row(chat_id: Optional[int]) -> Optional[Dict[str, Any]]:
     """Fetch a raw dict row from `rules` by chat.
 
@@ -106,8 +318,7 @@ def get_rules_row(chat_id: Optional[int]) -> Optional[Dict[str, Any]]:
         dict | None: Row mapping or None if not found.
     """
     chat_id = int(chat_id or 0)
-    with _connect() as conn:
-        conn.row_factory = sqlite3.Row
+    with _db.read() as conn:
         cur = conn.execute("SELECT * FROM rules WHERE chat_id = ?", (chat_id,))
         row = cur.fetchone()
         if not row:
@@ -128,19 +339,29 @@ def upsert_rules_row(chat_id: Optional[int], data: Dict[str, Any]) -> None:
         "newcomer_buffer_seconds", "newcomer_buffer_mode",
         "captcha_enabled", "captcha_timeout_seconds", "first_message_strict",
         "domain_whitelist", "domain_blacklist",
+        "video_frames", "video_scan_seconds",
+        "ocr_languages", "ocr_lang_mode",
     )
+    # Columns not modelled by `Rules` fall back to their schema defaults
+    defaults = {
+        "domain_whitelist": "[]", "domain_blacklist": "[]",
+        "video_frames": 1, "video_scan_seconds": 10,
+        "ocr_languages": "", "ocr_lang_mode": "",
+    }
     values = tuple(
-        data.get(name) for name in fields
+        data.get(name, defaults.get(name)) for name in fields
     )
-    with _connect() as conn:
+    with _db.write() as conn:
         conn.execute(
             """
             INSERT INTO rules (
               chat_id, keywords, regexes, action, mute_seconds,
               newcomer_buffer_seconds, newcomer_buffer_mode, captcha_enabled,
               captcha_timeout_seconds, first_message_strict,
-              domain_whitelist, domain_blacklist
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+              domain_whitelist, domain_blacklist,
+              video_frames, video_scan_seconds,
+              ocr_languages, ocr_lang_mode
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(chat_id) DO UPDATE SET
               keywords=excluded.keywords,
               regexes=excluded.regexes,
@@ -152,7 +373,11 @@ def upsert_rules_row(chat_id: Optional[int], data: Dict[str, Any]) -> None:
               captcha_timeout_seconds=excluded.captcha_timeout_seconds,
               first_message_strict=excluded.first_message_strict,
               domain_whitelist=excluded.domain_whitelist,
-              domain_blacklist=excluded.domain_blacklist
+              domain_blacklist=excluded.domain_blacklist,
+              video_frames=excluded.video_frames,
+              video_scan_seconds=excluded.video_scan_seconds,
+              ocr_languages=excluded.ocr_languages,
+              ocr_lang_mode=excluded.ocr_lang_mode
             """,
             (chat_id, *values)
         )
@@ -164,7 +389,7 @@ def migrate_from_json_if_needed() -> None:
     Skips if the `rules` table already has at least one row.
     """
     # If DB already has any row, skip
-    with _connect() as conn:
+    with _db.read() as conn:
         cur = conn.execute("SELECT 1 FROM rules LIMIT 1")
         if cur.fetchone():
             return
@@ -211,8 +436,7 @@ def get_user_state_row(chat_id: int, user_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         dict | None: Row mapping or None if not found.
     """
-    with _connect() as conn:
-        conn.row_factory = sqlite3.Row
+    with _db.read() as conn:
         cur = conn.execute(
             "SELECT * FROM user_state WHERE chat_id = ? AND user_id = ?",
             (int(chat_id), int(user_id)),
@@ -236,7 +460,7 @@ def upsert_user_state(chat_id: int, user_id: int, data: Dict[str, Any]) -> None:
         data: Dict containing required fields listed in `essential_state_fields`.
     """
     vals = {k: data.get(k) for k in essential_state_fields}
-    with _connect() as conn:
+    with _db.write() as conn:
         conn.execute(
             """
             INSERT INTO user_state (
@@ -276,45 +500,77 @@ def update_user_state_fields(chat_id: int, user_id: int, fields: Dict[str, Any])
         sets.append(f"{k} = ?")
         args += (v,)
     args += (int(chat_id), int(user_id))
-    with _connect() as conn:
+    with _db.write() as conn:
         conn.execute(f"UPDATE user_state SET {', '.join(sets)} WHERE chat_id = ? AND user_id = ?", args)
 
 
 def delete_user_state(chat_id: int, user_id: int) -> None:
     """Delete a user_state record by composite key."""
-    with _connect() as conn:
+    with _db.write() as conn:
         conn.execute("DELETE FROM user_state WHERE chat_id = ? AND user_id = ?", (int(chat_id), int(user_id)))
 
 
-def get_ocr_cache(key: str) -> Optional[str]:
-    """Get cached OCR text by cache key.
+# OCR cache accounting: last-hit times are buffered and written by
+# flush_ocr_cache_hits; counters are since process start. Lookups are counted
+# per tier, so speculative pHash / near-duplicate / early-stop text probes do
+# not dilute the file_unique_id hit rate
+OCR_CACHE_TIERS = ("file", "phash", "near", "partial")
+_pending_ocr_hits: Dict[str, int] = {}
+_ocr_cache_hits: Dict[str, int] = dict.fromkeys(OCR_CACHE_TIERS, 0)
+_ocr_cache_misses: Dict[str, int] = dict.fromkeys(OCR_CACHE_TIERS, 0)
+_ocr_cache_evictions = 0
+_ocr_cache_lock = threading.Lock()
+
+# pHash keys are 16 lowercase hex digits (Telegram file_unique_id keys are not)
+_PHASH_RE = re.compile(r"[0-9a-f]{16}")
+
+
+def get_ocr_cache(key: str, tier: str = "file") -> Optional[str]:
+    """Get cached OCR text by cache key (a hit refreshes the entry's last-hit time).
 
     Args:
         key: file_unique_id or perceptual hash string.
+        tier: Lookup tier the hit/miss is counted under: "file" (file_unique_id),
+            "phash" (exact pHash), "near" (near-duplicate pHash probe) or
+            "partial" (text of a scan stopped early on a rule match).
 
     Returns:
         str | None: Cached text or None if not found.
     """
-    with _connect() as conn:
-        conn.row_factory = sqlite3.Row
+    import time
+    with _db.read() as conn:
         cur = conn.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,))
         row = cur.fetchone()
-        return row["text"] if row else None
+    with _ocr_cache_lock:
+        if row is None:
+            _ocr_cache_misses[tier] += 1
+            return None
+        _ocr_cache_hits[tier] += 1
+        _pending_ocr_hits[key] = int(time.time())
+    return row["text"]
 
 
 def set_ocr_cache(key: str, text: str) -> None:
     """Upsert OCR text into persistent cache for a key."""
     import time
-    with _connect() as conn:
+    now = int(time.time())
+    with _db.write() as conn:
         conn.execute(
-            "INSERT INTO ocr_cache(key, text, created_at) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET text=excluded.text, created_at=excluded.created_at",
-            (key, text, int(time.time())),
+            """
+            INSERT INTO ocr_cache(key, text, created_at, last_hit_at, size_bytes) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+              text=excluded.text,
+              created_at=excluded.created_at,
+              last_hit_at=excluded.last_hit_at,
+              size_bytes=excluded.size_bytes
+            """,
+            (key, text, now, now, len(key.encode("utf-8")) + len(text.encode("utf-8"))),
         )
 
 
 def count_ocr_cache() -> int:
     """Count entries in OCR cache table."""
-    with _connect() as conn:
+    with _db.read() as conn:
         cur = conn.execute("SELECT COUNT(1) FROM ocr_cache")
         row = cur.fetchone()
         return int(row[0]) if row else 0
@@ -322,33 +578,272 @@ def count_ocr_cache() -> int:
 
 def clear_ocr_cache() -> None:
     """Delete all rows from OCR cache (irreversible)."""
-    with _connect() as conn:
+    with _ocr_cache_lock:
+        _pending_ocr_hits.clear()
+    with _db.write() as conn:
         conn.execute("DELETE FROM ocr_cache")
 
 
+def flush_ocr_cache_hits() -> int:
+    """Write buffered last-hit times in a single transaction.
+
+    Returns:
+        int: Number of entries touched.
+    """
+    global _pending_ocr_hits
+    with _ocr_cache_lock:
+        pending, _pending_ocr_hits = _pending_ocr_hits, {}
+    if not pending:
+        return 0
+    with _db.write() as conn:
+        conn.executemany(
+            "UPDATE ocr_cache SET last_hit_at = ? WHERE key = ? AND last_hit_at < ?",
+            [(ts, key, ts) for key, ts in pending.items()],
+        )
+    return len(pending)
+
+
+def _phash_of_key(key: str) -> Optional[str]:
+    """The pHash an OCR cache key is filed under ("<phash>" or "<phash>@<langs>"), or None."""
+    base = key.split("@", 1)[0]
+    return base if _PHASH_RE.fullmatch(base) else None
+
+
+def _orphaned_phashes(conn: sqlite3.Connection, phashes: Iterable[str]) -> List[str]:
+    """Those of `phashes` no longer stored under any OCR cache or AI verdict key."""
+    candidates = set(phashes)
+    if not candidates:
+        return []
+    # AI verdict pHash keys are "p:<model>:<phash>"; one scan of that key range
+    ai_phashes = {
+        row[0].rsplit(":", 1)[-1]
+        for row in conn.execute("SELECT key FROM ai_verdict_cache WHERE key >= 'p:' AND key < 'p;'")
+    }
+    orphans = []
+    for phash in candidates - ai_phashes:
+        # "<phash>" itself or any "<phash>@<langs>" ('A' sorts right after '@')
+        if conn.execute(
+            "SELECT 1 FROM ocr_cache WHERE key = ? OR (key >= ? AND key < ?) LIMIT 1",
+            (phash, phash + "@", phash + "A"),
+        ).fetchone() is None:
+            orphans.append(phash)
+    return orphans
+
+
+def _evict_ocr_cache(conn: sqlite3.Connection, now: int) -> List[str]:
+    """Delete expired entries, then least recently hit ones until the limits hold; returns the keys removed.
+
+    Entries expire OCR_CACHE_TTL_SECONDS after they were written, however often
+    they are hit, so text read under an older OCR setup does not live forever.
+    """
+    removed: List[str] = []
+    if OCR_CACHE_TTL_SECONDS > 0:
+        cutoff = now - OCR_CACHE_TTL_SECONDS
+        removed += [row[0] for row in conn.execute("SELECT key FROM ocr_cache WHERE created_at < ?", (cutoff,))]
+        conn.execute("DELETE FROM ocr_cache WHERE created_at < ?", (cutoff,))
+    rows, size = conn.execute("SELECT COUNT(1), COALESCE(SUM(size_bytes), 0) FROM ocr_cache").fetchone()
+    excess_rows = max(0, rows - OCR_CACHE_MAX_ROWS) if OCR_CACHE_MAX_ROWS > 0 else 0
+    excess_bytes = max(0, size - OCR_CACHE_MAX_BYTES) if OCR_CACHE_MAX_BYTES > 0 else 0
+    if not excess_rows and not excess_bytes:
+        return removed
+    # Least recently hit first, until both limits hold
+    victims: List[str] = []
+    freed = 0
+    for key, size_bytes in conn.execute("SELECT key, size_bytes FROM ocr_cache ORDER BY last_hit_at ASC"):
+        if len(victims) >= excess_rows and freed >= excess_bytes:
+            break
+        victims.append(key)
+        freed += size_bytes
+    conn.executemany("DELETE FROM ocr_cache WHERE key = ?", [(k,) for k in victims])
+    return removed + victims
+
+
+def maintain_ocr_cache(vacuum_pages: int = 2000) -> List[str]:
+    """Apply the OCR cache policy: expire by TTL, evict to limits, reclaim pages.
+
+    Buffered hits are flushed first so eviction sees current last-hit times.
+    Afterwards up to `vacuum_pages` free pages are returned to the filesystem
+    with an incremental vacuum.
+
+    Returns:
+        list[str]: pHashes whose last cache entry was removed; callers drop
+        them from the near-duplicate index (phash_index.discard).
+    """
+    global _ocr_cache_evictions
+    import time
+    flush_ocr_cache_hits()
+    with _db.write() as conn:
+        keys = _evict_ocr_cache(conn, int(time.time()))
+        orphans = _orphaned_phashes(conn, filter(None, map(_phash_of_key, keys)))
+    removed = len(keys)
+    with _db.write() as conn:
+        # executescript steps the pragma to completion (execute frees one page per
+        # call); the checkpoint then lets the file and the WAL actually shrink
+        conn.executescript(
+            f"PRAGMA incremental_vacuum({int(vacuum_pages)}); PRAGMA wal_checkpoint(TRUNCATE);"
+        )
+    with _ocr_cache_lock:
+        _ocr_cache_evictions += removed
+    return orphans
+
+
+def ocr_cache_stats() -> Dict[str, int]:
+    """Return OCR cache counters and sizes.
+
+    Returns:
+        dict: rows, payload_bytes, hits and misses of file_unique_id lookups,
+        phash_hits/phash_misses and near_hits/near_misses of the pHash tiers,
+        partial_hits/partial_misses of early-stop text,
+        evictions (all since start), file_bytes (database plus WAL on disk),
+        free_bytes (reclaimable pages) and incremental_vacuum (whether freed
+        pages can be returned, see convert_to_incremental_vacuum).
+    """
+    with _db.read() as conn:
+        rows, payload = conn.execute("SELECT COUNT(1), COALESCE(SUM(size_bytes), 0) FROM ocr_cache").fetchone()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    with _ocr_cache_lock:
+        return {
+            "rows": int(rows),
+            "payload_bytes": int(payload),
+            "hits": _ocr_cache_hits["file"],
+            "misses": _ocr_cache_misses["file"],
+            "phash_hits": _ocr_cache_hits["phash"],
+            "phash_misses": _ocr_cache_misses["phash"],
+            "near_hits": _ocr_cache_hits["near"],
+            "near_misses": _ocr_cache_misses["near"],
+            "partial_hits": _ocr_cache_hits["partial"],
+            "partial_misses": _ocr_cache_misses["partial"],
+            "evictions": _ocr_cache_evictions,
+            "file_bytes": _db_file_bytes(),
+            "free_bytes": int(page_size) * int(free_pages),
+            "incremental_vacuum": int(auto_vacuum) == 2,
+        }
+
+
+def list_phash_keys() -> List[str]:
+    """List every stored perceptual hash (OCR cache keys and AI verdict pHash keys).
+
+    Returns:
+        list[str]: 16-hex-digit pHash strings, deduplicated; used to build the
+        near-duplicate index at startup.
+    """
+    with _db.read() as conn:
+        # Also "<phash>@<langs>" keys of chats with non-default OCR languages
+        keys = {
+            _phash_of_key(row[0])
+            for row in conn.execute("SELECT key FROM ocr_cache WHERE length(key) = 16 OR instr(key, '@') = 17")
+        }
+        keys.update(
+            row[0].rsplit(":", 1)[-1]
+            for row in conn.execute("SELECT key FROM ai_verdict_cache WHERE key LIKE 'p:%'")
+        )
+    return [k for k in keys if k and _PHASH_RE.fullmatch(k)]
+
+
+# --- AI verdict cache ---
+
+def get_ai_verdict(key: str, max_age_seconds: int) -> Optional[Tuple[str, float, int]]:
+    """Get a cached AI verdict younger than `max_age_seconds`.
+
+    Returns:
+        tuple | None: (label, score, created_at) or None if missing/expired.
+    """
+    import time
+    with _db.read() as conn:
+        cur = conn.execute(
+            "SELECT label, score, created_at FROM ai_verdict_cache WHERE key = ? AND created_at >= ?",
+            (key, int(time.time()) - int(max_age_seconds)),
+        )
+        row = cur.fetchone()
+        return (row["label"], float(row["score"]), int(row["created_at"])) if row else None
+
+
+def set_ai_verdicts(keys: List[str], label: str, score: float) -> None:
+    """Upsert one AI verdict under several keys (e.g. unique id and pHash)."""
+    import time
+    now = int(time.time())
+    with _db.write() as conn:
+        conn.executemany(
+            "INSERT INTO ai_verdict_cache(key, label, score, created_at) VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET label=excluded.label, score=excluded.score, created_at=excluded.created_at",
+            [(key, label, float(score), now) for key in keys],
+        )
+
+
+def prune_ai_verdicts(max_age_seconds: int) -> List[str]:
+    """Delete AI verdicts older than `max_age_seconds`.
+
+    Returns:
+        list[str]: pHashes whose last cache entry was removed (see maintain_ocr_cache).
+    """
+    import time
+    cutoff = int(time.time()) - int(max_age_seconds)
+    with _db.write() as conn:
+        phashes = [
+            row[0].rsplit(":", 1)[-1]
+            for row in conn.execute(
+                "SELECT key FROM ai_verdict_cache WHERE key >= 'p:' AND key < 'p;' AND created_at < ?", (cutoff,)
+            )
+        ]
+        conn.execute("DELETE FROM ai_verdict_cache WHERE created_at < ?", (cutoff,))
+        return _orphaned_phashes(conn, (p for p in phashes if _PHASH_RE.fullmatch(p)))
+
+
 # --- Known chats ---
 
+# Known-chat refreshes buffered in memory, coalesced by chat_id, and written in
+# one transaction by flush_known_chats (periodically and on shutdown)
+_pending_known_chats: Dict[int, Tuple[str, str, int]] = {}
+_pending_known_chats_lock = threading.Lock()
+
+
 def upsert_known_chat(chat_id: int, title: str, chat_type: str) -> None:
-    """Insert or update a known chat record with latest title and timestamp."""
+    """Record a known chat's latest title and timestamp (written on next flush)."""
     import time
-    with _connect() as conn:
-        conn.execute(
-            """
-            INSERT INTO known_chats(chat_id, title, chat_type, updated_at)
-            VALUES(?, ?, ?, ?)
-            ON CONFLICT(chat_id) DO UPDATE SET
-              title=excluded.title,
-              chat_type=excluded.chat_type,
-              updated_at=excluded.updated_at
-            """,
-            (int(chat_id), str(title or ""), str(chat_type or "unknown"), int(time.time())),
+    with _pending_known_chats_lock:
+        _pending_known_chats[int(chat_id)] = (
+            str(title or ""), str(chat_type or "unknown"), int(time.time())
         )
 
 
+def flush_known_chats() -> int:
+    """Write buffered known-chat updates in a single transaction.
+
+    Returns:
+        int: Number of chats written.
+    """
+    global _pending_known_chats
+    with _pending_known_chats_lock:
+        pending, _pending_known_chats = _pending_known_chats, {}
+    if not pending:
+        return 0
+    try:
+        with _db.write() as conn:
+            conn.executemany(
+                """
+                INSERT INTO known_chats(chat_id, title, chat_type, updated_at)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET
+                  title=excluded.title,
+                  chat_type=excluded.chat_type,
+                  updated_at=excluded.updated_at
+                """,
+                [(chat_id, *vals) for chat_id, vals in pending.items()],
+            )
+    except Exception:
+        # Re-queue, keeping any newer update that arrived meanwhile
+        with _pending_known_chats_lock:
+            for chat_id, vals in pending.items():
+                _pending_known_chats.setdefault(chat_id, vals)
+        raise
+    return len(pending)
+
+
 def list_known_chats(limit: int = 30, offset: int = 0) -> list[dict]:
-    """Return recent known chats sorted by updated_at desc."""
-    with _connect() as conn:
-        conn.row_factory = sqlite3.Row
+    """Return recent known chats sorted by updated_at desc (including buffered updates)."""
+    flush_known_chats()
+    with _db.read() as conn:
         cur = conn.execute(
             "SELECT chat_id, title, chat_type, updated_at FROM known_chats ORDER BY updated_at DESC LIMIT ? OFFSET ?",
             (int(limit), int(offset)),
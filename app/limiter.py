@@ -1,24 +1,36 @@
 """Simple asyncio-based semaphore limiter for OCR tasks.
 
 Use ocr_limited() as an async context manager to ensure the number of concurrent
-OCR tasks does not exceed the configured limit. The limit can be changed at
-runtime via set_ocr_limit().
+OCR tasks does not exceed the configured limit. At most OCR_MAX_QUEUE tasks may
+wait for a slot; beyond that ocr_limited() raises OCRBusyError immediately.
+The limit can be changed at runtime via set_ocr_limit(), which also resizes the
+OCR worker pool.
 """
 import asyncio
 from contextlib import asynccontextmanager
 
-from .config import OCR_MAX_CONCURRENCY
+from .config import OCR_MAX_CONCURRENCY, OCR_MAX_QUEUE
+from .ocr import OCRBusyError, resize_ocr_pool
 
 _current_limit = OCR_MAX_CONCURRENCY
 _ocr_semaphore = asyncio.Semaphore(_current_limit)
+_waiting = 0
 
 @asynccontextmanager
 async def ocr_limited():
-    await _ocr_semaphore.acquire()
+    global _waiting
+    semaphore = _ocr_semaphore
+    if semaphore.locked() and _waiting >= OCR_MAX_QUEUE:
+        raise OCRBusyError(f"OCR 队列已满（{OCR_MAX_QUEUE}）")
+    _waiting += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _waiting -= 1
     try:
         yield
     finally:
-        _ocr_semaphore.release()
+        semaphore.release()
 
 
 def get_ocr_limit() -> int:
@@ -32,4 +44,5 @@ def set_ocr_limit(new_limit: int) -> int:
     # Create a new semaphore; existing waiters will complete on old one
     _current_limit = int(new_limit)
     _ocr_semaphore = asyncio.Semaphore(_current_limit)
-    return _current_limit
\ No newline at end of file
+    resize_ocr_pool(_current_limit)
+    return _current_limit
@@ -0,0 +1,322 @@
+"""Compiled per-chat rule matcher.
+
+CompiledRules is an immutable, pre-processed view of a chat's `Rules` built
+once per rule change: keywords are normalized up front and regexes compiled,
+so matching a message needs no DB access and no per-keyword work beyond the
+scan itself. Instances are cached by storage.get_compiled_rules.
+
+KeywordAutomaton is an Aho–Corasick automaton: all keywords are found in a
+single pass over the text, so matching cost no longer grows with the number
+of keywords.
+
+RegexSet holds a chat's regexes compiled once. Patterns that require a
+literal (e.g. "代充" in r"代充\d+") are skipped after a single automaton pass
+over the text finds that literal absent. Each pattern runs under a time
+budget; one that exceeds it (catastrophic backtracking) is quarantined until
+the rules change. Only patterns that can backtrack super-linearly (see
+_backtracking_risk) run under an interrupting timer, so ordinary patterns pay
+no signal or syscall overhead; the rest are timed after the fact.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Pattern, Sequence, Set, Tuple
+
+from .config import REGEX_TIME_BUDGET_MS
+from .text import normalize_text
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .storage import Rules
+
+
+class KeywordAutomaton:
+    """Aho–Corasick multi-pattern matcher over a fixed list of patterns."""
+
+    def __init__(self, patterns: Sequence[str]) -> None:
+        self.patterns = tuple(patterns)
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[int, ...]] = [()]
+        for idx, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] += (idx,)
+
+        # Breadth-first failure links (depth-1 states fail to the root); outputs
+        # inherit those of the fail state
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def search(self, text: str) -> Set[int]:
+        """Return indices of all patterns occurring in `text` (one pass)."""
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                hits.update(out[state])
+        return hits
+
+
+logger = logging.getLogger(__name__)
+
+try:
+    from re import _parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+# Below this many literal-bearing patterns the prefilter pass costs more than it saves
+_PREFILTER_MIN_PATTERNS = 32
+
+
+class RegexTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame) -> None:
+    raise RegexTimeout()
+
+
+@contextmanager
+def _alarm_handler(needed: bool = True) -> Iterator[bool]:
+    """Install a SIGALRM handler raising RegexTimeout; yield whether it is active.
+
+    The `re` engine polls for signals while matching, so an interval timer can
+    stop a runaway pattern. Signals are only delivered to the main thread;
+    elsewhere (or when not `needed`) nothing is installed and callers fall
+    back to timing the search.
+    """
+    if (
+        not needed
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield False
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    try:
+        yield True
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+_REPEATS = tuple(
+    getattr(_sre_parse, name) for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") if hasattr(_sre_parse, name)
+)
+_GROUPREFS = (_sre_parse.GROUPREF, _sre_parse.GROUPREF_EXISTS)
+
+
+def _backtracking_risk(pattern: str) -> bool:
+    """Whether `pattern` may backtrack super-linearly and needs an interrupting timer.
+
+    Risky are backreferences, a repeat (more than once) around another
+    repeat or an alternation, such as (a+)+ or (a|aa)*, and three or more
+    unbounded repeats at one level (.*a.*b.*c). Unparsable patterns count as
+    risky.
+    """
+    try:
+        parsed = _sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error:
+        return True
+
+    def walk(items, in_repeat: bool) -> bool:
+        unbounded = 0
+        for op, av in items:
+            if op in _GROUPREFS:
+                return True
+            if op in _REPEATS:
+                _, hi, body = av
+                if in_repeat and hi > 1:
+                    return True
+                if hi == _sre_parse.MAXREPEAT:
+                    unbounded += 1
+                    if unbounded >= 3:
+                        return True
+                if walk(body, in_repeat or hi > 1):
+                    return True
+            elif op is _sre_parse.BRANCH:
+                if in_repeat or any(walk(branch, in_repeat) for branch in av[1]):
+                    return True
+            elif op is _sre_parse.SUBPATTERN:
+                if walk(av[-1], in_repeat):
+                    return True
+            elif op in (_sre_parse.ASSERT, _sre_parse.ASSERT_NOT):
+                if walk(av[1], in_repeat):
+                    return True
+        return False
+
+    return walk(parsed, False)
+
+
+def _required_literal(pattern: str) -> str:
+    """Return the longest literal run every match of `pattern` must contain.
+
+    Only top-level sequences (and plain groups within them) are considered;
+    anything ambiguous yields "" so the pattern is always evaluated. The result
+    is casefolded, which is at least as permissive as re.IGNORECASE.
+    """
+    try:
+        parsed = _sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error:
+        return ""
+    runs: List[str] = []
+    current: List[str] = []
+
+    def walk(items) -> None:
+        for op, av in items:
+            if op is _sre_parse.LITERAL and len(chr(av).casefold()) == 1:
+                current.append(chr(av).casefold())
+            elif op is _sre_parse.SUBPATTERN:
+                walk(av[-1])
+            else:
+                runs.append("".join(current))
+                current.clear()
+
+    walk(parsed)
+    runs.append("".join(current))
+    return max(runs, key=len)
+
+
+class RegexSet:
+    """Compiled regexes with a literal prefilter and per-pattern time budget."""
+
+    def __init__(self, patterns: Sequence[str], budget_seconds: float) -> None:
+        self.patterns = tuple(patterns)
+        self.budget_seconds = budget_seconds
+        self.quarantined: Set[int] = set()
+        self._compiled: Dict[int, Pattern[str]] = {}
+        # Patterns evaluated under the SIGALRM timer (see _backtracking_risk)
+        self._risky: Set[int] = set()
+        literals: Dict[str, List[int]] = {}
+        always: List[int] = []
+        for idx, pattern in enumerate(self.patterns):
+            try:
+                self._compiled[idx] = re.compile(pattern, re.IGNORECASE)
+            except re.error:
+                continue
+            if _backtracking_risk(pattern):
+                self._risky.add(idx)
+            literal = _required_literal(pattern)
+            if literal:
+                literals.setdefault(literal, []).append(idx)
+            else:
+                always.append(idx)
+        self._prefilter: Optional[KeywordAutomaton] = None
+        self._literal_owners: Tuple[Tuple[int, ...], ...] = ()
+        if sum(len(v) for v in literals.values()) >= _PREFILTER_MIN_PATTERNS:
+            self._prefilter = KeywordAutomaton(list(literals))
+            self._literal_owners = tuple(tuple(v) for v in literals.values())
+            self._always = tuple(always)
+        else:
+            self._always = tuple(self._compiled)
+
+    def _candidates(self, texts: Sequence[str]) -> List[int]:
+        candidates = set(self._always)
+        if self._prefilter is not None:
+            for t in texts:
+                for lit in self._prefilter.search(t.casefold()):
+                    candidates.update(self._literal_owners[lit])
+        return sorted(candidates - self.quarantined)
+
+    def _quarantine(self, idx: int, elapsed: float) -> None:
+        self.quarantined.add(idx)
+        logger.warning(
+            "正则超出时间预算已停用（%.0f ms）：%s", elapsed * 1000, self.patterns[idx]
+        )
+
+    def search(self, *texts: str) -> List[str]:
+        """Return the patterns that match any of `texts`, in rule order."""
+        candidates = self._candidates(texts)
+        if not candidates:
+            return []
+        hits: List[int] = []
+        with _alarm_handler(any(idx in self._risky for idx in candidates)) as enforced:
+            for idx in candidates:
+                rx = self._compiled[idx]
+                timed = enforced and idx in self._risky
+                start = time.perf_counter()
+                try:
+                    if timed:
+                        signal.setitimer(signal.ITIMER_REAL, self.budget_seconds)
+                    try:
+                        found = any(rx.search(t) for t in texts)
+                    finally:
+                        if timed:
+                            signal.setitimer(signal.ITIMER_REAL, 0)
+                except RegexTimeout:
+                    self._quarantine(idx, time.perf_counter() - start)
+                    continue
+                elapsed = time.perf_counter() - start
+                if elapsed > self.budget_seconds:
+                    # Budget could not be enforced here; stop paying for it next time
+                    self._quarantine(idx, elapsed)
+                if found:
+                    hits.append(idx)
+        return [self.patterns[i] for i in hits]
+
+
+class CompiledRules:
+    def __init__(self, rules: "Rules") -> None:
+        self.rules = rules
+        # (original keyword, normalized keyword); empty normalizations never match
+        self.keywords: Tuple[Tuple[str, str], ...] = tuple(
+            (k, normalize_text(k)) for k in rules.keywords if k and normalize_text(k)
+        )
+        # Distinct normalized keywords feed the automaton; each maps back to the
+        # positions of the original keywords that normalize to it
+        owners: Dict[str, List[int]] = {}
+        for pos, (_, norm) in enumerate(self.keywords):
+            owners.setdefault(norm, []).append(pos)
+        self._keyword_owners: Tuple[Tuple[int, ...], ...] = tuple(tuple(v) for v in owners.values())
+        self._automaton = KeywordAutomaton(list(owners))
+        self.regexes = RegexSet(rules.regexes, REGEX_TIME_BUDGET_MS / 1000.0)
+        # Identifies what match() checks, across restarts; equal rule sets share it
+        digest = hashlib.sha1()
+        for part in sorted(norm for _, norm in self.keywords) + ["\0"] + sorted(rules.regexes):
+            digest.update(part.encode("utf-8") + b"\0")
+        self.fingerprint = digest.hexdigest()[:16]
+
+    def match(self, text: str) -> Tuple[bool, List[str], List[str]]:
+        """Match keywords and regexes against raw and normalized text.
+
+        Returns:
+            tuple: (matched, hit_keywords, hit_regexes)
+        """
+        text_norm = normalize_text(text)
+        positions = sorted(
+            pos for idx in self._automaton.search(text_norm) for pos in self._keyword_owners[idx]
+        )
+        hit_keywords = [self.keywords[pos][0] for pos in positions]
+        hit_regexes = self.regexes.search(text, text_norm)
+        return (bool(hit_keywords or hit_regexes), hit_keywords, hit_regexes)
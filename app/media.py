@@ -0,0 +1,314 @@
+"""Media downloads for OCR, hashing and AI classification.
+
+download_media fetches a Telegram file straight into memory when it is at most
+MEDIA_MEMORY_LIMIT_BYTES, so photos reach PIL, imagehash and the AI encoder as
+bytes without touching disk. Larger files (long videos) spill to a SpillDir,
+a temporary directory that is only created once something is written to it.
+
+extract_video_frame feeds an in-memory video to ffmpeg through stdin and, if
+the container cannot be read from a pipe (index at the end of the file),
+spills it to disk and retries from the file.
+
+stream_video_frame avoids downloading whole videos: when the first bytes show
+a streamable ("faststart", moov before mdat) MP4, the download is piped into
+ffmpeg and abandoned as soon as the frame is decoded. Other files, and failed
+streams, fall back to a full download_media + extract_video_frame.
+
+extract_video_keyframes samples several frames (scene changes or fixed
+intervals) in one ffmpeg run, with the same pipe-then-spill fallback;
+stream_video_keyframes streams faststart MP4s like stream_video_frame.
+
+photo_ladder picks which of a photo's Telegram sizes to OCR: a mid-size
+variant first, with the largest only as an escalation step, so most photos
+never download their full-resolution file (see record_photo for the stats).
+"""
+import asyncio
+import logging
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+import httpx
+from telegram import File, PhotoSize
+
+from .config import FFMPEG_TIMEOUT_SECONDS, MEDIA_MEMORY_LIMIT_BYTES, PHOTO_OCR_START_SIDE, VIDEO_STREAMING
+from .ocr import ImageSource
+from .video import extract_frame_bytes, extract_frame_from_stream, extract_keyframes, extract_keyframes_from_stream
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Bytes inspected to decide whether a video is streamable
+_SNIFF_BYTES = 64 * 1024
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+# Video frame extraction accounting: bytes_fetched is what the path that produced
+# the frame downloaded (vs file sizes in bytes_total); bytes_probed is what
+# streaming attempts read before falling back to a full download
+_video_stats: Dict[str, int] = {
+    "streamed": 0,
+    "full_downloads": 0,
+    "bytes_fetched": 0,
+    "bytes_total": 0,
+    "bytes_probed": 0,
+}
+
+# Photo OCR accounting per downloaded photo: bytes fetched vs what always taking
+# the largest size would have cost, OCR worker time, and resolution-ladder escalations
+_photo_stats: Dict[str, float] = {
+    "photos": 0,
+    "escalated": 0,
+    "bytes_fetched": 0,
+    "bytes_largest": 0,
+    "ocr_ms": 0.0,
+}
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+class SpillDir:
+    """Temporary directory created lazily on first use and removed on exit."""
+
+    def __init__(self) -> None:
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+
+    @property
+    def path(self) -> Path:
+        if self._tmp is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="ad_guard_")
+        return Path(self._tmp.name)
+
+    def cleanup(self) -> None:
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+
+    def __enter__(self) -> "SpillDir":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+
+
+async def download_media(file: File, spill: SpillDir, name: str) -> ImageSource:
+    """Download `file` into memory, or into `spill` as `name` when it is large or of unknown size."""
+    size = file.file_size
+    if size is not None and size <= MEDIA_MEMORY_LIMIT_BYTES:
+        return bytes(await file.download_as_bytearray())
+    path = spill.path / name
+    await file.download_to_drive(custom_path=str(path))
+    return path
+
+
+async def extract_video_frame(video: ImageSource, spill: SpillDir, name: str = "video.mp4") -> Optional[bytes]:
+    """First frame of a downloaded video (see download_media) as JPEG bytes, or None."""
+    frame = await extract_frame_bytes(video)
+    if frame is None and isinstance(video, bytes):
+        # Not streamable from a pipe (e.g. moov atom at the end); ffmpeg needs to seek
+        path = spill.path / name
+        path.write_bytes(video)
+        frame = await extract_frame_bytes(path)
+    return frame
+
+
+async def extract_video_keyframes(
+    video: ImageSource,
+    spill: SpillDir,
+    name: str,
+    count: int,
+    interval: float,
+    timeout: float = FFMPEG_TIMEOUT_SECONDS,
+) -> List[bytes]:
+    """Up to `count` keyframes of a downloaded video as JPEG bytes, in time order."""
+    frames = await extract_keyframes(video, count, interval, timeout=timeout)
+    if not frames and isinstance(video, bytes):
+        path = spill.path / name
+        path.write_bytes(video)
+        frames = await extract_keyframes(path, count, interval, timeout=timeout)
+    return frames
+
+
+def photo_ladder(sizes: Sequence[PhotoSize], start_side: int = PHOTO_OCR_START_SIDE) -> List[PhotoSize]:
+    """Sizes of one photo to OCR in order: the smallest with a side of at least
+    `start_side` px and then the largest, or just the largest."""
+    largest = sizes[-1]
+    if start_side:
+        for size in sizes[:-1]:
+            if max(size.width, size.height) >= start_side:
+                return [size, largest]
+    return [largest]
+
+
+def record_photo(bytes_fetched: int, bytes_largest: int, ocr_ms: float, escalated: bool) -> None:
+    """Account one photo downloaded for OCR (cache hits are not recorded)."""
+    _photo_stats["photos"] += 1
+    _photo_stats["escalated"] += int(escalated)
+    _photo_stats["bytes_fetched"] += bytes_fetched
+    _photo_stats["bytes_largest"] += bytes_largest
+    _photo_stats["ocr_ms"] += ocr_ms
+
+
+def get_photo_stats() -> Dict[str, float]:
+    return dict(_photo_stats)
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=FFMPEG_TIMEOUT_SECONDS)
+    return _http_client
+
+
+async def close_media_client() -> None:
+    """Close the HTTP client used for streamed downloads (called at shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        client, _http_client = _http_client, None
+        await client.aclose()
+
+
+def get_media_stats() -> Dict[str, int]:
+    return dict(_video_stats)
+
+
+def _moov_first(head: bytes) -> Optional[bool]:
+    """Walk top-level MP4 boxes in `head`: True if moov precedes mdat, False if
+    mdat comes first (not streamable), None if undecided within `head`."""
+    pos = 0
+    while pos + 8 <= len(head):
+        size, kind = struct.unpack(">I4s", head[pos:pos + 8])
+        if kind == b"moov":
+            return True
+        if kind == b"mdat":
+            return False
+        if size == 1:
+            if pos + 16 > len(head):
+                return None
+            size = struct.unpack(">Q", head[pos + 8:pos + 16])[0]
+        if size < 8:
+            return False  # box runs to end of file, or garbage
+        pos += size
+    return None
+
+
+async def stream_video_frame(file: File, spill: SpillDir, name: str) -> Optional[bytes]:
+    """First frame of a Telegram video, downloading only what ffmpeg needs when possible.
+
+    The streaming attempt, sniffing included, gets FFMPEG_TIMEOUT_SECONDS in
+    all; a stream that is too slow falls back to the full download.
+    """
+    url = file.file_path or ""
+    if VIDEO_STREAMING and url.startswith(("http://", "https://")):
+        received = [0]
+        try:
+            frame = await asyncio.wait_for(
+                _stream_video(url, received, extract_frame_from_stream), FFMPEG_TIMEOUT_SECONDS
+            )
+        except httpx.HTTPError as exc:
+            # The URL embeds the bot token, so log only what went wrong
+            logger.debug("视频流式下载失败，改为完整下载: %s", _http_error_summary(exc))
+            frame = None
+        except asyncio.TimeoutError:
+            logger.debug("视频流式下载超时，改为完整下载")
+            frame = None
+        if frame is not None:
+            _video_stats["streamed"] += 1
+            _video_stats["bytes_fetched"] += received[0]
+            _video_stats["bytes_total"] += file.file_size or 0
+            return frame
+        _video_stats["bytes_probed"] += received[0]
+    _video_stats["full_downloads"] += 1
+    _video_stats["bytes_fetched"] += file.file_size or 0
+    _video_stats["bytes_total"] += file.file_size or 0
+    data = await download_media(file, spill, name)
+    return await extract_video_frame(data, spill, name)
+
+
+def _http_error_summary(exc: httpx.HTTPError) -> str:
+    """Exception type and HTTP status, without the request URL."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"{type(exc).__name__} {exc.response.status_code}"
+    return type(exc).__name__
+
+
+async def stream_video_keyframes(
+    file: File,
+    spill: SpillDir,
+    name: str,
+    count: int,
+    interval: float,
+    timeout: float = FFMPEG_TIMEOUT_SECONDS,
+) -> List[bytes]:
+    """Up to `count` keyframes of a Telegram video (see extract_video_keyframes).
+
+    Like stream_video_frame, a faststart MP4 is piped into ffmpeg and the
+    download abandoned once the last frame is taken; `timeout` covers the
+    streaming attempt (sniffing included) and any full-download fallback
+    together. A stream that uses up all of it returns [].
+    """
+    deadline = time.monotonic() + timeout
+    url = file.file_path or ""
+    if VIDEO_STREAMING and url.startswith(("http://", "https://")):
+        received = [0]
+
+        async def keyframes(chunks: AsyncIterator[bytes]) -> List[bytes]:
+            return await extract_keyframes_from_stream(chunks, count, interval, timeout=timeout)
+
+        try:
+            frames = await asyncio.wait_for(_stream_video(url, received, keyframes), timeout)
+        except httpx.HTTPError as exc:
+            logger.debug("视频流式下载失败，改为完整下载: %s", _http_error_summary(exc))
+            frames = None
+        except asyncio.TimeoutError:
+            logger.debug("视频流式下载超时")
+            _video_stats["bytes_probed"] += received[0]
+            return []
+        if frames:
+            _video_stats["streamed"] += 1
+            _video_stats["bytes_fetched"] += received[0]
+            _video_stats["bytes_total"] += file.file_size or 0
+            return frames
+        _video_stats["bytes_probed"] += received[0]
+    _video_stats["full_downloads"] += 1
+    _video_stats["bytes_fetched"] += file.file_size or 0
+    _video_stats["bytes_total"] += file.file_size or 0
+    data = await download_media(file, spill, name)
+    return await extract_video_keyframes(
+        data, spill, name, count, interval, timeout=max(1.0, deadline - time.monotonic())
+    )
+
+
+async def _stream_video(
+    url: str,
+    received: List[int],
+    extract: Callable[[AsyncIterator[bytes]], Awaitable[T]],
+) -> Optional[T]:
+    """Feed `url` to `extract` if it is a faststart MP4, else None; bytes read go to received[0]."""
+    async with _get_client().stream("GET", url) as resp:
+        resp.raise_for_status()
+        body = resp.aiter_bytes(_STREAM_CHUNK_BYTES)
+        head: List[bytes] = []
+        size = 0
+        streamable: Optional[bool] = None
+        async for chunk in body:
+            head.append(chunk)
+            size += len(chunk)
+            received[0] += len(chunk)
+            streamable = _moov_first(b"".join(head))
+            if streamable is not None or size >= _SNIFF_BYTES:
+                break
+        if not streamable:
+            return None
+
+        async def chunks() -> AsyncIterator[bytes]:
+            for chunk in head:
+                yield chunk
+            async for chunk in body:
+                received[0] += len(chunk)
+                yield chunk
+
+        # Leaving this block closes the response, abandoning the rest of the file
+        return await extract(chunks())
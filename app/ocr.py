@@ -1,31 +1,753 @@
 """OCR utilities using Tesseract.
 
-extract_text_from_image opens the image with PIL, converts to RGB and sends to
-pytesseract. assert_tesseract_available validates the binary is installed.
+extract_text_from_image opens the image (a path or encoded bytes) with PIL,
+runs it through preprocess.preprocess_for_ocr (downscale, grayscale, binarize,
+text bands only; OCR_PREPROCESS=off sends the plain RGB image) and hands it to
+the OCR backend with the configured --psm/--oem:
+
+- TesserocrBackend calls libtesseract in-process (optional `tesserocr`
+  package) and keeps an initialized engine per language set, so the
+  traineddata is loaded once per worker instead of once per image.
+- PytesseractBackend runs the tesseract CLI for every image (fallback).
+
+OCR_BACKEND picks one; "auto" prefers tesserocr when it is importable.
+
+In "adaptive" language mode the image is first read with the light
+OCR_FAST_LANGUAGES model (eng). Only when that pass finds nothing or its mean
+word confidence is below OCR_ADAPTIVE_MIN_CONF, which is what Latin models
+produce on CJK text, is it read again with the full language set (e.g.
+chi_sim+eng). "fixed" mode always uses the full set.
+
+probe_tesseract asks the selected backend for the version and installed
+languages once (at startup, or again via /ocr_engine) and caches the result
+as an EngineInfo. Worker
+processes receive the parent's probe when they start, so
+assert_tesseract_available never spawns a process: it checks the cached
+result, failing fast with the cached error when the engine or a requested
+language pack is missing. Coroutines call ensure_engine_probed first, so a
+probe that has not run yet happens in a thread, not on the event loop.
+
+image_has_text is a prefilter of a few milliseconds (stroke density on a small
+grayscale copy, see preprocess.text_likelihood): images that score below
+OCR_PREFILTER_MIN_SCORE never reach Tesseract. Worker jobs decode each image
+once and hand the same decoded copy to the prefilter and to OCR. get_ocr_stats reports how many
+jobs (whole images or strips) were checked and skipped, and which language
+path the rest took.
+
+extract_text_async runs the prefilter and OCR in a process pool so Tesseract never
+blocks the asyncio loop. Images at least OCR_TILE_MIN_HEIGHT tall (long phone
+screenshots) are decoded once in the parent and cut into overlapping
+horizontal strips; each strip's pixels go to a worker, strips are OCR'd in
+parallel and merged in reading order. Every job, strip or whole image, passes
+the caller's admission (limiter.ocr_limited, with its backlog limit).
+extract_text_until additionally takes a `stop` predicate and cancels the
+strips not yet started once the text read so far satisfies it. The pool is
+sized from OCR_MAX_CONCURRENCY, kills jobs that run longer than
+OCR_JOB_TIMEOUT_SECONDS (queueing does not count), is resized by
+limiter.set_ocr_limit and is shut down with shutdown_ocr_pool.
 """
+import asyncio
+import io
+import logging
+import subprocess
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, AsyncContextManager, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 import pytesseract
 from PIL import Image
 
+from .config import (
+    OCR_ADAPTIVE_MIN_CONF,
+    OCR_BACKEND,
+    OCR_FAST_LANGUAGES,
+    OCR_JOB_TIMEOUT_SECONDS,
+    OCR_LANG_MODE,
+    OCR_LANGUAGES,
+    OCR_MAX_CONCURRENCY,
+    OCR_MAX_SIDE,
+    OCR_OEM,
+    OCR_PREFILTER_MIN_SCORE,
+    OCR_PREPROCESS,
+    OCR_PSM,
+    OCR_TILE_HEIGHT,
+    OCR_TILE_MIN_HEIGHT,
+    OCR_TILE_OVERLAP,
+)
+from .preprocess import preprocess_for_ocr, tesseract_config, text_likelihood, to_gray
+
+try:
+    import tesserocr
+except ImportError:  # optional: in-process engine, see TesserocrBackend
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# A path to an image file, or the encoded image itself
+ImageSource = Union[Path, bytes]
+
+# Seconds allowed for each `tesseract --version` / `--list-langs` run
+_PROBE_TIMEOUT_SECONDS = 10
+
+_MISSING_MESSAGE = "Tesseract OCR 未安装或不可用。请先安装 tesseract-ocr 及中文语言包。"
+
+# Initialized tesserocr engines kept per worker (one per language set)
+_MAX_ENGINES_PER_WORKER = 4
+
+# Longer side (px) of the grayscale copy scored by the text prefilter
+_PREFILTER_SIDE = 480
+
+# Images OCR'd, and jobs (whole images or strips) checked by the prefilter
+# per path: skipped, fixed languages, fast pass enough, escalated to the full
+# set (checked = their sum); kept in the main process from worker results
+_ocr_stats: Dict[str, int] = {
+    "images": 0, "checked": 0, "skipped": 0, "fixed": 0, "fast": 0, "escalated": 0,
+    # Tall images split into strips, strips OCR'd, cancelled after an early stop, failed
+    "tiled": 0, "strips": 0, "strips_cancelled": 0, "strips_failed": 0,
+}
+
+# Crop box (left, top, right, bottom) of one strip of a tiled image
+Box = Tuple[int, int, int, int]
+
+# Extra time granted on top of the tesseract timeout for image decoding and IPC
+_JOB_TIMEOUT_GRACE_SECONDS = 5
+
+# Seconds OCR jobs spent in workers, added to the accumulator of the
+# track_ocr_time block they were started in (tasks inherit it)
+_job_seconds: ContextVar[Optional[List[float]]] = ContextVar("ocr_job_seconds", default=None)
+
 
 class OCRError(RuntimeError):
     pass
 
 
-def assert_tesseract_available() -> None:
+class OCRBusyError(OCRError):
+    pass
+
+
+class OCRTimeoutError(OCRError):
+    pass
+
+
+@dataclass(frozen=True)
+class EngineInfo:
+    """Result of probing the OCR backend."""
+
+    available: bool
+    version: str = ""
+    languages: Tuple[str, ...] = ()
+    error: str = ""
+    backend: str = "pytesseract"
+
+
+class OCRBackend:
+    """Runs Tesseract on an already prepared PIL image."""
+
+    name = ""
+
+    def image_to_string(self, img: Image.Image, languages: str, timeout: int) -> str:
+        raise NotImplementedError
+
+    def image_to_string_with_conf(self, img: Image.Image, languages: str, timeout: int) -> Tuple[str, float]:
+        """Text and mean word confidence (0-100, 0 when no words)."""
+        raise NotImplementedError
+
+
+class PytesseractBackend(OCRBackend):
+    """One tesseract CLI process per image; the models are loaded every time."""
+
+    name = "pytesseract"
+
+    def _run(self, fn, img: Image.Image, languages: str, timeout: int, **kwargs: Any) -> Any:
+        try:
+            return fn(img, lang=languages, config=tesseract_config(), timeout=timeout, **kwargs)
+        except pytesseract.TesseractNotFoundError as exc:
+            raise OCRError("未找到 tesseract 可执行文件") from exc
+        except pytesseract.TesseractError as exc:
+            # Not an OCRError (and a RuntimeError): wrap it so callers handle it as one
+            raise OCRError(f"Tesseract 识别失败：{exc}") from exc
+        except RuntimeError as exc:
+            # pytesseract kills tesseract and raises RuntimeError on timeout
+            raise OCRTimeoutError(f"OCR 超时（{timeout}s）") from exc
+
+    def image_to_string(self, img: Image.Image, languages: str, timeout: int) -> str:
+        return self._run(pytesseract.image_to_string, img, languages, timeout)
+
+    def image_to_string_with_conf(self, img: Image.Image, languages: str, timeout: int) -> Tuple[str, float]:
+        return self._run(_text_and_conf, img, languages, timeout)
+
+
+def _text_and_conf(img: Image.Image, lang: str, config: str, timeout: int) -> Tuple[str, float]:
+    """Text and mean word confidence from one image_to_data run.
+
+    The text is rebuilt from the recognized words: one line per Tesseract
+    line, a blank line between paragraphs.
+    """
+    data = pytesseract.image_to_data(
+        img, lang=lang, config=config, timeout=timeout, output_type=pytesseract.Output.DICT
+    )
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    confs = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if not word.strip() or conf < 0:
+            continue
+        confs.append(conf)
+        lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+    text = ""
+    last = None
+    for (block, par, line), words in lines.items():
+        if last is not None:
+            text += "\n\n" if (block, par) != last else "\n"
+        text += " ".join(words)
+        last = (block, par)
+    return text, (sum(confs) / len(confs) if confs else 0.0)
+
+
+class TesserocrBackend(OCRBackend):
+    """libtesseract in-process, reusing one initialized engine per language set."""
+
+    name = "tesserocr"
+
+    def __init__(self) -> None:
+        self._apis: "OrderedDict[str, Any]" = OrderedDict()
+
+    def _api(self, languages: str) -> Any:
+        api = self._apis.pop(languages, None)
+        if api is None:
+            options: Dict[str, Any] = {"lang": languages}
+            if OCR_PSM is not None:
+                options["psm"] = OCR_PSM
+            if OCR_OEM is not None:
+                options["oem"] = OCR_OEM
+            try:
+                api = tesserocr.PyTessBaseAPI(**options)
+            except RuntimeError as exc:
+                raise OCRError(f"Tesseract 初始化失败（{languages}）：{exc}") from exc
+            while len(self._apis) >= _MAX_ENGINES_PER_WORKER:
+                _, old = self._apis.popitem(last=False)
+                old.End()
+        self._apis[languages] = api
+        return api
+
+    def image_to_string(self, img: Image.Image, languages: str, timeout: int) -> str:
+        return self.image_to_string_with_conf(img, languages, timeout)[0]
+
+    def image_to_string_with_conf(self, img: Image.Image, languages: str, timeout: int) -> Tuple[str, float]:
+        api = self._api(languages)
+        api.SetImage(img)
+        try:
+            if not api.Recognize(timeout=int(timeout * 1000)):
+                if timeout:
+                    raise OCRTimeoutError(f"OCR 超时（{timeout}s）")
+                raise OCRError("Tesseract 识别失败")
+            return api.GetUTF8Text(), float(api.MeanTextConf())
+        finally:
+            api.Clear()
+
+
+_engine: Optional[EngineInfo] = None
+_backend: Optional[OCRBackend] = None
+
+
+def _backend_name() -> str:
+    if OCR_BACKEND == "pytesseract":
+        return "pytesseract"
+    if tesserocr is None:
+        if OCR_BACKEND == "tesserocr":
+            logger.warning("OCR_BACKEND=tesserocr 但未安装 tesserocr，回退到 pytesseract")
+        return "pytesseract"
+    return "tesserocr"
+
+
+def _run_tesseract(*args: str) -> str:
+    result = subprocess.run(
+        [pytesseract.pytesseract.tesseract_cmd, *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        stdin=subprocess.DEVNULL,
+        timeout=_PROBE_TIMEOUT_SECONDS,
+        check=True,
+    )
+    return result.stdout.decode("utf-8", "replace")
+
+
+def probe_tesseract() -> EngineInfo:
+    """Query the selected backend for its version and languages, and cache the result."""
+    global _engine
+    backend = _backend_name()
     try:
-        _ = pytesseract.get_tesseract_version()
-    except Exception as exc:
-        raise OCRError(
-            "Tesseract OCR 未安装或不可用。请先安装 tesseract-ocr 及中文语言包。"
-        ) from exc
-
-
-def extract_text_from_image(image_path: Path, languages: str) -> str:
-    assert_tesseract_available()
-    with Image.open(image_path) as img:
-        img_converted = img.convert("RGB")
-        text: str = pytesseract.image_to_string(img_converted, lang=languages)
-        return text or ""
\ No newline at end of file
+        if backend == "tesserocr":
+            first = tesserocr.tesseract_version().strip().splitlines()
+            langs = tesserocr.get_languages()[1]
+        else:
+            first = _run_tesseract("--version").strip().splitlines()
+            # First line is the "List of available languages ..." header
+            langs = _run_tesseract("--list-langs").splitlines()[1:]
+        version = first[0].split()[-1] if first else ""
+        languages = tuple(sorted(l.strip() for l in langs if l.strip() and " " not in l.strip()))
+        if languages:
+            info = EngineInfo(True, version, languages, backend=backend)
+        else:
+            info = EngineInfo(False, version, error=f"{_MISSING_MESSAGE}（未找到语言包）", backend=backend)
+    except (OSError, RuntimeError, subprocess.SubprocessError) as exc:
+        info = EngineInfo(False, error=f"{_MISSING_MESSAGE}（{exc}）", backend=backend)
+    _engine = info
+    return info
+
+
+def get_engine_info() -> EngineInfo:
+    """Cached probe result, probing on first use (blocking; see ensure_engine_probed)."""
+    return _engine if _engine is not None else probe_tesseract()
+
+
+async def ensure_engine_probed() -> EngineInfo:
+    """get_engine_info for the event loop: a missing probe runs in a thread.
+
+    Normally post_init has probed already and this returns the cached result.
+    """
+    if _engine is not None:
+        return _engine
+    return await asyncio.to_thread(probe_tesseract)
+
+
+def get_backend() -> OCRBackend:
+    """This process's OCR backend, as chosen by the probe."""
+    global _backend
+    name = get_engine_info().backend
+    if _backend is None or _backend.name != name:
+        _backend = TesserocrBackend() if name == "tesserocr" else PytesseractBackend()
+    return _backend
+
+
+def _init_worker(info: EngineInfo) -> None:
+    # Worker process initializer: adopt the parent's probe instead of running one,
+    # and load the default models before the first job arrives
+    global _engine
+    _engine = info
+    if info.available and info.backend == "tesserocr":
+        try:
+            get_backend()._api(OCR_LANGUAGES)
+        except OCRError as exc:
+            logger.warning("预加载 OCR 模型失败: %s", exc)
+
+
+def missing_languages(languages: str) -> List[str]:
+    """Entries of the "+"-joined `languages` the probed engine does not have."""
+    installed = get_engine_info().languages
+    if not installed:
+        return []
+    return [lang for lang in languages.split("+") if lang and lang not in installed]
+
+
+def assert_tesseract_available(languages: Optional[str] = None) -> None:
+    """Raise OCRError if the engine, or any of the "+"-joined `languages`, is missing.
+
+    Uses the cached probe; nothing is spawned after the first call.
+    """
+    info = get_engine_info()
+    if not info.available:
+        raise OCRError(info.error or _MISSING_MESSAGE)
+    missing = missing_languages(languages) if languages else []
+    if missing:
+        raise OCRError(f"Tesseract 缺少语言包：{'+'.join(missing)}")
+
+
+def open_image(image: Union[ImageSource, Image.Image]) -> Image.Image:
+    """Open an image from a path or from encoded bytes (decoded images pass through)."""
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
+
+
+def _read(img: Image.Image, languages: str, timeout: int, need_conf: bool) -> Tuple[str, Optional[float]]:
+    backend = get_backend()
+    if need_conf:
+        return backend.image_to_string_with_conf(img, languages, timeout)
+    return backend.image_to_string(img, languages, timeout), None
+
+
+def _recognize(
+    img: Image.Image, languages: str, timeout: int, mode: str, need_conf: bool = True
+) -> Tuple[str, str, Optional[float]]:
+    """OCR a prepared image; returns (text, path, mean word confidence 0-100)
+    with path "fixed", "fast" or "escalated". The confidence is None unless
+    `need_conf` or the adaptive fast pass decided the path."""
+    if mode != "adaptive" or languages == OCR_FAST_LANGUAGES or missing_languages(OCR_FAST_LANGUAGES):
+        text, conf = _read(img, languages, timeout, need_conf)
+        return text, "fixed", conf
+    started = time.monotonic()
+    text, conf = _read(img, OCR_FAST_LANGUAGES, timeout, True)
+    if text.strip() and conf >= OCR_ADAPTIVE_MIN_CONF:
+        return text, "fast", conf
+    # Nothing legible to the light model: likely another script, use the full set
+    remaining = max(1, timeout - int(time.monotonic() - started)) if timeout else 0
+    text, conf = _read(img, languages, remaining, need_conf)
+    return text, "escalated", conf
+
+
+def _extract(
+    image: Union[ImageSource, Image.Image],
+    languages: str,
+    timeout: int,
+    preprocess: Optional[bool],
+    mode: str,
+    need_conf: bool = True,
+) -> Tuple[str, str, Optional[float]]:
+    assert_tesseract_available(languages)
+    if preprocess is None:
+        preprocess = OCR_PREPROCESS
+    with open_image(image) as img:
+        img_converted = preprocess_for_ocr(img) if preprocess else img.convert("RGB")
+        text, path, conf = _recognize(img_converted, languages, timeout, mode, need_conf)
+        return text or "", path, conf
+
+
+def extract_text_from_image(
+    image: ImageSource,
+    languages: str,
+    timeout: int = 0,
+    preprocess: Optional[bool] = None,
+    mode: str = "fixed",
+) -> str:
+    return _extract(image, languages, timeout, preprocess, mode, need_conf=False)[0]
+
+
+def image_has_text(image: Union[ImageSource, Image.Image], min_score: float = OCR_PREFILTER_MIN_SCORE) -> bool:
+    """Cheap check whether `image` likely contains text worth OCR-ing."""
+    if min_score <= 0:
+        return True
+    with open_image(image) as img:
+        gray = np.asarray(to_gray(img, _PREFILTER_SIDE))
+    return text_likelihood(gray) >= min_score
+
+
+def _ocr_job(
+    image: Union[ImageSource, Image.Image], languages: str, timeout: int, mode: str, need_conf: bool = True
+) -> Tuple[str, str, Optional[float]]:
+    """Worker entry point: (text, path, confidence), path "skipped" meaning the prefilter saw no text.
+
+    `image` is an encoded image, or a strip already cut out by the parent.
+    The confidence may be None unless `need_conf` (see _recognize).
+    """
+    with open_image(image) as img:
+        decoded = _decode_for_ocr(img)
+    if not image_has_text(decoded):
+        return "", "skipped", 0.0
+    return _extract(decoded, languages, timeout, None, mode, need_conf)
+
+
+def _decode_for_ocr(img: Image.Image) -> Image.Image:
+    """Decode `img` once, as OCR will read it: grayscale at OCR_MAX_SIDE (JPEG
+    draft decoding) when preprocessing, else full-size RGB."""
+    if OCR_PREPROCESS:
+        return to_gray(img, OCR_MAX_SIDE)
+    return img.convert("RGB")
+
+
+def strip_boxes(width: int, height: int) -> List[Box]:
+    """Overlapping horizontal strips covering a tall image; [] when it is not tiled."""
+    if not OCR_TILE_MIN_HEIGHT or height < OCR_TILE_MIN_HEIGHT:
+        return []
+    step = OCR_TILE_HEIGHT - OCR_TILE_OVERLAP
+    boxes: List[Box] = []
+    top = 0
+    while True:
+        bottom = top + OCR_TILE_HEIGHT
+        # Fold a short remainder into the last strip instead of OCR-ing a sliver
+        if bottom + step // 2 >= height:
+            boxes.append((0, top, width, height))
+            return boxes
+        boxes.append((0, top, width, bottom))
+        top += step
+
+
+def merge_strip_texts(texts: List[str]) -> str:
+    """Join strip texts top to bottom, dropping lines repeated from the overlap."""
+    merged: List[str] = []
+    for text in texts:
+        lines = [line for line in text.splitlines() if line.strip()]
+        tail = {line.strip() for line in merged[-3:]}
+        while lines and lines[0].strip() in tail:
+            lines.pop(0)
+        merged.extend(lines)
+    return "\n".join(merged)
+
+
+class OCRWorkerPool:
+    """Process pool running OCR jobs off the event loop.
+
+    Jobs queue in `_slots` rather than inside the executor, so each job is
+    handed to an idle worker and its timeout covers only its own run. A slot
+    is freed when the worker is done, not when the caller stops waiting; a
+    job still running at its timeout has outlived Tesseract's own limit, so
+    its workers are killed and the pool starts over (as after a crash).
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, int(workers))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily so importing this module never forks
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(get_engine_info(),),
+            )
+        return self._executor
+
+    def resize(self, workers: int) -> None:
+        """Swap in a pool of `workers` processes; queued jobs on the old one still finish."""
+        workers = max(1, int(workers))
+        if workers == self.workers:
+            return
+        self.workers = workers
+        self._slots = asyncio.Semaphore(workers)
+        self.restart()
+
+    def _recycle(self, executor: ProcessPoolExecutor, kill: bool = False) -> None:
+        # Drop `executor` so the next job starts fresh workers. Killed workers fail
+        # their jobs with BrokenProcessPool, which frees the slots they hold.
+        if self._executor is executor:
+            self._executor = None
+        processes = list(getattr(executor, "_processes", {}).values()) if kill else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def restart(self) -> None:
+        """Start fresh workers on the next job (e.g. after a re-probe); queued jobs still finish."""
+        old, self._executor = self._executor, None
+        if old is not None:
+            old.shutdown(wait=False)
+
+    async def run(self, fn, *args, timeout: float):
+        """Run `fn(*args)` in a worker process, allowing it `timeout` seconds once a
+        worker takes it (time queued behind other jobs does not count)."""
+        slots = self._slots
+        await slots.acquire()
+        loop = asyncio.get_running_loop()
+
+        def release(_) -> None:
+            try:
+                loop.call_soon_threadsafe(slots.release)
+            except RuntimeError:
+                pass  # loop already closed (shutdown)
+
+        started = time.monotonic()
+        try:
+            try:
+                executor = self._get_executor()
+                job = executor.submit(fn, *args)
+            except BaseException:
+                slots.release()
+                raise
+            job.add_done_callback(release)
+            return await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+        except asyncio.TimeoutError as exc:
+            if not job.done():
+                logger.warning("OCR 任务超时仍未结束，重启工作进程")
+                self._recycle(executor, kill=True)
+            raise OCRTimeoutError(f"OCR 超时（{timeout:g}s）") from exc
+        except BrokenProcessPool as exc:
+            # A worker died (e.g. OOM-killed); start over with a fresh pool
+            self._recycle(executor)
+            raise OCRError("OCR 工作进程异常退出") from exc
+        finally:
+            spent = _job_seconds.get()
+            if spent is not None:
+                spent[0] += time.monotonic() - started
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers, dropping jobs that have not started yet."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+_pool = OCRWorkerPool(OCR_MAX_CONCURRENCY)
+
+
+def resize_ocr_pool(workers: int) -> None:
+    _pool.resize(workers)
+
+
+def shutdown_ocr_pool(wait: bool = True) -> None:
+    _pool.shutdown(wait=wait)
+
+
+def reprobe_tesseract() -> EngineInfo:
+    """Probe the engine again and restart the workers so they pick up the result."""
+    info = probe_tesseract()
+    _pool.restart()
+    return info
+
+
+async def extract_text_async(image: ImageSource, languages: str, mode: str = OCR_LANG_MODE) -> str:
+    """OCR an image in the worker pool without blocking the event loop.
+
+    Images rejected by the text prefilter return "" without running Tesseract.
+    `mode` is "fixed" or "adaptive" (see module docstring).
+
+    Raises:
+        OCRError: Tesseract missing, worker crash, or OCRTimeoutError on timeout.
+    """
+    return (await extract_text_until(image, languages, mode, need_conf=False))[0]
+
+
+def _run_job(image: Union[ImageSource, Image.Image], languages: str, mode: str, need_conf: bool):
+    return _pool.run(
+        _ocr_job,
+        image,
+        languages,
+        OCR_JOB_TIMEOUT_SECONDS,
+        mode,
+        need_conf,
+        timeout=OCR_JOB_TIMEOUT_SECONDS + _JOB_TIMEOUT_GRACE_SECONDS,
+    )
+
+
+@asynccontextmanager
+async def _admit_all():
+    yield
+
+
+def _cut_strips(image: ImageSource, boxes: List[Box]) -> List[Image.Image]:
+    """Decode `image` once, as OCR will read it, and cut out `boxes` (blocking)."""
+    with open_image(image) as img:
+        img = img.convert("L") if OCR_PREPROCESS else img.convert("RGB")
+        return [img.crop(box) for box in boxes]
+
+
+def _image_size(image: ImageSource) -> Tuple[int, int]:
+    # Reads only the header; no pixel data is decoded
+    try:
+        with open_image(image) as img:
+            return img.size
+    except (OSError, ValueError):
+        return 0, 0
+
+
+@contextmanager
+def track_ocr_time() -> Iterator[List[float]]:
+    """Sum the worker time of OCR jobs started in the block, including from
+    tasks it spawns; yields a one-item list holding the seconds so far.
+
+    Queueing for admission or a worker is not counted, only the jobs' runs.
+    """
+    spent = [0.0]
+    token = _job_seconds.set(spent)
+    try:
+        yield spent
+    finally:
+        _job_seconds.reset(token)
+
+
+async def extract_text_until(
+    image: ImageSource,
+    languages: str,
+    mode: str = OCR_LANG_MODE,
+    stop: Optional[Callable[[str], bool]] = None,
+    admit: Optional[Callable[[], AsyncContextManager[None]]] = None,
+    need_conf: bool = True,
+) -> Tuple[str, bool, Optional[float]]:
+    """Like extract_text_async, returning (text, complete, confidence).
+
+    confidence is Tesseract's mean word confidence (0-100; for tiled images
+    averaged over strips, weighted by text length), or None when the
+    prefilter found no text so there was nothing to read. Without
+    `need_conf` it may be None too: the pytesseract backend then skips the
+    TSV output it is read from.
+
+    `admit` (e.g. limiter.ocr_limited) is entered around every job, so each
+    strip of a tall image counts against the OCR limit and backlog like a
+    whole image; at most as many strips of one image as the pool has workers
+    (the OCR limit) wait for admission at a time.
+
+    For tiled images, `stop` is called with the merged text of the strips
+    finished so far; once it returns True the remaining strips are cancelled
+    and the partial text is returned with complete=False. Strips already running in a worker
+    finish there, but their results are dropped. A strip that fails (backlog
+    full, timeout, worker error) is left out and the others' text is
+    returned with complete=False; only when every strip fails is the first
+    error raised.
+    """
+    # Fail fast on the cached probe instead of shipping the image to a worker
+    await ensure_engine_probed()
+    assert_tesseract_available(languages)
+    admit = admit or _admit_all
+    _ocr_stats["images"] += 1
+    boxes = strip_boxes(*_image_size(image))
+    if not boxes:
+        async with admit():
+            text, path, conf = await _run_job(image, languages, mode, need_conf)
+        _ocr_stats["checked"] += 1
+        _ocr_stats[path] += 1
+        return text, True, None if path == "skipped" else conf
+
+    _ocr_stats["tiled"] += 1
+    strips = await asyncio.to_thread(_cut_strips, image, boxes)
+    slots = asyncio.Semaphore(_pool.workers)
+
+    async def run_strip(strip: Image.Image) -> Tuple[str, str, float]:
+        async with slots:
+            async with admit():
+                return await _run_job(strip, languages, mode, need_conf)
+
+    tasks = [asyncio.ensure_future(run_strip(strip)) for strip in strips]
+    del strips
+    texts: List[Optional[str]] = [None] * len(tasks)
+    # (confidence, weight) of every strip that was OCR'd rather than skipped
+    confs: List[Tuple[float, int]] = []
+    errors: List[OCRError] = []
+
+    def result(complete: bool) -> Tuple[str, bool, Optional[float]]:
+        total = sum(weight for _, weight in confs)
+        conf = sum(c * weight for c, weight in confs) / total if total else None
+        return merge_strip_texts([t for t in texts if t]), complete, conf
+
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    text, path, conf = task.result()
+                except OCRError as exc:
+                    errors.append(exc)
+                    _ocr_stats["strips_failed"] += 1
+                    continue
+                texts[tasks.index(task)] = text
+                if path != "skipped" and conf is not None:
+                    confs.append((conf, max(1, len(text.strip()))))
+                _ocr_stats["strips"] += 1
+                _ocr_stats["checked"] += 1
+                _ocr_stats[path] += 1
+            if stop is not None and pending and stop(merge_strip_texts([t for t in texts if t])):
+                _ocr_stats["strips_cancelled"] += len(pending)
+                return result(False)
+    finally:
+        for task in tasks:
+            task.cancel()
+    if errors:
+        if len(errors) == len(tasks):
+            raise errors[0]
+        logger.warning("长图 %d/%d 块 OCR 失败，使用其余块的文字：%s", len(errors), len(tasks), errors[0])
+        return result(False)
+    return result(True)
+
+
+def get_ocr_stats() -> Dict[str, int]:
+    return dict(_ocr_stats)
@@ -0,0 +1,134 @@
+"""Near-duplicate search over 64-bit perceptual hashes.
+
+PHashIndex implements multi-index hashing: each hash is split into four 16-bit
+bands and filed under every band value. Two hashes within Hamming distance r
+must agree on at least one band up to r // 4 bits (pigeonhole), so a query only
+probes those few band neighbourhoods and checks the resulting candidates,
+instead of scanning every stored hash.
+
+`phash_index` is the process-wide instance, loaded at startup from the pHash
+keys of the OCR and AI verdict caches, extended as new hashes are stored and
+pruned as cache maintenance evicts their last entry.
+"""
+import threading
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_BANDS = 4
+_BAND_BITS = 16
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+try:
+    _popcount = int.bit_count  # Python 3.10+
+except AttributeError:  # pragma: no cover
+    def _popcount(x: int) -> int:
+        return bin(x).count("1")
+
+
+def parse_phash(phash: str) -> Optional[int]:
+    """Return the 64-bit value of a 16-hex-digit pHash string, or None."""
+    if len(phash) != 16:
+        return None
+    try:
+        return int(phash, 16)
+    except ValueError:
+        return None
+
+
+def phash_distance(a: str, b: str) -> Optional[int]:
+    """Hamming distance between two pHash strings, or None if either is invalid."""
+    va, vb = parse_phash(a), parse_phash(b)
+    if va is None or vb is None:
+        return None
+    return _popcount(va ^ vb)
+
+
+def _band_neighbours(value: int, bits: int) -> List[int]:
+    """All 16-bit values within `bits` bit flips of `value`."""
+    out = [value]
+    for k in range(1, bits + 1):
+        for positions in combinations(range(_BAND_BITS), k):
+            flipped = value
+            for pos in positions:
+                flipped ^= 1 << pos
+            out.append(flipped)
+    return out
+
+
+class PHashIndex:
+    """Multi-index hash table over 64-bit pHashes with Hamming-radius search."""
+
+    def __init__(self) -> None:
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(_BANDS)]
+        self._hashes: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _add(self, value: int) -> None:
+        if value in self._hashes:
+            return
+        self._hashes.add(value)
+        for band, table in enumerate(self._tables):
+            table.setdefault((value >> (band * _BAND_BITS)) & _BAND_MASK, []).append(value)
+
+    def add(self, phash: str) -> None:
+        value = parse_phash(phash)
+        if value is not None:
+            with self._lock:
+                self._add(value)
+
+    def update(self, phashes: Iterable[str]) -> int:
+        """Add many hashes (strings that are not pHashes are skipped); returns the new size."""
+        values = [v for v in map(parse_phash, phashes) if v is not None]
+        with self._lock:
+            for value in values:
+                self._add(value)
+            return len(self._hashes)
+
+    def discard(self, phash: str) -> None:
+        """Remove a hash (e.g. once its last cache entry was evicted); no-op if absent."""
+        value = parse_phash(phash)
+        if value is None:
+            return
+        with self._lock:
+            if value not in self._hashes:
+                return
+            self._hashes.discard(value)
+            for band, table in enumerate(self._tables):
+                key = (value >> (band * _BAND_BITS)) & _BAND_MASK
+                bucket = table.get(key)
+                if bucket is not None:
+                    bucket.remove(value)
+                    if not bucket:
+                        del table[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables = [{} for _ in range(_BANDS)]
+            self._hashes = set()
+
+    def search(self, phash: str, radius: int, limit: int = 3) -> List[Tuple[int, str]]:
+        """Return up to `limit` stored hashes within `radius` bits, nearest first.
+
+        Returns:
+            list: (distance, phash) pairs; the query itself is included if stored.
+        """
+        value = parse_phash(phash)
+        if value is None or radius < 0:
+            return []
+        sub_radius = radius // _BANDS
+        found: Dict[int, int] = {}
+        with self._lock:
+            for band, table in enumerate(self._tables):
+                key = (value >> (band * _BAND_BITS)) & _BAND_MASK
+                for probe in _band_neighbours(key, sub_radius):
+                    for candidate in table.get(probe, ()):
+                        if candidate not in found:
+                            found[candidate] = _popcount(candidate ^ value)
+        hits = sorted((d, c) for c, d in found.items() if d <= radius)[:limit]
+        return [(d, f"{c:016x}") for d, c in hits]
+
+
+phash_index = PHashIndex()
@@ -0,0 +1,189 @@
+"""Image preprocessing in front of Tesseract.
+
+preprocess_for_ocr turns a decoded image into something Tesseract reads both
+faster and more reliably:
+
+- JPEGs are decoded at reduced scale in grayscale (PIL draft mode), then the
+  image is downscaled so its longer side is at most OCR_MAX_SIDE pixels.
+  Telegram images carry no usable DPI, so pixel size stands in for DPI.
+- Horizontal bands containing text are located from the density of
+  horizontal intensity steps, which glyph strokes produce in bulk. When they
+  cover only part of the image, the bands are cropped and stacked into a
+  single image, so one tesseract run skips backgrounds and photos. This is
+  opt-in (OCR_TEXT_REGIONS) until its recall is measured on real chi_sim+eng
+  screenshots.
+- Each cropped band is binarized with its own Otsu threshold and flipped to
+  dark text on white, so light-on-dark banners survive next to dark-on-light
+  ones. Uncropped images stay grayscale for Tesseract's own thresholding.
+
+text_likelihood is the cheap "is there any text?" test run before all of
+this (see ocr.image_has_text): on a small grayscale copy it counts thin
+strokes, meaning a strong intensity step followed within a few pixels by one
+of the opposite sign, and returns the share of rows that are dense in them.
+Printed glyphs produce rows full of such strokes. Skin, sky and blurred
+backgrounds produce almost none, and noise is mostly averaged away.
+
+tesseract_config builds the --psm/--oem options from OCR_PSM/OCR_OEM.
+"""
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .config import OCR_BINARIZE, OCR_MAX_SIDE, OCR_OEM, OCR_PSM, OCR_TEXT_REGIONS
+
+# Grey-level step between neighbouring pixels that counts as an edge
+_EDGE_THRESHOLD = 40
+# Fraction of edge pixels for a row to be considered part of a text line
+_ROW_EDGE_DENSITY = 0.02
+_MIN_BAND_PX = 6
+_MERGE_GAP_PX = 6
+_PAD_PX = 6
+_STACK_GAP_PX = 12
+# Bands covering more of the image than this are not worth cropping
+_FULL_COVERAGE = 0.8
+
+# Widest stroke (px on the 2x2-averaged prefilter image) paired into a glyph stroke
+_MAX_STROKE_PX = 6
+# Share of stroke pixels for a row to count as text-dense
+_ROW_STROKE_DENSITY = 0.01
+
+# (top, bottom, left, right) in pixels, bottom/right exclusive
+Box = Tuple[int, int, int, int]
+
+
+def tesseract_config() -> str:
+    """Extra tesseract command-line options from OCR_PSM/OCR_OEM."""
+    opts = []
+    if OCR_PSM is not None:
+        opts.append(f"--psm {OCR_PSM}")
+    if OCR_OEM is not None:
+        opts.append(f"--oem {OCR_OEM}")
+    return " ".join(opts)
+
+
+def to_gray(img: Image.Image, max_side: int = OCR_MAX_SIDE) -> Image.Image:
+    """Grayscale copy of `img` whose longer side is at most `max_side` (0 = keep size)."""
+    w, h = img.size
+    scale = max_side / max(w, h) if max_side else 1.0
+    if scale < 1:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        # JPEG only: decode at 1/2, 1/4 or 1/8 scale when that still covers `size`
+        img.draft("L", size)
+        img = img.convert("L")
+        if img.size != size:
+            img = img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return img
+    return img.convert("L")
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Grey level that best separates `gray` into two classes (Otsu's method)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if not total:
+        return 127
+    omega = np.cumsum(hist) / total
+    mu = np.cumsum(hist * np.arange(256)) / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu[-1] * omega - mu) ** 2 / (omega * (1.0 - omega))
+    between[~np.isfinite(between)] = 0.0
+    return int(np.argmax(between))
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Black-and-white version of `gray` with the minority class (text) black."""
+    dark = gray <= otsu_threshold(gray)
+    if dark.mean() > 0.5:
+        dark = ~dark
+    return np.where(dark, 0, 255).astype(np.uint8)
+
+
+def _half(gray: np.ndarray) -> np.ndarray:
+    """2x2 block average (float) of `gray`, trimmed to even dimensions."""
+    h2, w2 = gray.shape[0] // 2, gray.shape[1] // 2
+    return gray[:h2 * 2, :w2 * 2].reshape(h2, 2, w2, 2).mean(axis=(1, 3))
+
+
+def text_bands(gray: np.ndarray) -> List[Box]:
+    """Boxes around the horizontal bands of `gray` that look like text lines."""
+    height, width = gray.shape
+    if height < 2 or width < 3:
+        return []
+    # Edges are found on a 2x2-averaged copy: half the pixels and half the sensor noise
+    edges = np.abs(np.diff(_half(gray), axis=1)) > _EDGE_THRESHOLD
+    rows = edges.mean(axis=1) > _ROW_EDGE_DENSITY
+    bounds = np.flatnonzero(np.diff(np.concatenate(([0], rows.view(np.int8), [0]))))
+    runs: List[List[int]] = []
+    for start, end in zip(bounds[::2], bounds[1::2]):
+        if runs and start - runs[-1][1] < _MERGE_GAP_PX // 2:
+            runs[-1][1] = int(end)
+        else:
+            runs.append([int(start), int(end)])
+    boxes: List[Box] = []
+    for top, bottom in runs:
+        if (bottom - top) * 2 < _MIN_BAND_PX:
+            continue
+        cols = np.flatnonzero(edges[top:bottom].any(axis=0))
+        boxes.append((
+            max(0, top * 2 - _PAD_PX),
+            min(height, bottom * 2 + _PAD_PX),
+            max(0, int(cols[0]) * 2 - _PAD_PX),
+            min(width, int(cols[-1]) * 2 + 4 + _PAD_PX),
+        ))
+    return boxes
+
+
+def text_likelihood(gray: np.ndarray) -> float:
+    """Share (0-1) of rows of `gray` dense in thin, glyph-like strokes."""
+    if gray.shape[0] < 2 or gray.shape[1] < 2 * (_MAX_STROKE_PX + 2):
+        return 0.0
+    step = np.diff(_half(gray), axis=1)
+    rise = step > _EDGE_THRESHOLD
+    fall = step < -_EDGE_THRESHOLD
+    strokes = np.zeros(rise.shape, dtype=bool)
+    for width in range(1, _MAX_STROKE_PX + 1):
+        # Dark stroke on light (fall, then rise) or light stroke on dark
+        strokes[:, :-width] |= (fall[:, :-width] & rise[:, width:]) | (rise[:, :-width] & fall[:, width:])
+    return float((strokes.mean(axis=1) > _ROW_STROKE_DENSITY).mean())
+
+
+def _stack(crops: List[np.ndarray]) -> np.ndarray:
+    width = max(c.shape[1] for c in crops)
+    height = sum(c.shape[0] for c in crops) + _STACK_GAP_PX * (len(crops) + 1)
+    canvas = np.full((height, width + 2 * _STACK_GAP_PX), 255, dtype=np.uint8)
+    y = _STACK_GAP_PX
+    for crop in crops:
+        canvas[y:y + crop.shape[0], _STACK_GAP_PX:_STACK_GAP_PX + crop.shape[1]] = crop
+        y += crop.shape[0] + _STACK_GAP_PX
+    return canvas
+
+
+def preprocess_for_ocr(
+    img: Image.Image,
+    max_side: int = OCR_MAX_SIDE,
+    binarize_bands: bool = OCR_BINARIZE,
+    crop_regions: bool = OCR_TEXT_REGIONS,
+) -> Image.Image:
+    """Grayscale (optionally binarized, text-only) image ready for Tesseract.
+
+    Args:
+        img: Opened image; a JPEG that is not loaded yet is decoded in draft mode.
+        max_side: Longer-side limit in pixels (0 = keep size).
+        binarize_bands: Binarize each cropped band with its own threshold.
+        crop_regions: Keep only detected text bands when they cover part of the image.
+
+    Returns:
+        Image.Image: Mode "L" image.
+    """
+    gray = np.asarray(to_gray(img, max_side))
+    crops = [gray]
+    if crop_regions:
+        boxes = text_bands(gray)
+        area = sum((b - t) * (r - l) for t, b, l, r in boxes)
+        if boxes and area < _FULL_COVERAGE * gray.size:
+            crops = [gray[t:b, l:r] for t, b, l, r in boxes]
+    if binarize_bands and crops[0] is not gray:
+        # A whole image gets one global threshold, which Tesseract applies itself
+        crops = [binarize(c) for c in crops]
+    return Image.fromarray(crops[0] if len(crops) == 1 else _stack(crops))
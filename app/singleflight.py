@@ -0,0 +1,88 @@
+"""In-flight deduplication of identical async work.
+
+When the same media is posted into many groups at once, every handler misses
+the caches at the same moment. SingleFlight lets the first caller for a key
+(the leader) do the work while concurrent callers for the same key await its
+result instead of downloading and processing the file again. Nothing is
+cached once the leader finishes; the regular caches take over from there.
+
+Named instances register themselves so /cache_stats can report how much
+duplicate work was avoided (see all_flight_stats).
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar
+
+T = TypeVar("T")
+
+_registry: Dict[str, "SingleFlight"] = {}
+
+
+class _Flight:
+    """One in-flight run: the detached task and how many callers await it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The work runs in its own task so cancelling the caller that started it
+    does not fail the others; it is only cancelled once every caller is gone.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.shared = 0
+        _registry[name] = self
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run `fn()` for `key`, or join the run already in flight for it."""
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self._inflight[key] = flight
+            self.leaders += 1
+        else:
+            self.shared += 1
+        flight.waiters += 1
+        try:
+            # Shielded so one cancelled caller does not cancel the shared run
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _finish(self, key: str, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Mark the exception as retrieved even when every caller was cancelled
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "inflight": len(self._inflight),
+        }
+
+
+def all_flight_stats() -> List[Dict[str, Any]]:
+    """Stats of every SingleFlight instance, in creation order."""
+    return [flight.stats() for flight in _registry.values()]
+
+
+# Download → OCR → cache pipelines, keyed by file_unique_id
+photo_ocr_flight = SingleFlight("photo_ocr")
+video_ocr_flight = SingleFlight("video_ocr")
+# Download → AI image classification per file_unique_id
+ai_image_flight = SingleFlight("ai_image")
@@ -3,13 +3,23 @@
 This module exposes a Rules dataclass and CRUD operations for per-chat
 keywords, regexes, actions, and newcomer governance, mapping to the `rules`
 table. It validates and normalizes inputs and hides persistence details.
+
+get_compiled_rules serves the message path from an in-process cache of
+`CompiledRules`; every setter writes through `_save_rules`, which refreshes
+the cached entry so no message ever sees stale rules. Async handlers use
+compiled_rules, which loads a cache miss on the DB thread pool. Setters are blocking
+and meant to be called through db.run_db; they are serialized by a lock.
 """
+import functools
 import json
-from dataclasses import dataclass, asdict
+import re
+import threading
+from dataclasses import dataclass, asdict, replace
 from typing import List, Dict, Any, Optional
 
 from .config import DEFAULT_ACTION, ALLOWED_ACTIONS
-from .db import get_rules_row, upsert_rules_row
+from .db import get_rules_row, upsert_rules_row, run_db
+from .matcher import CompiledRules
 
 
 @dataclass
@@ -23,10 +33,22 @@ class Rules:
     captcha_enabled: bool
     captcha_timeout_seconds: int
     first_message_strict: bool
+    video_frames: int = 1
+    video_scan_seconds: int = 10
+    ocr_languages: str = ""
+    ocr_lang_mode: str = ""
 
 
 _VALID_BUFFER_MODES = {"none", "mute", "restrict_media", "restrict_links"}
 
+# Bounds for per-chat video scanning (frames sampled, seconds budget)
+MAX_VIDEO_FRAMES = 10
+MAX_VIDEO_SCAN_SECONDS = 120
+
+# Per-chat OCR language overrides ("" = global OCR_LANGUAGES / OCR_LANG_MODE)
+_VALID_OCR_LANG_MODES = {"", "fixed", "adaptive"}
+_OCR_LANGUAGES_RE = re.compile(r"^[A-Za-z_]+(\+[A-Za-z_]+)*$")
+
 
 def _default_rules() -> Rules:
     """Return default per-chat `Rules` with safe, sensible defaults.
@@ -44,6 +66,10 @@ def _default_rules() -> Rules:
         captcha_enabled=False,
         captcha_timeout_seconds=120,
         first_message_strict=True,
+        video_frames=1,
+        video_scan_seconds=10,
+        ocr_languages="",
+        ocr_lang_mode="",
     )
 
 
@@ -73,6 +99,10 @@ def _row_to_rules(row: Optional[Dict[str, Any]]) -> Rules:
     captcha_enabled = bool(int(row.get("captcha_enabled", 0)))
     captcha_timeout_seconds = int(row.get("captcha_timeout_seconds", 120))
     first_message_strict = bool(int(row.get("first_message_strict", 1)))
+    video_frames = int(row.get("video_frames", 1))
+    video_scan_seconds = int(row.get("video_scan_seconds", 10))
+    ocr_languages = str(row.get("ocr_languages") or "")
+    ocr_lang_mode = str(row.get("ocr_lang_mode") or "")
 
     if action not in ALLOWED_ACTIONS:
         action = DEFAULT_ACTION
@@ -84,6 +114,12 @@ def _row_to_rules(row: Optional[Dict[str, Any]]) -> Rules:
         newcomer_buffer_mode = "none"
     if captcha_timeout_seconds < 10:
         captcha_timeout_seconds = 10
+    video_frames = min(MAX_VIDEO_FRAMES, max(1, video_frames))
+    video_scan_seconds = min(MAX_VIDEO_SCAN_SECONDS, max(1, video_scan_seconds))
+    if not _OCR_LANGUAGES_RE.match(ocr_languages):
+        ocr_languages = ""
+    if ocr_lang_mode not in _VALID_OCR_LANG_MODES:
+        ocr_lang_mode = ""
 
     return Rules(
         keywords=list(dict.fromkeys(map(str, keywords))),
@@ -95,6 +131,10 @@ def _row_to_rules(row: Optional[Dict[str, Any]]) -> Rules:
         captcha_enabled=captcha_enabled,
         captcha_timeout_seconds=captcha_timeout_seconds,
         first_message_strict=first_message_strict,
+        video_frames=video_frames,
+        video_scan_seconds=video_scan_seconds,
+        ocr_languages=ocr_languages,
+        ocr_lang_mode=ocr_lang_mode,
     )
 
 
@@ -111,6 +151,78 @@ def load_rules(chat_id: Optional[int] = None) -> Rules:
     return _row_to_rules(row)
 
 
+# Compiled rules per chat id (0 = global). Writers bump the per-chat version
+# (or the global epoch) so a load racing with a save never re-populates the
+# cache with stale rules.
+_compiled_cache: Dict[int, CompiledRules] = {}
+_compiled_versions: Dict[int, int] = {}
+_compiled_epoch = 0
+_compiled_lock = threading.Lock()
+
+
+def _compile(rules: Rules) -> CompiledRules:
+    """Compile a private copy of `rules` so callers' later mutations don't leak in."""
+    return CompiledRules(replace(rules, keywords=list(rules.keywords), regexes=list(rules.regexes)))
+
+
+def get_compiled_rules(chat_id: Optional[int] = None) -> CompiledRules:
+    """Return cached compiled rules for a chat, loading them on first use.
+
+    Args:
+        chat_id: Telegram chat id. None/0 means global.
+
+    Returns:
+        CompiledRules: Matcher and rules snapshot; treat as read-only.
+    """
+    key = int(chat_id or 0)
+    compiled = _compiled_cache.get(key)
+    if compiled is not None:
+        return compiled
+    with _compiled_lock:
+        stamp = (_compiled_epoch, _compiled_versions.get(key, 0))
+    compiled = _compile(load_rules(key))
+    with _compiled_lock:
+        if stamp == (_compiled_epoch, _compiled_versions.get(key, 0)):
+            _compiled_cache[key] = compiled
+    return compiled
+
+
+async def compiled_rules(chat_id: Optional[int] = None) -> CompiledRules:
+    """Async front end of get_compiled_rules: a cache miss is loaded via run_db.
+
+    Args:
+        chat_id: Telegram chat id. None/0 means global.
+
+    Returns:
+        CompiledRules: Matcher and rules snapshot; treat as read-only.
+    """
+    compiled = _compiled_cache.get(int(chat_id or 0))
+    if compiled is not None:
+        return compiled
+    return await run_db(get_compiled_rules, chat_id)
+
+
+def clear_rules_cache() -> None:
+    """Drop all cached compiled rules (e.g. after editing the DB out of band)."""
+    global _compiled_epoch
+    with _compiled_lock:
+        _compiled_epoch += 1
+        _compiled_cache.clear()
+
+
+# Setters run on the DB thread pool (see db.run_db); their load-modify-save
+# must not interleave or one admin's change could overwrite another's
+_rules_write_lock = threading.Lock()
+
+
+def _serialized(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _rules_write_lock:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
 def _save_rules(rules: Rules, chat_id: Optional[int]) -> None:
     """Persist a `Rules` object into the DB.
 
@@ -130,10 +242,20 @@ def _save_rules(rules: Rules, chat_id: Optional[int]) -> None:
             "captcha_enabled": 1 if rules.captcha_enabled else 0,
             "captcha_timeout_seconds": int(rules.captcha_timeout_seconds),
             "first_message_strict": 1 if rules.first_message_strict else 0,
+            "video_frames": int(rules.video_frames),
+            "video_scan_seconds": int(rules.video_scan_seconds),
+            "ocr_languages": rules.ocr_languages,
+            "ocr_lang_mode": rules.ocr_lang_mode,
         },
     )
+    key = int(chat_id or 0)
+    compiled = _compile(rules)
+    with _compiled_lock:
+        _compiled_versions[key] = _compiled_versions.get(key, 0) + 1
+        _compiled_cache[key] = compiled
 
 
+@_serialized
 def add_keyword(keyword: str, chat_id: Optional[int] = None) -> Rules:
     """Append a keyword to the rules if not duplicated.
 
@@ -152,6 +274,7 @@ def add_keyword(keyword: str, chat_id: Optional[int] = None) -> Rules:
     return rules
 
 
+@_serialized
 def remove_keyword(keyword: str, chat_id: Optional[int] = None) -> Rules:
     """Remove a keyword from the rules.
 
@@ -169,6 +292,7 @@ def remove_keyword(keyword: str, chat_id: Optional[int] = None) -> Rules:
     return rules
 
 
+@_serialized
 def add_regex(pattern: str, chat_id: Optional[int] = None) -> Rules:
     """Append a regex pattern to the rules if not duplicated.
 
@@ -176,10 +300,17 @@ def add_regex(pattern: str, chat_id: Optional[int] = None) -> Rules:
         pattern: Regex string.
         chat_id: Target chat.
 
+    Raises:
+        ValueError: If the pattern does not compile.
+
     Returns:
         Rules: Updated rules.
     """
     pattern = pattern.strip()
+    try:
+        re.compile(pattern, re.IGNORECASE)
+    except re.error as exc:
+        raise ValueError(str(exc)) from exc
     rules = load_rules(chat_id)
     if pattern and pattern not in rules.regexes:
         rules.regexes.append(pattern)
@@ -187,6 +318,7 @@ def add_regex(pattern: str, chat_id: Optional[int] = None) -> Rules:
     return rules
 
 
+@_serialized
 def remove_regex(pattern: str, chat_id: Optional[int] = None) -> Rules:
     """Remove a regex pattern from the rules.
 
@@ -204,6 +336,7 @@ def remove_regex(pattern: str, chat_id: Optional[int] = None) -> Rules:
     return rules
 
 
+@_serialized
 def set_action(action: str, chat_id: Optional[int] = None) -> Rules:
     """Set the default moderation action for this chat.
 
@@ -225,6 +358,7 @@ def set_action(action: str, chat_id: Optional[int] = None) -> Rules:
     return rules
 
 
+@_serialized
 def set_mute_seconds(seconds: int, chat_id: Optional[int] = None) -> Rules:
     """Set mute duration in seconds for mute-related actions.
 
@@ -246,6 +380,7 @@ def set_mute_seconds(seconds: int, chat_id: Optional[int] = None) -> Rules:
     return rules
 
 
+@_serialized
 def set_newcomer_buffer(seconds: int, mode: str, chat_id: Optional[int] = None) -> Rules:
     """Configure newcomer buffer window and mode.
 
@@ -271,6 +406,7 @@ def set_newcomer_buffer(seconds: int, mode: str, chat_id: Optional[int] = None)
     return rules
 
 
+@_serialized
 def set_captcha(enabled: bool, timeout_seconds: Optional[int] = None, chat_id: Optional[int] = None) -> Rules:
     """Enable/disable captcha and optionally set timeout.
 
@@ -295,6 +431,7 @@ def set_captcha(enabled: bool, timeout_seconds: Optional[int] = None, chat_id: O
     return rules
 
 
+@_serialized
 def set_first_message_strict(enabled: bool, chat_id: Optional[int] = None) -> Rules:
     """Toggle strict handling for a user's first message after joining.
 
@@ -308,4 +445,62 @@ def set_first_message_strict(enabled: bool, chat_id: Optional[int] = None) -> Ru
     rules = load_rules(chat_id)
     rules.first_message_strict = bool(enabled)
     _save_rules(rules, chat_id)
-    return rules
\ No newline at end of file
+    return rules
+
+
+@_serialized
+def set_video_scan(frames: int, seconds: Optional[int] = None, chat_id: Optional[int] = None) -> Rules:
+    """Configure how many video frames are sampled for OCR and the time budget.
+
+    Args:
+        frames: Frames to sample per video (1 = first frame only).
+        seconds: Optional budget for extracting and OCR-ing them.
+        chat_id: Target chat.
+
+    Raises:
+        ValueError: If frames or seconds are out of range.
+
+    Returns:
+        Rules: Updated rules.
+    """
+    if not 1 <= int(frames) <= MAX_VIDEO_FRAMES:
+        raise ValueError(f"frames must be 1..{MAX_VIDEO_FRAMES}")
+    if seconds is not None and not 1 <= int(seconds) <= MAX_VIDEO_SCAN_SECONDS:
+        raise ValueError(f"seconds must be 1..{MAX_VIDEO_SCAN_SECONDS}")
+    rules = load_rules(chat_id)
+    rules.video_frames = int(frames)
+    if seconds is not None:
+        rules.video_scan_seconds = int(seconds)
+    _save_rules(rules, chat_id)
+    return rules
+
+
+@_serialized
+def set_ocr_language(mode: str, languages: Optional[str] = None, chat_id: Optional[int] = None) -> Rules:
+    """Override how OCR picks its languages for a chat.
+
+    Args:
+        mode: "fixed", "adaptive", or "" to follow the global OCR_LANG_MODE.
+        languages: Tesseract languages joined by "+", e.g. "chi_sim+eng"; ""
+            follows the global OCR_LANGUAGES, None keeps the current value.
+        chat_id: Target chat.
+
+    Raises:
+        ValueError: If the mode or the language list is invalid.
+
+    Returns:
+        Rules: Updated rules.
+    """
+    mode = mode.strip().lower()
+    if mode not in _VALID_OCR_LANG_MODES:
+        raise ValueError("mode must be fixed, adaptive or default")
+    if languages is not None:
+        languages = languages.strip()
+        if languages and not _OCR_LANGUAGES_RE.match(languages):
+            raise ValueError("languages must look like chi_sim+eng")
+    rules = load_rules(chat_id)
+    rules.ocr_lang_mode = mode
+    if languages is not None:
+        rules.ocr_languages = languages
+    _save_rules(rules, chat_id)
+    return rules
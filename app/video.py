@@ -1,32 +1,193 @@
-"""Video helpers: first-frame extraction and perceptual hashing.
+"""Video helpers: frame extraction and perceptual hashing.
 
-extract_first_frame uses ffmpeg to grab a frame from a video file.
+extract_frame_bytes runs ffmpeg as an asyncio subprocess and reads the frame
+as JPEG bytes from its stdout, so nothing is written to disk and the event
+loop is never blocked; ffmpeg is killed on timeout or cancellation. The video
+is either a file path or the downloaded bytes, which are fed through stdin;
+extract_frame_from_stream pipes a download into ffmpeg while it arrives.
+extract_keyframes samples several frames (fixed interval plus scene changes)
+in a single ffmpeg run; extract_keyframes_from_stream does so from a download.
 compute_image_phash computes a perceptual hash (pHash) for near-duplicate checks.
 """
-import subprocess
+import asyncio
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Union
 
-from PIL import Image
 import imagehash
 
+from .config import FFMPEG_TIMEOUT_SECONDS
+from .ocr import ImageSource, open_image
 
-def extract_first_frame(video_path: Path, output_path: Path, time_pos: str = "00:00:00.5") -> bool:
+
+def _frame_command(source: str, time_pos: str) -> List[str]:
+    # -ss before -i for faster seek, -frames:v 1 to get one frame
+    return [
+        "ffmpeg", "-nostdin", "-v", "error", "-ss", time_pos, "-i", source,
+        "-frames:v", "1", "-f", "image2pipe", "-c:v", "mjpeg", "pipe:1",
+    ]
+
+
+async def _run_ffmpeg(args: List[str], video: Union[Path, bytes], timeout: float) -> Optional[bytes]:
+    """Run ffmpeg on `video` (a path, or bytes piped to stdin) and return its stdout."""
+    piped = isinstance(video, (bytes, bytearray))
     try:
-        # -ss before -i for faster seek, -frames:v 1 to get one frame
-        subprocess.run([
-            "ffmpeg", "-y", "-ss", time_pos, "-i", str(video_path), "-frames:v", "1", str(output_path)
-        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return output_path.exists()
-    except Exception:
-        return False
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if piped else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(video if piped else None), timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        # Reached with a live process only on timeout or cancellation
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode != 0 or not stdout:
+        return None
+    return stdout
+
+
+def _source(video: Union[Path, bytes]) -> str:
+    return "pipe:0" if isinstance(video, (bytes, bytearray)) else str(video)
+
+
+async def extract_frame_bytes(
+    video: Union[Path, bytes],
+    time_pos: str = "00:00:00.5",
+    timeout: float = FFMPEG_TIMEOUT_SECONDS,
+) -> Optional[bytes]:
+    """Grab one frame at `time_pos` as JPEG bytes, or None on failure/timeout.
+
+    In-memory videos are piped to ffmpeg, which cannot seek in them: formats
+    whose index sits at the end of the file fail and return None.
+    """
+    return await _run_ffmpeg(_frame_command(_source(video), time_pos), video, timeout)
+
+
+def _split_jpegs(data: bytes) -> List[bytes]:
+    # Markers are never byte-stuffed, so EOI+SOI only occurs between two images
+    parts = data.split(b"\xff\xd9\xff\xd8")
+    if len(parts) == 1:
+        return [data]
+    return [parts[0] + b"\xff\xd9"] + [b"\xff\xd8" + p + b"\xff\xd9" for p in parts[1:-1]] + [b"\xff\xd8" + parts[-1]]
+
+
+async def extract_keyframes(
+    video: Union[Path, bytes],
+    count: int,
+    interval: float,
+    timeout: float = FFMPEG_TIMEOUT_SECONDS,
+    scene_threshold: float = 0.3,
+) -> List[bytes]:
+    """Sample up to `count` frames as JPEG bytes in one ffmpeg run.
+
+    The first frame at 0.5s is taken, then one whenever `interval` seconds
+    have passed since the last pick or the scene changes (score above
+    `scene_threshold`, at least 0.25s after the last pick).
+
+    Returns:
+        list: JPEG frames in time order; empty on failure/timeout.
+    """
+    args = _keyframes_command(_source(video), count, interval, scene_threshold)
+    stdout = await _run_ffmpeg(args, video, timeout)
+    return _split_jpegs(stdout) if stdout else []
+
+
+def _keyframes_command(source: str, count: int, interval: float, scene_threshold: float) -> List[str]:
+    select = (
+        f"select='isnan(prev_selected_t)*gte(t,0.5)"
+        f"+gte(t-prev_selected_t,{interval:.3f})"
+        f"+gt(scene,{scene_threshold})*gte(t-prev_selected_t,0.25)'"
+    )
+    # -fps_mode needs ffmpeg 5.1+ (it replaces the deprecated -vsync)
+    return [
+        "ffmpeg", "-nostdin", "-v", "error", "-i", source,
+        "-vf", select, "-fps_mode", "vfr", "-frames:v", str(int(count)),
+        "-f", "image2pipe", "-c:v", "mjpeg", "pipe:1",
+    ]
+
+
+async def extract_keyframes_from_stream(
+    chunks: AsyncIterator[bytes],
+    count: int,
+    interval: float,
+    timeout: float = FFMPEG_TIMEOUT_SECONDS,
+    scene_threshold: float = 0.3,
+) -> List[bytes]:
+    """Like extract_keyframes, but feed ffmpeg from `chunks` as they arrive.
+
+    ffmpeg exits after `count` frames, so a long video is only read up to the
+    last sampled frame.
+    """
+    args = _keyframes_command("pipe:0", count, interval, scene_threshold)
+    stdout = await _run_ffmpeg_stream(args, chunks, timeout)
+    return _split_jpegs(stdout) if stdout else []
+
+
+async def extract_frame_from_stream(
+    chunks: AsyncIterator[bytes],
+    time_pos: str = "00:00:00.5",
+    timeout: float = FFMPEG_TIMEOUT_SECONDS,
+) -> Optional[bytes]:
+    """Like extract_frame_bytes, but feed ffmpeg from `chunks` as they arrive.
+
+    Iteration over `chunks` stops as soon as ffmpeg has written its frame and
+    exited, so callers streaming a download fetch only the bytes ffmpeg read.
+    """
+    return await _run_ffmpeg_stream(_frame_command("pipe:0", time_pos), chunks, timeout)
+
+
+async def _run_ffmpeg_stream(args: List[str], chunks: AsyncIterator[bytes], timeout: float) -> Optional[bytes]:
+    """Run ffmpeg reading stdin from `chunks` until it exits; return its stdout."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+
+    async def feed_and_read() -> bytes:
+        reader = asyncio.ensure_future(proc.stdout.read())
+        try:
+            async for chunk in chunks:
+                if reader.done():
+                    break
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+            else:
+                proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg exited; whatever it produced is on stdout
+        return await reader
+
+    try:
+        stdout = await asyncio.wait_for(feed_and_read(), timeout)
+        await proc.wait()
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode != 0 or not stdout:
+        return None
+    return stdout
 
 
-def compute_image_phash(image_path: Path) -> Optional[str]:
+def compute_image_phash(image: ImageSource) -> Optional[str]:
     try:
-        with Image.open(image_path) as img:
+        with open_image(image) as img:
             img = img.convert("L").resize((256, 256))
             ph = imagehash.phash(img)
             return str(ph)
     except Exception:
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,824 @@
+"""Micro-benchmarks for the detection and OCR hot paths.
+
+Usage (from the repository root, inside the bot's virtualenv):
+    python scripts/bench.py regex [--sizes 10,100,1000]
+    python scripts/bench.py db [--ops 5000]
+    python scripts/bench.py ai-conn [--calls 50]
+    python scripts/bench.py ai-batch [--messages 200]
+    python scripts/bench.py phash [--sizes 10000,100000,1000000] [--radius 6]
+    python scripts/bench.py ocr [--images 40] [--lang eng] [--samples DIR]
+    python scripts/bench.py prefilter [--images 100] [--min-score 0.01] [--samples DIR]
+    python scripts/bench.py ocr-probe [--calls 200]
+    python scripts/bench.py ocr-backend [--images 30] [--lang eng]
+    python scripts/bench.py ocr-tiles [--images 6] [--height 5000] [--lang eng]
+    python scripts/bench.py photo-ladder [--images 40] [--start-side 1280] [--lang eng]
+    python scripts/bench.py ocr-lang-mode [--images 20] [--lang chi_sim+eng] [--samples DIR]
+    python scripts/bench.py ocr-max-side [--images 10] [--sides 0,1600,3000] [--lang eng] [--samples DIR]
+
+Each subcommand compares the current implementation with the previous
+behaviour it replaced and prints one line per configuration. Benchmarks use a
+throwaway DATA_DIR so they never touch the bot's database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="ad_guard_bench_"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_WORDS = ["代充", "低价", "推广", "引流", "加微", "返利", "usdt", "vx", "tg", "兼职", "刷单", "包赔"]
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> float:
+    """Return mean milliseconds per call of `fn` over `repeat` runs."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def _sizes(raw: str) -> List[int]:
+    return [int(x) for x in raw.split(",") if x.strip()]
+
+
+def bench_regex(args: argparse.Namespace) -> None:
+    """Legacy per-pattern re.search (raw + normalized) vs RegexSet."""
+    from app.matcher import RegexSet
+    from app.text import normalize_text
+
+    rnd = random.Random(42)
+    text = "今天天气不错，大家晚上一起吃饭吗？明天 10 点开会，记得带电脑。" * 4
+    text_norm = normalize_text(text)
+
+    def legacy(patterns: List[str]) -> List[str]:
+        hits = []
+        for p in patterns:
+            try:
+                if re.search(p, text, flags=re.IGNORECASE) or re.search(p, text_norm, flags=re.IGNORECASE):
+                    hits.append(p)
+            except re.error:
+                continue
+        return hits
+
+    print(f"{'patterns':>8} {'legacy ms':>10} {'regexset ms':>12} {'speedup':>8}")
+    for n in _sizes(args.sizes):
+        patterns = [
+            rf"{rnd.choice(_WORDS)}\s*{rnd.choice(_WORDS)}\d{{{rnd.randint(1, 4)}}}" for _ in range(n)
+        ]
+        rs = RegexSet(patterns, budget_seconds=1.0)
+        assert legacy(patterns) == rs.search(text, text_norm)
+        t_old = _timeit(lambda: legacy(patterns), args.repeat)
+        t_new = _timeit(lambda: rs.search(text, text_norm), args.repeat)
+        print(f"{n:>8} {t_old:>10.3f} {t_new:>12.3f} {t_old / t_new:>7.1f}x")
+
+
+def bench_db(args: argparse.Namespace) -> None:
+    """Connect-per-call (previous db._connect) vs pooled long-lived connections."""
+    import sqlite3
+
+    from app import db
+
+    db.init_db()
+    db.upsert_rules_row(1, {
+        "keywords": "[]", "regexes": "[]", "action": "delete", "mute_seconds": 0,
+        "newcomer_buffer_seconds": 0, "newcomer_buffer_mode": "none", "captcha_enabled": 0,
+        "captcha_timeout_seconds": 120, "first_message_strict": 1,
+    })
+    db.set_ocr_cache("bench-key", "text")
+
+    def legacy_connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
+
+    def legacy_get_rules_row() -> None:
+        with legacy_connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM rules WHERE chat_id = ?", (1,)).fetchone()
+            {k: row[k] for k in row.keys()}
+
+    def legacy_get_ocr_cache() -> None:
+        with legacy_connect() as conn:
+            conn.execute("SELECT text FROM ocr_cache WHERE key = ?", ("bench-key",)).fetchone()
+
+    def legacy_set_ocr_cache() -> None:
+        with legacy_connect() as conn:
+            conn.execute(
+                "INSERT INTO ocr_cache(key, text, created_at) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET text=excluded.text, created_at=excluded.created_at",
+                ("bench-key", "text", int(time.time())),
+            )
+
+    cases = [
+        ("get_rules_row", legacy_get_rules_row, lambda: db.get_rules_row(1)),
+        ("get_ocr_cache", legacy_get_ocr_cache, lambda: db.get_ocr_cache("bench-key")),
+        ("set_ocr_cache", legacy_set_ocr_cache, lambda: db.set_ocr_cache("bench-key", "text")),
+    ]
+    print(f"{'operation':<14} {'legacy ops/s':>13} {'pooled ops/s':>13} {'speedup':>8}")
+    for name, old, new in cases:
+        t_old = _timeit(old, args.ops)
+        t_new = _timeit(new, args.ops)
+        print(f"{name:<14} {1000 / t_old:>13.0f} {1000 / t_new:>13.0f} {t_old / t_new:>7.1f}x")
+    db.close_db()
+
+
+def _stub_answer(request: bytes) -> bytes:
+    """Chat completion for `request`: one verdict, or one per numbered item of a batch prompt."""
+    try:
+        prompt = json.loads(request)["messages"][-1]["content"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        prompt = ""
+    ids = [json.loads(line)["id"] for line in prompt.splitlines() if line.startswith('{"id"')]
+    if ids:
+        content = {"results": [{"id": i, "label": "not_ad", "score": 0.1} for i in ids]}
+    else:
+        content = {"label": "not_ad", "score": 0.1}
+    return json.dumps({"choices": [{"message": {"content": json.dumps(content)}}]}).encode()
+
+
+async def _stub_openrouter(counter: dict, latency: float = 0.0) -> asyncio.AbstractServer:
+    """Minimal keep-alive HTTP/1.1 server answering chat completions; counts TCP connections."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        counter["connections"] += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                body = _stub_answer(await reader.readexactly(length))
+                counter["requests"] += 1
+                if latency:
+                    await asyncio.sleep(latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def bench_ai_conn(args: argparse.Namespace) -> None:
+    """Client per call (previous behaviour) vs the shared keep-alive client.
+
+    Exits non-zero when the shared client opens more than one connection or
+    drops a call, so it doubles as a regression check.
+    """
+    import httpx
+
+    from app import ai_provider
+
+    async def run() -> dict:
+        counter = {"connections": 0, "requests": 0}
+        server = await _stub_openrouter(counter)
+        port = server.sockets[0].getsockname()[1]
+        ai_provider.load_ai_credentials(f"http://127.0.0.1:{port}/api/v1", "bench-key")
+        url = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+
+        async def legacy_call() -> None:
+            async with httpx.AsyncClient(timeout=15.0) as client:
+                (await client.post(url, json={"model": "m"})).raise_for_status()
+
+        # Distinct texts so the verdict cache stays out of the way; no batching wait
+        ai_provider.AI_BATCH_MAX_ITEMS = 1
+        seq = iter(range(10 ** 9))
+        seen = {}
+        print(f"{'mode':<8} {'calls':>6} {'connections':>12} {'ms/call':>8}")
+        for mode, call in (
+            ("legacy", legacy_call),
+            ("shared", lambda: ai_provider.classify_text_with_openrouter(f"hello {next(seq)}")),
+        ):
+            counter.update(connections=0, requests=0)
+            start = time.perf_counter()
+            for _ in range(args.calls):
+                await call()
+            elapsed = (time.perf_counter() - start) * 1000.0 / args.calls
+            print(f"{mode:<8} {counter['requests']:>6} {counter['connections']:>12} {elapsed:>8.2f}")
+            seen[mode] = dict(counter)
+        await ai_provider.close_ai_client()
+        server.close()
+        await server.wait_closed()
+        return seen["shared"]
+
+    from app import db
+
+    db.init_db()
+    shared = asyncio.run(run())
+    db.close_db()
+    if shared["connections"] != 1 or shared["requests"] != args.calls:
+        sys.exit(
+            f"FAIL: shared client used {shared['connections']} connections "
+            f"for {shared['requests']}/{args.calls} calls (expected 1 connection)"
+        )
+
+
+def bench_ai_batch(args: argparse.Namespace) -> None:
+    """Concurrent burst of distinct texts: one request per text vs micro-batching."""
+    from app import ai_provider
+
+    async def run() -> None:
+        counter = {"connections": 0, "requests": 0}
+        server = await _stub_openrouter(counter, latency=args.latency_ms / 1000.0)
+        port = server.sockets[0].getsockname()[1]
+        ai_provider.load_ai_credentials(f"http://127.0.0.1:{port}/api/v1", "bench-key")
+
+        async def timed(text: str) -> float:
+            start = time.perf_counter()
+            _, _, label = await ai_provider.classify_text_with_openrouter(text)
+            assert label == "not_ad", label
+            return (time.perf_counter() - start) * 1000.0
+
+        print(f"{'mode':<8} {'messages':>8} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode, items in (("single", 1), ("batched", args.items)):
+            ai_provider.AI_BATCH_MAX_ITEMS = items
+            counter.update(connections=0, requests=0)
+            # Arrivals spread over a short window, as in a raid
+            tasks = []
+            for i in range(args.messages):
+                tasks.append(asyncio.create_task(timed(f"{mode} 加微信领福利 #{i}")))
+                if i % 10 == 9:
+                    await asyncio.sleep(0.001)
+            lat = sorted(await asyncio.gather(*tasks))
+            p50 = lat[len(lat) // 2]
+            p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+            print(f"{mode:<8} {args.messages:>8} {counter['requests']:>9} {p50:>8.1f} {p99:>8.1f}")
+        await ai_provider.close_ai_client()
+        server.close()
+        await server.wait_closed()
+
+    from app import db
+
+    db.init_db()
+    asyncio.run(run())
+    db.close_db()
+
+
+def bench_phash(args: argparse.Namespace) -> None:
+    """Linear Hamming scan vs PHashIndex over synthetic 64-bit hash sets."""
+    from app.phash_index import PHashIndex
+
+    rnd = random.Random(7)
+
+    def perturb(value: int, bits: int) -> int:
+        for pos in rnd.sample(range(64), bits):
+            value ^= 1 << pos
+        return value
+
+    print(f"{'hashes':>9} {'build s':>8} {'linear ms':>10} {'index ms':>9} {'speedup':>8} {'recall':>7}")
+    for n in _sizes(args.sizes):
+        values = [rnd.getrandbits(64) for _ in range(n)]
+        start = time.perf_counter()
+        index = PHashIndex()
+        index.update(f"{v:016x}" for v in values)
+        build = time.perf_counter() - start
+        # Half the queries are near-duplicates of stored hashes, half are unrelated
+        queries = [
+            perturb(rnd.choice(values), rnd.randint(0, args.radius)) if i % 2 == 0 else rnd.getrandbits(64)
+            for i in range(args.queries)
+        ]
+
+        def linear(q: int) -> Optional[int]:
+            best = min(values, key=lambda v: (v ^ q).bit_count())
+            return best if (best ^ q).bit_count() <= args.radius else None
+
+        linear_queries = queries[: max(2, args.queries // 50)]
+        t_old = _timeit(lambda: [linear(q) for q in linear_queries], 1) / len(linear_queries)
+        t_new = _timeit(lambda: [index.search(f"{q:016x}", args.radius, limit=1) for q in queries], 1) / len(queries)
+        agree = sum(
+            (linear(q) is not None) == bool(index.search(f"{q:016x}", args.radius, limit=1)) for q in linear_queries
+        )
+        print(
+            f"{n:>9} {build:>8.2f} {t_old:>10.3f} {t_new:>9.4f} {t_old / t_new:>7.0f}x "
+            f"{agree / len(linear_queries):>6.0%}"
+        )
+
+
+# Latin ad vocabulary: the DejaVu fonts used for synthetic images have no CJK glyphs
+_AD_WORDS = [
+    "usdt", "casino", "cashback", "airdrop", "discount", "betting",
+    "telegram", "wechat", "promo", "bonus", "loans", "vpn",
+]
+_FILLER = ["best", "price", "today", "join", "now", "only", "free", "daily", "vip", "click", "contact", "channel"]
+
+
+def _font(size: int):
+    from PIL import ImageFont
+
+    for name in ("DejaVuSans-Bold.ttf", "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def _labelled_samples(directory: str) -> List[tuple]:
+    """Real images from `directory`, each `name.jpg`/`.png` with a `name.txt` of
+    the keywords it contains (one per line), in the same shape as _synthetic_ads."""
+    corpus = []
+    for path in sorted(Path(directory).iterdir()):
+        label = path.with_suffix(".txt")
+        if path.suffix.lower() not in {".jpg", ".jpeg", ".png", ".webp"} or not label.exists():
+            continue
+        keywords = [kw.strip().lower() for kw in label.read_text(encoding="utf-8").splitlines() if kw.strip()]
+        corpus.append((path.read_bytes(), keywords))
+    return corpus
+
+
+def _synthetic_ads(count: int, seed: int = 7) -> List[tuple]:
+    """JPEG ad images (text banners over noisy photo-like backgrounds) and the keywords drawn on them."""
+    import io
+
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for _ in range(count):
+        w, h = rnd.choice([(1080, 1920), (1280, 720), (1600, 1600), (720, 1280), (1440, 2560)])
+        # Smooth colour gradient plus noise stands in for a photo background
+        yy, xx = np.mgrid[0:h, 0:w]
+        base = np.stack([
+            (xx / w * rnd.randint(60, 255) + yy / h * rnd.randint(0, 120)) % 256 for _ in range(3)
+        ], axis=-1)
+        base += rng.normal(0, 18, size=base.shape)
+        img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8), "RGB")
+        draw = ImageDraw.Draw(img)
+        keywords = []
+        y = rnd.randint(20, h // 6)
+        for _ in range(rnd.randint(1, 4)):
+            size = int(w * rnd.uniform(0.035, 0.07))
+            font = _font(size)
+            kw = rnd.choice(_AD_WORDS)
+            keywords.append(kw)
+            line = " ".join(rnd.sample(_FILLER, 2) + [kw] + rnd.sample(_FILLER, 1))
+            dark_text = rnd.random() < 0.5
+            band = (rnd.randint(200, 255) if dark_text else rnd.randint(0, 70),) * 3
+            fg = (rnd.randint(0, 50),) * 3 if dark_text else (rnd.randint(210, 255),) * 3
+            left = rnd.randint(10, max(11, w // 8))
+            box = draw.textbbox((left, y), line, font=font)
+            if rnd.random() < 0.8:
+                draw.rectangle((box[0] - 12, box[1] - 10, box[2] + 12, box[3] + 10), fill=band)
+            draw.text((left, y), line, font=font, fill=fg)
+            y = box[3] + rnd.randint(size, h // 4)
+            if y > h - size * 2:
+                break
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        corpus.append((buf.getvalue(), keywords))
+    return corpus
+
+
+def _synthetic_photos(count: int, seed: int = 13) -> List[bytes]:
+    """Text-free JPEGs: noisy gradients with coloured blobs, half of them blurred."""
+    import io
+
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(count):
+        w, h = rnd.choice([(1080, 1920), (1280, 720), (1600, 1600), (720, 1280)])
+        yy, xx = np.mgrid[0:h, 0:w]
+        base = np.stack([
+            (xx / w * rnd.randint(60, 255) + yy / h * rnd.randint(0, 120)) % 256 for _ in range(3)
+        ], axis=-1)
+        base += rng.normal(0, 18, size=base.shape)
+        img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8), "RGB")
+        draw = ImageDraw.Draw(img)
+        for _ in range(rnd.randint(3, 12)):
+            x, y, r = rnd.randint(0, w), rnd.randint(0, h), rnd.randint(20, 400)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rnd.randint(0, 255) for _ in range(3)))
+        if i % 2:
+            img = img.filter(ImageFilter.GaussianBlur(2))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        out.append(buf.getvalue())
+    return out
+
+
+def bench_prefilter(args: argparse.Namespace) -> None:
+    """Cost and accuracy of the "has text?" prefilter on ad images vs text-free photos.
+
+    --samples DIR uses real images instead: DIR/text/ holds images with text
+    and DIR/notext/ images without.
+    """
+    from app.ocr import image_has_text
+
+    if args.samples:
+        sets = [
+            (name, [p.read_bytes() for p in sorted((Path(args.samples) / sub).iterdir()) if p.is_file()])
+            for name, sub in (("ads (text)", "text"), ("photos (no text)", "notext"))
+        ]
+    else:
+        half = args.images // 2
+        sets = [("ads (text)", [d for d, _ in _synthetic_ads(half)]), ("photos (no text)", _synthetic_photos(half))]
+    print(f"{'set':<17} {'images':>6} {'ms/img':>7} {'kept for OCR':>13}")
+    for name, images in sets:
+        start = time.perf_counter()
+        kept = sum(1 for data in images if image_has_text(data, args.min_score))
+        ms = (time.perf_counter() - start) * 1000.0 / len(images)
+        print(f"{name:<17} {len(images):>6} {ms:>7.1f} {kept / len(images):>13.0%}")
+
+
+def bench_ocr_probe(args: argparse.Namespace) -> None:
+    """Per-image engine check: spawning `tesseract --version` vs the cached probe.
+
+    A stub `tesseract` script stands in for the binary so the spawn cost is
+    measured even where Tesseract is not installed.
+    """
+    import pytesseract
+
+    from app import ocr
+
+    stub_dir = Path(tempfile.mkdtemp(prefix="ad_guard_stub_"))
+    stub = stub_dir / "tesseract"
+    stub.write_text(
+        "#!/bin/sh\n"
+        "if [ \"$1\" = --list-langs ]; then printf 'List of available languages (2):\\nchi_sim\\neng\\n';\n"
+        "else echo 'tesseract 5.3.0'; fi\n"
+    )
+    stub.chmod(0o755)
+    spawn_version = pytesseract.pytesseract.get_tesseract_version.__wrapped__
+
+    print(f"{'binary':<9} {'check':<34} {'ms/image':>9}")
+    for label, cmd in (("present", str(stub)), ("missing", str(stub_dir / "missing"))):
+        pytesseract.pytesseract.tesseract_cmd = cmd
+
+        def legacy() -> None:
+            # What every OCR call paid whenever the version was not cached (always, when missing)
+            try:
+                spawn_version()
+            except Exception:
+                pass
+
+        def cached() -> None:
+            try:
+                ocr.assert_tesseract_available("chi_sim+eng")
+            except ocr.OCRError:
+                pass
+
+        ocr.probe_tesseract()
+        print(f"{label:<9} {'tesseract --version per call':<34} {_timeit(legacy, args.calls):>9.3f}")
+        print(f"{label:<9} {'cached probe':<34} {_timeit(cached, args.calls):>9.4f}")
+
+
+def bench_ocr_backend(args: argparse.Namespace) -> None:
+    """Images/sec of the tesseract CLI per image vs an engine kept loaded in-process."""
+    from app import ocr
+    from app.preprocess import preprocess_for_ocr
+
+    corpus = _synthetic_ads(args.images)
+    prepared = []
+    for data, keywords in corpus:
+        with ocr.open_image(data) as img:
+            prepared.append((preprocess_for_ocr(img), keywords))
+
+    backends = [ocr.PytesseractBackend()]
+    if ocr.tesserocr is not None:
+        backends.append(ocr.TesserocrBackend())
+    print(f"{'backend':<12} {'first ms':>9} {'img/s':>7} {'recall':>7}")
+    for backend in backends:
+        try:
+            start = time.perf_counter()
+            backend.image_to_string(prepared[0][0], args.lang, 0)
+            first_ms = (time.perf_counter() - start) * 1000.0
+        except Exception as exc:
+            print(f"{backend.name:<12} unavailable: {exc}")
+            continue
+        found = planted = 0
+        start = time.perf_counter()
+        for img, keywords in prepared:
+            text = backend.image_to_string(img, args.lang, 0).lower()
+            found += sum(1 for kw in keywords if kw in text)
+            planted += len(keywords)
+        rate = len(prepared) / (time.perf_counter() - start)
+        print(f"{backend.name:<12} {first_ms:>9.1f} {rate:>7.2f} {found / planted:>7.0%}")
+
+
+def _tall_screenshots(count: int, height: int, seed: int = 11) -> List[tuple]:
+    """Long chat-screenshot-like PNGs: rows of small text with one ad keyword line each."""
+    import io
+
+    from PIL import Image, ImageDraw
+
+    rnd = random.Random(seed)
+    font = _font(28)
+    corpus = []
+    for _ in range(count):
+        img = Image.new("RGB", (1080, height), "white")
+        draw = ImageDraw.Draw(img)
+        rows = list(range(40, height - 60, 60))
+        kw = rnd.choice(_AD_WORDS)
+        ad_row = rnd.randrange(len(rows))
+        for i, y in enumerate(rows):
+            words = rnd.sample(_FILLER, 3)
+            if i == ad_row:
+                words.insert(1, kw)
+            draw.text((40, y), " ".join(words), fill=(30, 30, 30), font=font)
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        corpus.append((buf.getvalue(), kw))
+    return corpus
+
+
+def bench_ocr_tiles(args: argparse.Namespace) -> None:
+    """Wall time and recall on tall images: one downscaled pass vs parallel strips (with early stop)."""
+    from app import ocr
+
+    engine = ocr.get_engine_info()
+    if not (engine.available and args.lang in engine.languages):
+        print(f"tesseract with '{args.lang}' not available: nothing to measure")
+        return
+    corpus = _tall_screenshots(args.images, args.height)
+    tile_min_height = ocr.OCR_TILE_MIN_HEIGHT or 2400
+
+    async def run(tiled: bool, early_stop: bool) -> tuple:
+        ocr.OCR_TILE_MIN_HEIGHT = tile_min_height if tiled else 0
+        found = 0
+        start = time.perf_counter()
+        for data, kw in corpus:
+            stop = (lambda text, kw=kw: kw in text.lower()) if early_stop else None
+            text, _, _ = await ocr.extract_text_until(data, args.lang, stop=stop)
+            found += kw in text.lower()
+        return (time.perf_counter() - start) * 1000.0 / len(corpus), found / len(corpus)
+
+    async def main() -> None:
+        await ocr.extract_text_until(corpus[0][0], args.lang)  # start the workers
+        print(f"{'mode':<18} {'ms/img':>8} {'recall':>7}")
+        for name, tiled, early_stop in [
+            ("single pass", False, False),
+            ("strips", True, False),
+            ("strips+early stop", True, True),
+        ]:
+            ms, recall = await run(tiled, early_stop)
+            print(f"{name:<18} {ms:>8.0f} {recall:>7.0%}")
+        stats = ocr.get_ocr_stats()
+        print(f"strips run: {stats['strips']}, cancelled after a hit: {stats['strips_cancelled']}")
+        ocr.shutdown_ocr_pool()
+
+    asyncio.run(main())
+
+
+def bench_ocr_lang_mode(args: argparse.Namespace) -> None:
+    """Fixed vs adaptive language mode: OCR time, keyword recall and which path adaptive took.
+
+    Adaptive only pays off if the fast model's confident reads keep the
+    keywords, so run it on real CJK and mixed-script screenshots
+    (--samples DIR, see _labelled_samples) before enabling it.
+    """
+    from app import ocr
+
+    missing = ocr.missing_languages(args.lang) or ocr.missing_languages(ocr.OCR_FAST_LANGUAGES)
+    if not ocr.get_engine_info().available or missing:
+        print(f"tesseract or language packs missing ({'+'.join(missing)}): nothing to compare")
+        return
+    corpus = _labelled_samples(args.samples) if args.samples else _synthetic_ads(args.images)
+    print(f"{'mode':<9} {'ocr ms':>7} {'recall':>7}  paths")
+    for mode in ("fixed", "adaptive"):
+        ms = 0.0
+        found = planted = 0
+        paths: dict = {}
+        for data, keywords in corpus:
+            start = time.perf_counter()
+            text, path, _ = ocr._ocr_job(data, args.lang, 0, mode)
+            ms += (time.perf_counter() - start) * 1000.0
+            paths[path] = paths.get(path, 0) + 1
+            found += sum(1 for kw in keywords if kw in text.lower())
+            planted += len(keywords)
+        spread = ", ".join(f"{k} {v}" for k, v in sorted(paths.items()))
+        print(f"{mode:<9} {ms / len(corpus):>7.0f} {found / max(1, planted):>7.0%}  {spread}")
+
+
+def bench_ocr_max_side(args: argparse.Namespace) -> None:
+    """Keyword recall and OCR time per OCR_MAX_SIDE cap on phone screenshots (0 = full size).
+
+    The synthetic set is 1080x2340 chat screenshots with 28 px text; run it
+    on real screenshots (--samples DIR, see _labelled_samples) before
+    lowering the cap.
+    """
+    from app.ocr import get_backend, get_engine_info, open_image
+    from app.preprocess import preprocess_for_ocr
+
+    engine = get_engine_info()
+    if not (engine.available and all(lang in engine.languages for lang in args.lang.split("+"))):
+        print(f"tesseract with '{args.lang}' not available: nothing to compare")
+        return
+    if args.samples:
+        corpus = _labelled_samples(args.samples)
+    else:
+        corpus = [(data, [kw]) for data, kw in _tall_screenshots(args.images, 2340)]
+    print(f"{'max side':>8} {'ocr ms':>7} {'Mpx sent':>9} {'recall':>7}")
+    for side in _sizes(args.sides):
+        ms = 0.0
+        pixels = found = planted = 0
+        for data, keywords in corpus:
+            with open_image(data) as img:
+                prepared = preprocess_for_ocr(img, max_side=side, binarize_bands=False, crop_regions=False)
+            pixels += prepared.size[0] * prepared.size[1]
+            start = time.perf_counter()
+            text = get_backend().image_to_string(prepared, args.lang, 0).lower()
+            ms += (time.perf_counter() - start) * 1000.0
+            found += sum(1 for kw in keywords if kw in text)
+            planted += len(keywords)
+        n = len(corpus)
+        print(f"{side or 'full':>8} {ms / n:>7.0f} {pixels / n / 1e6:>9.2f} {found / max(1, planted):>7.0%}")
+
+
+def bench_photo_ladder(args: argparse.Namespace) -> None:
+    """Bytes and OCR time per photo: always the largest size vs a mid-size first with escalation."""
+    import io
+
+    from app import ocr
+    from app.bot import _weak_ocr_text
+
+    engine = ocr.get_engine_info()
+    if not (engine.available and args.lang in engine.languages):
+        print(f"tesseract with '{args.lang}' not available: nothing to measure")
+        return
+    photos = []
+    for data, keywords in _synthetic_ads(args.images):
+        mid = None
+        with ocr.open_image(data) as img:
+            scale = args.start_side / max(img.size)
+            if scale < 1:
+                buf = io.BytesIO()
+                img.resize((round(img.width * scale), round(img.height * scale))).save(buf, format="JPEG", quality=85)
+                mid = buf.getvalue()
+        photos.append((data, mid, keywords))
+
+    def ocr_ms(data: bytes) -> tuple:
+        start = time.perf_counter()
+        text, path, conf = ocr._ocr_job(data, args.lang, 0, "fixed")
+        return text, None if path == "skipped" else conf, (time.perf_counter() - start) * 1000.0
+
+    print(f"{'mode':<14} {'KB/photo':>9} {'ocr ms':>7} {'escalated':>10} {'recall':>7}")
+    for name, ladder in [("largest only", False), ("ladder", True)]:
+        size = ms = 0.0
+        escalated = found = planted = 0
+        for largest, mid, keywords in photos:
+            if ladder and mid is not None:
+                size += len(mid)
+                text, conf, spent = ocr_ms(mid)
+                ms += spent
+                if _weak_ocr_text(text, True, conf, lambda t, kws=keywords: any(kw in t.lower() for kw in kws)):
+                    escalated += 1
+                    size += len(largest)
+                    text, _, spent = ocr_ms(largest)
+                    ms += spent
+            else:
+                size += len(largest)
+                text, _, spent = ocr_ms(largest)
+                ms += spent
+            found += sum(1 for kw in keywords if kw in text.lower())
+            planted += len(keywords)
+        n = len(photos)
+        print(f"{name:<14} {size / n / 1024:>9.0f} {ms / n:>7.0f} {escalated / n:>10.0%} {found / planted:>7.0%}")
+
+
+def bench_ocr(args: argparse.Namespace) -> None:
+    """Raw RGB to Tesseract vs the preprocessing pipeline on synthetic ad images.
+
+    --samples DIR runs on labelled real images instead (see _labelled_samples),
+    e.g. chi_sim+eng screenshots with --lang chi_sim+eng, which is what the
+    "+text regions" recall needs before OCR_TEXT_REGIONS is turned on.
+    """
+    from app.ocr import get_backend, get_engine_info, open_image
+    from app.preprocess import preprocess_for_ocr
+
+    corpus = _labelled_samples(args.samples) if args.samples else _synthetic_ads(args.images)
+    engine = get_engine_info()
+    has_tesseract = engine.available and all(lang in engine.languages for lang in args.lang.split("+"))
+    if has_tesseract:
+        print(f"backend: {engine.backend} (tesseract {engine.version})")
+    else:
+        print("tesseract not available: timing preprocessing only, OCR ms and recall skipped")
+
+    modes = [
+        ("raw rgb", lambda img: img.convert("RGB")),
+        ("downscale+gray", lambda img: preprocess_for_ocr(img, binarize_bands=False, crop_regions=False)),
+        ("+text regions", lambda img: preprocess_for_ocr(img, binarize_bands=False)),
+        ("+binarize", lambda img: preprocess_for_ocr(img)),
+    ]
+    print(f"{'mode':<16} {'prep ms':>8} {'ocr ms':>8} {'Mpx sent':>9} {'recall':>7}")
+    for name, prepare in modes:
+        prep_ms = ocr_ms = 0.0
+        pixels = found = planted = 0
+        for data, keywords in corpus:
+            start = time.perf_counter()
+            with open_image(data) as img:
+                prepared = prepare(img)
+            prep_ms += (time.perf_counter() - start) * 1000.0
+            pixels += prepared.size[0] * prepared.size[1]
+            planted += len(keywords)
+            if has_tesseract:
+                start = time.perf_counter()
+                text = get_backend().image_to_string(prepared, args.lang, 0).lower()
+                ocr_ms += (time.perf_counter() - start) * 1000.0
+                found += sum(1 for kw in keywords if kw in text)
+        n = len(corpus)
+        recall = f"{found / planted:>6.0%}" if has_tesseract else f"{'-':>6}"
+        ocr = f"{ocr_ms / n:>8.1f}" if has_tesseract else f"{'-':>8}"
+        print(f"{name:<16} {prep_ms / n:>8.1f} {ocr} {pixels / n / 1e6:>9.2f} {recall:>7}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("regex", help="precompiled RegexSet vs per-message re.search")
+    p.add_argument("--sizes", default="10,100,1000")
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=bench_regex)
+
+    p = sub.add_parser("db", help="pooled SQLite connections vs connect per call")
+    p.add_argument("--ops", type=int, default=5000)
+    p.set_defaults(func=bench_db)
+
+    p = sub.add_parser("ai-conn", help="shared AI HTTP client vs client per call (local stub server)")
+    p.add_argument("--calls", type=int, default=50)
+    p.set_defaults(func=bench_ai_conn)
+
+    p = sub.add_parser("ai-batch", help="micro-batched AI text classification vs one request per text")
+    p.add_argument("--messages", type=int, default=200)
+    p.add_argument("--items", type=int, default=8)
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.set_defaults(func=bench_ai_batch)
+
+    p = sub.add_parser("phash", help="near-duplicate pHash index vs linear Hamming scan")
+    p.add_argument("--sizes", default="10000,100000,1000000")
+    p.add_argument("--radius", type=int, default=6)
+    p.add_argument("--queries", type=int, default=1000)
+    p.set_defaults(func=bench_phash)
+
+    p = sub.add_parser("ocr", help="OCR preprocessing pipeline vs raw RGB on synthetic ad images")
+    p.add_argument("--images", type=int, default=40)
+    p.add_argument("--lang", default="eng")
+    p.add_argument("--samples", help="directory of labelled real images (name.jpg + name.txt keywords)")
+    p.set_defaults(func=bench_ocr)
+
+    p = sub.add_parser("prefilter", help="has-text prefilter cost and accuracy on synthetic images")
+    p.add_argument("--images", type=int, default=100)
+    p.add_argument("--min-score", type=float, default=0.01)
+    p.add_argument("--samples", help="directory with text/ and notext/ subdirectories of real images")
+    p.set_defaults(func=bench_prefilter)
+
+    p = sub.add_parser("ocr-probe", help="per-image Tesseract availability check: spawn vs cached probe")
+    p.add_argument("--calls", type=int, default=200)
+    p.set_defaults(func=bench_ocr_probe)
+
+    p = sub.add_parser("ocr-backend", help="OCR images/sec: tesseract CLI per image vs in-process tesserocr")
+    p.add_argument("--images", type=int, default=30)
+    p.add_argument("--lang", default="eng")
+    p.set_defaults(func=bench_ocr_backend)
+
+    p = sub.add_parser("ocr-tiles", help="tall images: single downscaled OCR pass vs parallel strips")
+    p.add_argument("--images", type=int, default=6)
+    p.add_argument("--height", type=int, default=5000)
+    p.add_argument("--lang", default="eng")
+    p.set_defaults(func=bench_ocr_tiles)
+
+    p = sub.add_parser("photo-ladder", help="photo OCR bytes/time: largest size vs mid-size first with escalation")
+    p.add_argument("--images", type=int, default=40)
+    p.add_argument("--start-side", type=int, default=1280)
+    p.add_argument("--lang", default="eng")
+    p.set_defaults(func=bench_photo_ladder)
+
+    p = sub.add_parser("ocr-lang-mode", help="fixed vs adaptive OCR language mode on labelled images")
+    p.add_argument("--images", type=int, default=20)
+    p.add_argument("--lang", default="chi_sim+eng")
+    p.add_argument("--samples", help="directory of labelled real images (name.jpg + name.txt keywords)")
+    p.set_defaults(func=bench_ocr_lang_mode)
+
+    p = sub.add_parser("ocr-max-side", help="OCR recall per OCR_MAX_SIDE downscale cap on phone screenshots")
+    p.add_argument("--images", type=int, default=10)
+    p.add_argument("--sides", default="0,1600,3000")
+    p.add_argument("--lang", default="eng")
+    p.add_argument("--samples", help="directory of labelled real images (name.jpg + name.txt keywords)")
+    p.set_defaults(func=bench_ocr_max_side)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()